@@ -1,18 +1,98 @@
+# Первым импортом: отсчет времени холодного старта
+from .startup import StartupState, run_in_background
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 import uvicorn
+import logging
+
+from .database import async_engine, engine, read_engine, SessionLocal, pool_metrics
+from .routers import upload, calendar, map, statistics, wind, predict, models, stream
+from .services.ingest_jobs import resume_pending_jobs, shutdown_executor
+from .services.instrumentation import InstrumentationMiddleware, instrument_engine, registry
+from .services.model_registry import registry as model_registry
+from .services.predict import load_model
+from .services.partitions import maintain_partitions
+from .services.streaming import shutdown_ingestor
+from .services.rollup import ensure_daily_rollup
+from .schema import check_schema, upgrade_schema
+from .settings import DB_SCHEMA_MODE
+
+logger = logging.getLogger(__name__)
 
-from .database import engine, Base
-from .routers import upload, calendar, map, statistics, wind, predict
+# Состояние шагов запуска (для /ready)
+startup = StartupState()
+
+# Замеры запросов к БД всех движков (для /metrics и Server-Timing)
+for db_engine in (engine, async_engine, read_engine):
+    instrument_engine(db_engine)
+
+
+def prepare_schema():
+    """
+    Приводим схему базы данных к последней миграции или только проверяем ее
+    (DB_SCHEMA_MODE = upgrade / check / off)
+    """
+    if DB_SCHEMA_MODE == "upgrade":
+        upgrade_schema(engine)
+    elif DB_SCHEMA_MODE == "check":
+        check_schema(engine)
+
+
+def build_daily_rollup():
+    """
+    Строим дневные итоги календаря для базы, заполненной до их появления
+    """
+    db = SessionLocal()
+    try:
+        ensure_daily_rollup(db)
+    finally:
+        db.close()
+
+
+def prepare_database():
+    """
+    Шаги запуска, работающие с БД, по порядку: схема, секции таблиц датчиков,
+    дневные итоги и прерванные перезапуском фоновые загрузки
+    """
+    if DB_SCHEMA_MODE == "off":
+        startup.skip("schema")
+    elif not startup.run("schema", prepare_schema):
+        return
+    startup.run("partitions", lambda: maintain_partitions(engine))
+    startup.run("rollup", build_daily_rollup)
+    startup.run("ingest_jobs", resume_pending_jobs)
+
+
+def load_prediction_model():
+    """
+    Загружаем модель прогнозирования; до окончания загрузки прогноз
+    загрузит ее сам при первом запросе
+    """
+    startup.run("model", load_model)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Обращения к БД и загрузка модели не задерживают прием запросов:
+    # готовность экземпляра сообщает /ready
+    run_in_background("startup-database", prepare_database)
+    run_in_background("startup-model", load_prediction_model)
+    startup.listening()
+    yield
+    await shutdown_ingestor()
+    shutdown_executor()
+    model_registry.shutdown()
 
-# Создаем таблицы в базе данных
-Base.metadata.create_all(bind=engine)
 
 # Создаем экземпляр FastAPI
 app = FastAPI(
     title="Прогноз возгораний на угольных складах",
     description="API для работы с данными о температуре угля, погоде и прогнозах возгораний",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Настройка CORS для взаимодействия с фронтендом
@@ -22,8 +102,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+# Количество и время запросов к БД, время pandas и модели по маршрутам
+app.add_middleware(InstrumentationMiddleware)
+
 # Подключаем роутеры
 app.include_router(upload.router, prefix="/api", tags=["Upload"])
 app.include_router(calendar.router, prefix="/api", tags=["Calendar"])
@@ -31,6 +115,8 @@ app.include_router(map.router, prefix="/api", tags=["Map"])
 app.include_router(statistics.router, prefix="/api", tags=["Statistics"])
 app.include_router(wind.router, prefix="/api", tags=["Wind"])
 app.include_router(predict.router, prefix="/api", tags=["Predict"])
+app.include_router(models.router, prefix="/api", tags=["Models"])
+app.include_router(stream.router, prefix="/api", tags=["Stream"])
 
 @app.get("/", tags=["Root"])
 async def root():
@@ -39,5 +125,33 @@ async def root():
     """
     return {"status": "online", "message": "API прогноза возгораний готово к работе"}
 
+@app.get("/ready", tags=["Root"])
+async def readiness():
+    """
+    Готовность экземпляра: схема БД проверена и модель загружена (иначе 503)
+
+    В ответе - состояние и длительность каждого шага запуска и время
+    холодного старта относительно цели COLD_START_TARGET_SECONDS.
+    """
+    state = startup.snapshot()
+    return JSONResponse(status_code=200 if state["ready"] else 503, content=state)
+
+@app.get("/db/pool", tags=["Root"])
+async def get_pool_metrics():
+    """
+    Состояние пулов соединений с БД: занятые соединения, количество выдач,
+    таймауты и время ожидания свободного соединения
+    """
+    return {"success": True, "data": pool_metrics()}
+
+@app.get("/metrics", tags=["Root"])
+async def get_metrics():
+    """
+    Метрики в текстовом формате Prometheus: запросы и задержка по маршрутам,
+    количество и время запросов к БД, время pandas и модели, срабатывания
+    детектора N+1 и состояние пулов соединений
+    """
+    return PlainTextResponse(registry.render(pool_metrics()), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", host="0.0.0.0", port=5000, reload=True)
\ No newline at end of file
+    uvicorn.run("app.main:app", host="0.0.0.0", port=5000, reload=True)
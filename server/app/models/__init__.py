@@ -2,5 +2,10 @@ from .coal import CoalTemperature, CoalTemperatureBase, CoalTemperatureCreate, C
 from .weather import Weather, WeatherBase, WeatherCreate, WeatherResponse
 from .fire import (
     FireHistory, FireHistoryBase, FireHistoryCreate, FireHistoryResponse,
-    FirePrediction, FirePredictionBase, FirePredictionCreate, FirePredictionResponse
-)
\ No newline at end of file
+    FirePredictionBase, FirePredictionCreate, PredictionWatermark
+)
+from .ingest_job import IngestJob, IngestJobResponse
+from .uploaded_file import UploadedFile, UploadedFileResponse
+from .prediction_run import PredictionRun, PredictionScore, PredictionRunResponse
+from .stack import Stack, StackCell
+from .rollup import DailyRollup, StatisticsAggregate, ALL_LOCATIONS, ALL_PERIODS
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, DateTime, func
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Index, UniqueConstraint, func, text
 from sqlalchemy.ext.declarative import declarative_base
 from pydantic import BaseModel
 from datetime import date, datetime
@@ -7,8 +7,18 @@ from typing import Optional
 from ..database import Base
 
 # SQLAlchemy модель
+# В PostgreSQL таблица секционирована по месяцам date (миграция 0002),
+# первичный ключ в БД - (id, date)
 class CoalTemperature(Base):
     __tablename__ = "coal_temperature"
+    # Естественный ключ: одно значение на дату и локацию
+    __table_args__ = (
+        UniqueConstraint("date", "location", name="uq_coal_temperature_date_location"),
+        # История по локациям (прогноз)
+        Index("ix_coal_temperature_location_date", "location", text("date DESC")),
+        # Диапазоны дат: компактный BRIN, строки загружаются примерно по порядку дат
+        Index("ix_coal_temperature_date_brin", "date", postgresql_using="brin"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     date = Column(Date, nullable=False)
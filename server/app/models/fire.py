@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, Date, DateTime, func
+from sqlalchemy import Column, Integer, String, Float, Boolean, Date, DateTime, ForeignKey, Index, func, text
 from sqlalchemy.ext.declarative import declarative_base
 from pydantic import BaseModel
 from datetime import date, datetime
@@ -9,28 +9,40 @@ from ..database import Base
 # SQLAlchemy модель истории возгораний
 class FireHistory(Base):
     __tablename__ = "fire_history"
+    __table_args__ = (
+        # Последние события по локации (карта)
+        Index("ix_fire_history_location_date", "location", text("date DESC")),
+        # Диапазоны дат (дневные итоги, календарь)
+        Index("ix_fire_history_date_brin", "date", postgresql_using="brin"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True, index=True)
-    creation_date = Column(DateTime, nullable=False)
-    cargo = Column(String, nullable=False)
-    weight = Column(Float, nullable=False)
-    warehouse = Column(Integer, nullable=False)
-    start_date = Column(DateTime, nullable=False)
+    date = Column(Date, nullable=False)
+    location = Column(String, nullable=False)
+    has_fire = Column(Boolean, nullable=False, default=False)
+    severity = Column(Integer, nullable=False, default=0)
+    # Поля журнала штабелей (заполняются, если есть в выгрузке)
+    creation_date = Column(DateTime, nullable=True)
+    cargo = Column(String, nullable=True)
+    weight = Column(Float, nullable=True)
+    warehouse = Column(Integer, nullable=True)
+    start_date = Column(DateTime, nullable=True)
     end_date = Column(DateTime, nullable=True)
     initial_stack_date = Column(DateTime, nullable=True)
-    stack = Column(Integer, nullable=False)
-    date = Column(Date, nullable=False)
+    stack = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=func.now())
 
-# SQLAlchemy модель прогнозов возгораний
-class FirePrediction(Base):
-    __tablename__ = "fire_predictions"
+# SQLAlchemy модель водяных знаков прогнозов: до какого состояния данных
+# локация уже пересчитана
+class PredictionWatermark(Base):
+    __tablename__ = "prediction_watermarks"
 
-    id = Column(Integer, primary_key=True, index=True)
-    date = Column(Date, nullable=False)
-    location = Column(String, nullable=False)
-    fire_probability = Column(Float, nullable=False)
-    risk_level = Column(String, nullable=False)
-    created_at = Column(DateTime, default=func.now())
+    location = Column(String, primary_key=True)
+    # Последний запуск прогнозирования, оценивший локацию
+    run_id = Column(Integer, ForeignKey("prediction_runs.id"), nullable=True)
+    last_data_date = Column(Date, nullable=True)
+    data_updated_at = Column(DateTime, nullable=True)
+    scored_at = Column(DateTime, default=func.now())
 
 # Pydantic модели для API
 class FireHistoryBase(BaseModel):
@@ -57,10 +69,3 @@ class FirePredictionBase(BaseModel):
 
 class FirePredictionCreate(FirePredictionBase):
     pass
-
-class FirePredictionResponse(FirePredictionBase):
-    id: int
-    created_at: datetime
-
-    class Config:
-        from_attributes = True
\ No newline at end of file
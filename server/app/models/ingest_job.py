@@ -0,0 +1,46 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, func
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+from ..database import Base
+
+# SQLAlchemy модель задачи фоновой загрузки файла
+class IngestJob(Base):
+    __tablename__ = "ingest_jobs"
+
+    id = Column(String, primary_key=True)
+    type = Column(String, nullable=False)
+    filename = Column(String, nullable=True)
+    file_path = Column(String, nullable=False)
+    encoding = Column(String, nullable=False)
+    sha256 = Column(String(64), nullable=True)
+    chunk_rows = Column(Integer, nullable=False)
+    # Статус: queued, running, done, failed
+    status = Column(String, nullable=False, default="queued", index=True)
+    bytes_total = Column(BigInteger, nullable=False, default=0)
+    bytes_processed = Column(BigInteger, nullable=False, default=0)
+    rows_parsed = Column(Integer, nullable=False, default=0)
+    rows_inserted = Column(Integer, nullable=False, default=0)
+    rows_rejected = Column(Integer, nullable=False, default=0)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+# Pydantic модель для API
+class IngestJobResponse(BaseModel):
+    id: str
+    type: str
+    filename: Optional[str] = None
+    status: str
+    rows_parsed: int
+    rows_inserted: int
+    rows_rejected: int
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,51 @@
+from sqlalchemy import (
+    Column, Integer, SmallInteger, String, Float, Boolean, Date, DateTime, ForeignKey, func
+)
+from pydantic import BaseModel
+from datetime import date, datetime
+from typing import Optional
+
+from ..database import Base
+
+# SQLAlchemy модель запуска прогнозирования
+class PredictionRun(Base):
+    __tablename__ = "prediction_runs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    # SHA-256 файла модели, которой посчитан запуск
+    model_hash = Column(String(64), nullable=False)
+    # Состояние входных данных, по которому рассчитаны признаки
+    feature_snapshot_at = Column(DateTime, nullable=True)
+    # Последняя дата, за которую есть признаки (прогноз строится со следующего дня)
+    feature_date = Column(Date, nullable=True)
+    incremental = Column(Boolean, nullable=False, default=False)
+    locations = Column(Integer, nullable=False, default=0)
+    rows = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=func.now())
+
+# SQLAlchemy модель оценок запуска: одна компактная строка на (запуск, локация, день).
+# Строки запуска лежат рядом в порядке первичного ключа и никогда не перезаписываются.
+class PredictionScore(Base):
+    __tablename__ = "prediction_scores"
+
+    run_id = Column(Integer, ForeignKey("prediction_runs.id", ondelete="CASCADE"), primary_key=True)
+    location = Column(String, primary_key=True)
+    date = Column(Date, primary_key=True)
+    # float32 (REAL)
+    probability = Column(Float(precision=24), nullable=False)
+    # Код уровня риска (см. RISK_LEVEL_CODES в services/predict.py)
+    risk = Column(SmallInteger, nullable=False)
+
+# Pydantic модель для API
+class PredictionRunResponse(BaseModel):
+    id: int
+    model_hash: str
+    feature_snapshot_at: Optional[datetime] = None
+    feature_date: Optional[date] = None
+    incremental: bool
+    locations: int
+    rows: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
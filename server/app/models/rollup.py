@@ -0,0 +1,55 @@
+from sqlalchemy import Column, Integer, SmallInteger, String, Float, Date, DateTime, func
+
+from ..database import Base
+
+# Итоги по всему складу хранятся под этим значением локации
+ALL_LOCATIONS = "*"
+
+# SQLAlchemy модель дневных итогов для календаря: одна строка на дату и локацию
+# (и одна на дату по всему складу). Пересчитывается при загрузке данных и прогнозах.
+class DailyRollup(Base):
+    __tablename__ = "daily_rollup"
+
+    date = Column(Date, primary_key=True)
+    location = Column(String, primary_key=True)
+    # Погода: средние за день и преобладающее направление ветра
+    weather_rows = Column(Integer, nullable=False, default=0)
+    temperature = Column(Float, nullable=True)
+    humidity = Column(Float, nullable=True)
+    wind_speed = Column(Float, nullable=True)
+    wind_direction = Column(String, nullable=True)
+    # История возгораний
+    fire_rows = Column(Integer, nullable=False, default=0)
+    fire_count = Column(Integer, nullable=False, default=0)
+    max_severity = Column(Integer, nullable=True)
+    # Актуальные прогнозы: максимум вероятности и код уровня риска
+    prediction_rows = Column(Integer, nullable=False, default=0)
+    max_probability = Column(Float, nullable=True)
+    max_risk = Column(SmallInteger, nullable=True)
+    # Гистограмма уровней риска актуальных прогнозов
+    risk_low = Column(Integer, nullable=False, default=0)
+    risk_medium = Column(Integer, nullable=False, default=0)
+    risk_high = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=func.now())
+
+# Период, под которым хранятся итоги за все время
+ALL_PERIODS = "all"
+
+# SQLAlchemy модель агрегатов статистики: итоги по месяцам (period = YYYY-MM)
+# и за все время (period = ALL_PERIODS), по локациям и по всему складу.
+# Строятся из дневных итогов при их пересчете.
+class StatisticsAggregate(Base):
+    __tablename__ = "statistics_aggregates"
+
+    period = Column(String, primary_key=True)
+    location = Column(String, primary_key=True)
+    fire_rows = Column(Integer, nullable=False, default=0)
+    fire_count = Column(Integer, nullable=False, default=0)
+    last_fire_date = Column(Date, nullable=True)
+    weather_rows = Column(Integer, nullable=False, default=0)
+    temperature_sum = Column(Float, nullable=False, default=0.0)
+    prediction_rows = Column(Integer, nullable=False, default=0)
+    risk_low = Column(Integer, nullable=False, default=0)
+    risk_medium = Column(Integer, nullable=False, default=0)
+    risk_high = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=func.now())
@@ -0,0 +1,32 @@
+from sqlalchemy import Column, Integer, String, Float, Text, DateTime, ForeignKey, Index, func
+
+from ..database import Base
+
+# SQLAlchemy модель штабеля: координаты на карте и контур основания
+class Stack(Base):
+    __tablename__ = "stacks"
+
+    location = Column(String, primary_key=True)
+    # Точка маркера в координатах карты
+    x = Column(Float, nullable=False)
+    y = Column(Float, nullable=False)
+    # Контур основания: JSON-массив вершин [[x, y], ...]
+    footprint = Column(Text, nullable=True)
+    # Ограничивающий прямоугольник контура (или точки, если контура нет)
+    min_x = Column(Float, nullable=False)
+    min_y = Column(Float, nullable=False)
+    max_x = Column(Float, nullable=False)
+    max_y = Column(Float, nullable=False)
+    created_at = Column(DateTime, default=func.now())
+
+# SQLAlchemy модель сеточного пространственного индекса:
+# штабель записан во все ячейки, которые пересекает его прямоугольник
+class StackCell(Base):
+    __tablename__ = "stack_cells"
+    __table_args__ = (
+        Index("ix_stack_cells_location", "location"),
+    )
+
+    cell_x = Column(Integer, primary_key=True)
+    cell_y = Column(Integer, primary_key=True)
+    location = Column(String, ForeignKey("stacks.location", ondelete="CASCADE"), primary_key=True)
@@ -0,0 +1,35 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, UniqueConstraint, func
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+from ..database import Base
+
+# SQLAlchemy модель реестра загруженных файлов (по хешу содержимого)
+class UploadedFile(Base):
+    __tablename__ = "uploaded_files"
+    __table_args__ = (
+        UniqueConstraint("type", "sha256", name="uq_uploaded_files_type_sha256"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    type = Column(String, nullable=False)
+    sha256 = Column(String(64), nullable=False)
+    filename = Column(String, nullable=True)
+    file_path = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    rows = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=func.now())
+
+# Pydantic модель для API
+class UploadedFileResponse(BaseModel):
+    id: int
+    type: str
+    sha256: str
+    filename: Optional[str] = None
+    size: int
+    rows: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, DateTime, func
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Index, UniqueConstraint, func, text
 from sqlalchemy.ext.declarative import declarative_base
 from pydantic import BaseModel
 from datetime import date, datetime
@@ -7,8 +7,18 @@ from typing import Optional
 from ..database import Base
 
 # SQLAlchemy модель
+# В PostgreSQL таблица секционирована по месяцам date (миграция 0002),
+# первичный ключ в БД - (id, date)
 class Weather(Base):
     __tablename__ = "weather"
+    # Естественный ключ: одно значение на дату и локацию
+    __table_args__ = (
+        UniqueConstraint("date", "location", name="uq_weather_date_location"),
+        # Последние значения по локации (карта)
+        Index("ix_weather_location_date", "location", text("date DESC")),
+        # Диапазоны дат (дневные итоги, календарь)
+        Index("ix_weather_date_brin", "date", postgresql_using="brin"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     date = Column(Date, nullable=False)
@@ -1 +1 @@
-from . import upload, calendar, map, statistics, wind, predict
\ No newline at end of file
+from . import upload, calendar, map, statistics, wind, predict, models, stream
\ No newline at end of file
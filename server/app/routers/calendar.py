@@ -1,12 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime, date
+from typing import Optional
 import calendar
+import json
 import logging
 
-from ..database import get_db
-from ..models import CoalTemperature, Weather, FireHistory, FirePrediction
+import numpy as np
+import pandas as pd
+
+from ..database import get_read_db
+from ..models import ALL_LOCATIONS, DailyRollup, Weather, FireHistory, PredictionScore
+from ..services.instrumentation import timed
+from ..services.predict import RISK_LEVEL_CODES
+from ..services.response_cache import cache_key, cached_json, key_etag, not_modified
 
 # Создаем роутер
 router = APIRouter()
@@ -15,17 +25,190 @@ router = APIRouter()
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# Таблицы, из которых строится календарь (для сброса кеша)
+CALENDAR_TABLES = [FireHistory.__tablename__, PredictionScore.__tablename__, Weather.__tablename__]
+
+# Уровень риска по коду из дневных итогов
+RISK_LEVELS = {code: level for level, code in RISK_LEVEL_CODES.items()}
+
+# Максимальная длина периода для календаря по диапазону дат (дней)
+MAX_CALENDAR_RANGE_DAYS = 3660
+
+# Колонки ответа календаря по диапазону:
+# поле ответа -> (колонка дневных итогов, счетчик строк, без которых значения нет)
+CALENDAR_COLUMNS = {
+    "fireCount": ("fire_count", "fire_rows"),
+    "severity": ("max_severity", "fire_rows"),
+    "probability": ("max_probability", "prediction_rows"),
+    "temperature": ("temperature", "weather_rows"),
+    "humidity": ("humidity", "weather_rows"),
+    "windSpeed": ("wind_speed", "weather_rows"),
+    "windDirection": ("wind_direction", "weather_rows")
+}
+
+# Целочисленные колонки дневных итогов (после выравнивания по дням в них появляются пропуски)
+INTEGER_COLUMNS = ["fire_rows", "fire_count", "max_severity", "prediction_rows", "max_risk", "weather_rows"]
+
+
+async def load_rollup(db: AsyncSession, start_date, end_date, location=None):
+    """
+    Дневные итоги за период: по всему складу или по одной локации
+    """
+    return (await db.execute(
+        select(DailyRollup).where(
+            DailyRollup.location == (location or ALL_LOCATIONS),
+            DailyRollup.date >= start_date,
+            DailyRollup.date <= end_date
+        ).order_by(DailyRollup.date)
+    )).scalars().all()
+
+async def calendar_columns(db: AsyncSession, start_date, end_date, location=None):
+    """
+    Дневные итоги за период в колоночном виде: массив значений на каждое поле,
+    по одному элементу на каждый день периода
+
+    Строки читаются асинхронно, а выравнивание по дням в pandas
+    выполняется в пуле потоков.
+
+    Возвращает:
+    - словарь поле -> список значений (None для отсутствующих данных)
+    """
+    rows = (await db.execute(
+        select(DailyRollup.__table__).where(
+            DailyRollup.location == (location or ALL_LOCATIONS),
+            DailyRollup.date.between(start_date, end_date)
+        )
+    )).all()
+    return await run_in_threadpool(rollup_columns, rows, start_date, end_date)
+
+@timed("pandas")
+def rollup_columns(rows, start_date, end_date):
+    """
+    Выравнивание строк дневных итогов по дням периода и разбиение на колонки ответа
+    """
+    columns = [col.name for col in DailyRollup.__table__.columns]
+    dates = pd.date_range(start_date, end_date, freq="D")
+    frame = pd.DataFrame(rows, columns=columns)
+    frame = frame.set_index(pd.to_datetime(frame["date"])).reindex(dates)
+    frame = frame.astype({column: "Int64" for column in INTEGER_COLUMNS})
+    present = {
+        column: frame[column].fillna(0).to_numpy() > 0
+        for column in ("fire_rows", "prediction_rows", "weather_rows")
+    }
+
+    has_fire = present["fire_rows"]
+    has_prediction = present["prediction_rows"]
+    fire_count = frame["fire_count"].fillna(0).to_numpy()
+    risk = frame["max_risk"].fillna(-1).to_numpy()
+
+    # Статус дня по тем же правилам, что и в format_calendar_data
+    status_column = np.select(
+        [has_fire & (fire_count > 0), has_fire, has_prediction & (risk >= RISK_LEVEL_CODES["medium"]), has_prediction],
+        ["fire", "safe", "risk", "safe"],
+        default="unknown"
+    )
+
+    result = {
+        "date": [day.date().isoformat() for day in dates],
+        "status": status_column.tolist(),
+        "riskLevel": [RISK_LEVELS.get(code) for code in frame["max_risk"].astype(object).where(has_prediction, None)]
+    }
+    for field, (column, counter) in CALENDAR_COLUMNS.items():
+        values = frame[column].astype(object)
+        result[field] = values.where(values.notna() & present[counter], None).tolist()
+    return result
+
+
+def stream_columns(header, columns):
+    """
+    Потоковая запись JSON-объекта: сначала шапка, затем по одной колонке
+    """
+    yield json.dumps(header, ensure_ascii=False)[:-1] + ', "data": {'
+    for position, (field, values) in enumerate(columns.items()):
+        prefix = ", " if position else ""
+        yield f"{prefix}{json.dumps(field)}: {json.dumps(values, ensure_ascii=False)}"
+    yield "}}"
+
+
+@router.get("/calendar", status_code=status.HTTP_200_OK)
+async def get_calendar_range(
+    request: Request,
+    date_from: date = Query(..., alias="from", description="Первый день периода"),
+    date_to: date = Query(..., alias="to", description="Последний день периода"),
+    location: Optional[str] = Query(None, description="Локация (по умолчанию - весь склад)"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Получение данных календаря за произвольный период одним запросом
+
+    Ответ колоночный: в data для каждого поля массив значений по дням периода
+    (date, status, riskLevel, fireCount, severity, probability, temperature,
+    humidity, windSpeed, windDirection).
+
+    - **from**: Первый день периода (YYYY-MM-DD)
+    - **to**: Последний день периода (YYYY-MM-DD)
+    - **location**: Локация (по умолчанию - весь склад)
+    """
+    if date_from > date_to:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Начало периода должно быть не позже его конца"
+        )
+    if (date_to - date_from).days + 1 > MAX_CALENDAR_RANGE_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Период не может быть длиннее {MAX_CALENDAR_RANGE_DAYS} дней"
+        )
+
+    key = cache_key(
+        "calendar_range", {"from": date_from, "to": date_to, "location": location},
+        CALENDAR_TABLES, (date_from, date_to)
+    )
+    unchanged = not_modified(request, key)
+    if unchanged is not None:
+        return unchanged
+
+    try:
+        columns = await calendar_columns(db, date_from, date_to, location)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка при получении данных календаря: {str(e)}"
+        )
+
+    header = {
+        "success": True,
+        "from": date_from.isoformat(),
+        "to": date_to.isoformat(),
+        "location": location
+    }
+    # Тело отдается по частям, поэтому ETag из хеша тела недоступен:
+    # он выдается из ключа, только если версии данных общие для процессов
+    headers = {"Cache-Control": "no-cache"}
+    etag = key_etag(key)
+    if etag is not None:
+        headers["ETag"] = etag
+    return StreamingResponse(
+        stream_columns(header, columns),
+        media_type="application/json",
+        headers=headers
+    )
+
+
 @router.get("/calendar/{year}/{month}", status_code=status.HTTP_200_OK)
 async def get_calendar_data(
     year: int,
     month: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    location: Optional[str] = Query(None, description="Локация (по умолчанию - весь склад)"),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Получение данных для календаря за указанный месяц
     
     - **year**: Год (например, 2023)
     - **month**: Месяц (1-12)
+    - **location**: Локация (по умолчанию - весь склад)
     """
     try:
         # Проверяем корректность параметров
@@ -40,39 +223,23 @@ async def get_calendar_data(
         last_day = calendar.monthrange(year, month)[1]
         end_date = date(year, month, last_day)
         
-        # Получаем данные из базы данных за указанный месяц
-        fire_history = db.query(FireHistory).filter(
-            FireHistory.date >= start_date,
-            FireHistory.date <= end_date
-        ).all()
-        
-        predictions = db.query(FirePrediction).filter(
-            FirePrediction.date >= start_date,
-            FirePrediction.date <= end_date
-        ).all()
-        
-        weather = db.query(Weather).filter(
-            Weather.date >= start_date,
-            Weather.date <= end_date
-        ).all()
-        
-        # Логирование результатов запросов
-        logger.info(f"Fire history records: {len(fire_history)}")
-        logger.info(f"Fire predictions records: {len(predictions)}")
-        logger.info(f"Weather records: {len(weather)}")
-        
-        # Форматируем данные для календаря
-        calendar_data = format_calendar_data(
-            fire_history,
-            predictions,
-            weather,
-            [],  # Пустой список для температуры угля
-            year,
-            month
+        async def build():
+            # Дневные итоги за месяц: не больше одной строки на день
+            rollup = await load_rollup(db, start_date, end_date, location)
+            logger.info(f"Daily rollup records: {len(rollup)}")
+
+            # Форматируем данные для календаря
+            calendar_data = format_calendar_data(rollup, year, month)
+
+            return {"success": True, "data": calendar_data}
+
+        key = cache_key(
+            "calendar", {"year": year, "month": month, "location": location}, CALENDAR_TABLES, (start_date, end_date)
         )
-        
-        return {"success": True, "data": calendar_data}
-    
+        return await cached_json(request, key, build)
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -84,7 +251,9 @@ async def get_calendar_data_with_day(
     year: int,
     month: int,
     day: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    location: Optional[str] = Query(None, description="Локация (по умолчанию - весь склад)"),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Получение данных для календаря за указанный день
@@ -92,6 +261,7 @@ async def get_calendar_data_with_day(
     - **year**: Год (например, 2023)
     - **month**: Месяц (1-12)
     - **day**: День (1-31)
+    - **location**: Локация (по умолчанию - весь склад)
     """
     try:
         # Проверяем корректность параметров
@@ -110,32 +280,32 @@ async def get_calendar_data_with_day(
         # Формируем дату
         target_date = date(year, month, day)
 
-        # Получаем данные из базы данных за указанный день
-        fire_history = db.query(FireHistory).filter(FireHistory.date == target_date).all()
-        predictions = db.query(FirePrediction).filter(FirePrediction.date == target_date).all()
-        weather = db.query(Weather).filter(Weather.date == target_date).all()
-
-        # Форматируем данные для календаря
-        calendar_data = format_calendar_data(
-            fire_history,
-            predictions,
-            weather,
-            [],  # Пустой список для температуры угля
-            year,
-            month
-        )
+        async def build():
+            # Дневные итоги за день
+            rollup = await load_rollup(db, target_date, target_date, location)
 
-        return {"success": True, "data": calendar_data}
+            # Форматируем данные для календаря
+            calendar_data = format_calendar_data(rollup, year, month)
 
+            return {"success": True, "data": calendar_data}
+
+        key = cache_key(
+            "calendar_day", {"year": year, "month": month, "day": day, "location": location},
+            CALENDAR_TABLES, (target_date, target_date)
+        )
+        return await cached_json(request, key, build)
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Ошибка при получении данных календаря: {str(e)}"
         )
 
-def format_calendar_data(fire_history, predictions, weather, coal_temp, year, month):
+def format_calendar_data(rollup, year, month):
     """
-    Форматирование данных для календаря
+    Форматирование дневных итогов для календаря
     """
     # Создаем словарь с данными для каждого дня месяца
     calendar_data = {}
@@ -154,33 +324,34 @@ def format_calendar_data(fire_history, predictions, weather, coal_temp, year, mo
             "status": "unknown"
         }
     
-    # Заполняем данные о пожарах
-    for fire in fire_history:
-        date_str = fire.date.isoformat()
-        if date_str in calendar_data:
-            calendar_data[date_str]["fire"] = {
-                "hasFire": fire.has_fire,
-                "severity": fire.severity
+    # Заполняем данные по дням из итогов
+    for row in rollup:
+        date_str = row.date.isoformat()
+        if date_str not in calendar_data:
+            continue
+        day_data = calendar_data[date_str]
+
+        # Пожары: был ли хотя бы один и максимальная тяжесть
+        if row.fire_rows:
+            day_data["fire"] = {
+                "hasFire": row.fire_count > 0,
+                "severity": row.max_severity
             }
-    
-    # Заполняем данные о прогнозах
-    for prediction in predictions:
-        date_str = prediction.date.isoformat()
-        if date_str in calendar_data:
-            calendar_data[date_str]["prediction"] = {
-                "probability": prediction.fire_probability,
-                "riskLevel": prediction.risk_level
+
+        # Прогнозы: максимальная вероятность и уровень риска
+        if row.prediction_rows:
+            day_data["prediction"] = {
+                "probability": row.max_probability,
+                "riskLevel": RISK_LEVELS.get(row.max_risk)
             }
-    
-    # Заполняем данные о погоде
-    for w in weather:
-        date_str = w.date.isoformat()
-        if date_str in calendar_data:
-            calendar_data[date_str]["weather"] = {
-                "temperature": w.temperature,
-                "humidity": w.humidity,
-                "windSpeed": w.wind_speed,
-                "windDirection": w.wind_direction
+
+        # Погода: средние за день
+        if row.weather_rows:
+            day_data["weather"] = {
+                "temperature": row.temperature,
+                "humidity": row.humidity,
+                "windSpeed": row.wind_speed,
+                "windDirection": row.wind_direction
             }
     
     # Определяем статус дня для календаря
@@ -1,80 +1,191 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-import random
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, union
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+import json
 
-from ..database import get_db
-from ..models import FireHistory, FirePrediction, Weather
+from ..database import get_read_db
+from ..models import FireHistory, PredictionScore, PredictionWatermark, Stack, Weather
+from ..services.prediction_state import latest_scores
+from ..services.response_cache import cache_key, cached_json
+from ..services.stacks import FOOTPRINT_MIN_ZOOM, placeholder_coordinates, stacks_in_view
 
 # Создаем роутер
 router = APIRouter()
 
+# Таблицы, из которых строится карта (для сброса кеша)
+MAP_TABLES = [
+    Stack.__tablename__, FireHistory.__tablename__, PredictionScore.__tablename__, Weather.__tablename__
+]
+
+
+def latest_per_location(query, location, date, locations=None, dialect=None):
+    """
+    Последняя по дате строка для каждой локации
+
+    В PostgreSQL (dialect) - DISTINCT ON (location) с сортировкой
+    location, date DESC: строки читаются по индексу (location, date DESC)
+    и без нумерации всей истории. В остальных СУБД строки нумеруются
+    оконной функцией ROW_NUMBER() внутри локации, остается первая.
+    Если задан запрос locations, выбираются только строки этих локаций.
+    """
+    if locations is not None:
+        query = query.where(location.in_(locations))
+    if dialect == "postgresql":
+        return query.distinct(location).order_by(location, date.desc()).subquery()
+    ranked = query.add_columns(
+        func.row_number().over(partition_by=location, order_by=date.desc()).label("row_number")
+    ).subquery()
+    return select(ranked).where(ranked.c.row_number == 1).subquery()
+
+
+def map_query(view=None, dialect=None):
+    """
+    Один запрос с геометрией, последними пожаром, прогнозом и погодой
+
+    Параметры:
+    - view: область просмотра (min_x, min_y, max_x, max_y); если задана,
+      возвращаются только попавшие в нее штабели, иначе - все локации
+    - dialect: имя СУБД (см. latest_per_location)
+    """
+    visible = None
+    if view is not None:
+        visible = stacks_in_view(*view)
+        locations = visible.subquery()
+    else:
+        locations = union(
+            select(Stack.location),
+            select(FireHistory.location),
+            select(PredictionWatermark.location).where(PredictionWatermark.run_id.isnot(None))
+        ).subquery()
+
+    fire = latest_per_location(
+        select(FireHistory.location, FireHistory.date, FireHistory.has_fire, FireHistory.severity),
+        FireHistory.location, FireHistory.date, visible, dialect
+    )
+    prediction = latest_per_location(
+        latest_scores(), PredictionScore.location, PredictionScore.date, visible, dialect
+    )
+    weather = latest_per_location(
+        select(
+            Weather.location, Weather.date, Weather.temperature,
+            Weather.humidity, Weather.wind_speed, Weather.wind_direction
+        ),
+        Weather.location, Weather.date, visible, dialect
+    )
+
+    return select(
+        locations.c.location,
+        Stack.x,
+        Stack.y,
+        Stack.footprint,
+        fire.c.date.label("fire_date"),
+        fire.c.has_fire,
+        fire.c.severity,
+        prediction.c.date.label("prediction_date"),
+        prediction.c.fire_probability,
+        prediction.c.risk_level,
+        weather.c.date.label("weather_date"),
+        weather.c.temperature,
+        weather.c.humidity,
+        weather.c.wind_speed,
+        weather.c.wind_direction
+    ).select_from(
+        locations
+        .outerjoin(Stack, Stack.location == locations.c.location)
+        .outerjoin(fire, fire.c.location == locations.c.location)
+        .outerjoin(prediction, prediction.c.location == locations.c.location)
+        .outerjoin(weather, weather.c.location == locations.c.location)
+    ).order_by(locations.c.location)
+
+
+def format_map_rows(rows, with_footprints=True):
+    """
+    Элементы ответа карты по строкам map_query()
+    """
+    location_data = []
+
+    for row in rows:
+        # Локации без загруженной геометрии получают постоянную условную точку
+        if row.x is not None:
+            coordinates = {"x": row.x, "y": row.y}
+        else:
+            coordinates = placeholder_coordinates(row.location)
+
+        item = {
+            "location": row.location,
+            "coordinates": coordinates,
+            "fire": {
+                "date": row.fire_date.isoformat(),
+                "has_fire": row.has_fire,
+                "severity": row.severity
+            } if row.fire_date else None,
+            "prediction": {
+                "date": row.prediction_date.isoformat(),
+                "fire_probability": row.fire_probability,
+                "risk_level": row.risk_level
+            } if row.prediction_date else None,
+            "weather": {
+                "date": row.weather_date.isoformat(),
+                "temperature": row.temperature,
+                "humidity": row.humidity,
+                "wind_speed": row.wind_speed,
+                "wind_direction": row.wind_direction
+            } if row.weather_date else None
+        }
+        if with_footprints:
+            item["footprint"] = json.loads(row.footprint) if row.footprint else None
+        location_data.append(item)
+
+    return location_data
+
+
 @router.get("/map", status_code=status.HTTP_200_OK)
-async def get_map_data(db: Session = Depends(get_db)):
+async def get_map_data(
+    request: Request,
+    min_x: Optional[float] = Query(None, description="Левая граница области просмотра"),
+    min_y: Optional[float] = Query(None, description="Нижняя граница области просмотра"),
+    max_x: Optional[float] = Query(None, description="Правая граница области просмотра"),
+    max_y: Optional[float] = Query(None, description="Верхняя граница области просмотра"),
+    zoom: Optional[int] = Query(None, ge=0, description="Уровень масштаба (контуры штабелей - с уровня FOOTPRINT_MIN_ZOOM)"),
+    db: AsyncSession = Depends(get_read_db)
+):
     """
     Получение данных для карты с информацией о локациях, пожарах и прогнозах
+
+    Если задана область просмотра, возвращаются только видимые в ней штабели.
     """
     try:
-        # Получаем уникальные локации
-        locations_query = """
-            SELECT DISTINCT location FROM (
-                SELECT location FROM fire_history
-                UNION
-                SELECT location FROM fire_predictions
-            ) AS locations
-        """
-        locations_result = db.execute(locations_query).fetchall()
-        
-        location_data = []
-        
-        for loc in locations_result:
-            location = loc[0]
-            
-            # Получаем последние данные о пожарах для этой локации
-            fire_data = db.query(FireHistory).filter(
-                FireHistory.location == location
-            ).order_by(FireHistory.date.desc()).first()
-            
-            # Получаем последние прогнозы для этой локации
-            prediction_data = db.query(FirePrediction).filter(
-                FirePrediction.location == location
-            ).order_by(FirePrediction.date.desc()).first()
-            
-            # Получаем последние погодные данные для этой локации
-            weather_data = db.query(Weather).filter(
-                Weather.location == location
-            ).order_by(Weather.date.desc()).first()
-            
-            # Генерируем координаты для точки (в реальной системе будут геокоординаты)
-            x = int(10 + random.random() * 80)
-            y = int(10 + random.random() * 80)
-            
-            location_data.append({
-                "location": location,
-                "coordinates": {"x": x, "y": y},
-                "fire": {
-                    "date": fire_data.date.isoformat() if fire_data else None,
-                    "has_fire": fire_data.has_fire if fire_data else False,
-                    "severity": fire_data.severity if fire_data else 0
-                } if fire_data else None,
-                "prediction": {
-                    "date": prediction_data.date.isoformat() if prediction_data else None,
-                    "fire_probability": prediction_data.fire_probability if prediction_data else 0,
-                    "risk_level": prediction_data.risk_level if prediction_data else "low"
-                } if prediction_data else None,
-                "weather": {
-                    "date": weather_data.date.isoformat() if weather_data else None,
-                    "temperature": weather_data.temperature if weather_data else 0,
-                    "humidity": weather_data.humidity if weather_data else 0,
-                    "wind_speed": weather_data.wind_speed if weather_data else 0,
-                    "wind_direction": weather_data.wind_direction if weather_data else None
-                } if weather_data else None
-            })
-        
-        return {"success": True, "data": location_data}
-    
+        bounds = (min_x, min_y, max_x, max_y)
+        view = None
+        if any(value is not None for value in bounds):
+            if any(value is None for value in bounds):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Область просмотра задается всеми параметрами min_x, min_y, max_x, max_y"
+                )
+            if min_x > max_x or min_y > max_y:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Некорректная область просмотра"
+                )
+            view = bounds
+
+        with_footprints = zoom is None or zoom >= FOOTPRINT_MIN_ZOOM
+
+        async def build():
+            rows = (await db.execute(map_query(view, db.get_bind().dialect.name))).all()
+            location_data = await run_in_threadpool(format_map_rows, rows, with_footprints)
+            return {"success": True, "data": location_data}
+
+        params = {"view": view, "footprints": with_footprints}
+        return await cached_json(request, cache_key("map", params, MAP_TABLES), build)
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Ошибка при получении данных карты: {str(e)}"
-        )
\ No newline at end of file
+        )
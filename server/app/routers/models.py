@@ -0,0 +1,109 @@
+from fastapi import APIRouter, File, Form, HTTPException, UploadFile, status
+from starlette.concurrency import run_in_threadpool
+from datetime import datetime
+import os
+import shutil
+import tempfile
+import logging
+
+from ..services.model_registry import ModelRegistryError, registry
+
+logger = logging.getLogger(__name__)
+
+# Создаем роутер
+router = APIRouter()
+
+
+def register_upload(file: UploadFile, version=None, trained_at=None):
+    """
+    Регистрация загруженного файла модели (синхронно: хеширование и пробная загрузка)
+    """
+    descriptor, path = tempfile.mkstemp(suffix=".txt")
+    try:
+        with os.fdopen(descriptor, "wb") as model_file:
+            shutil.copyfileobj(file.file, model_file)
+        return registry.register(path, version, trained_at)
+    finally:
+        os.remove(path)
+
+
+def _not_found(e):
+    return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+
+@router.get("/models", status_code=status.HTTP_200_OK)
+async def list_models():
+    """
+    Версии моделей в реестре и состояние моделей этого процесса:
+    активная и теневая версии, загружаемые версии и последний отчет теневой оценки
+    """
+    versions = await run_in_threadpool(registry.versions)
+    state = await run_in_threadpool(registry.status)
+    return {"success": True, "data": versions, "status": state}
+
+
+@router.post("/models", status_code=status.HTTP_201_CREATED)
+async def upload_model(
+    file: UploadFile = File(...),
+    version: str = Form(None),
+    trained_at: datetime = Form(None)
+):
+    """
+    Регистрация новой версии модели (текстовый файл LightGBM)
+
+    Модель не становится активной: для переключения используется
+    POST /api/models/{version}/activate, для проверки - теневая оценка.
+
+    - **file**: Файл модели (model.txt)
+    - **version**: Имя версии (по умолчанию - дата обучения и начало SHA-256)
+    - **trained_at**: Дата обучения (по умолчанию - время изменения файла)
+    """
+    try:
+        metadata = await run_in_threadpool(register_upload, file, version, trained_at)
+    except ModelRegistryError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        logger.exception(f"Не удалось зарегистрировать модель {file.filename}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Файл не является поддерживаемой моделью: {str(e)}"
+        )
+    return {"success": True, "data": metadata}
+
+
+@router.post("/models/{version}/activate", status_code=status.HTTP_202_ACCEPTED)
+async def activate_model(version: str):
+    """
+    Назначение активной версии
+
+    Модель загружается в фоне и заменяет текущую после загрузки: прогнозы,
+    начатые раньше, дорабатывают на прежней модели. Другие процессы сервера
+    переключаются при следующей проверке реестра (MODEL_REFRESH_SECONDS).
+    """
+    try:
+        await run_in_threadpool(registry.activate, version)
+    except ModelRegistryError as e:
+        raise _not_found(e)
+    return {"success": True, "message": f"Модель {version} загружается и станет активной после загрузки"}
+
+
+@router.post("/models/{version}/shadow", status_code=status.HTTP_202_ACCEPTED)
+async def shadow_model(version: str):
+    """
+    Назначение версии для теневой оценки: каждый прогноз дополнительно
+    оценивается этой моделью в фоне, расхождения пишутся в лог и в GET /api/models
+    """
+    try:
+        await run_in_threadpool(registry.set_shadow, version)
+    except ModelRegistryError as e:
+        raise _not_found(e)
+    return {"success": True, "message": f"Модель {version} загружается для теневой оценки"}
+
+
+@router.delete("/models/shadow", status_code=status.HTTP_200_OK)
+async def stop_shadow():
+    """
+    Выключение теневой оценки
+    """
+    await run_in_threadpool(registry.set_shadow, None)
+    return {"success": True, "message": "Теневая оценка выключена"}
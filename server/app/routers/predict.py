@@ -1,142 +1,178 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-import pandas as pd
-from datetime import datetime, timedelta
-import random
-
-from ..database import get_db
-from ..models import (
-    CoalTemperature, Weather, FireHistory, 
-    FirePrediction, FirePredictionCreate
+from starlette.concurrency import run_in_threadpool
+import threading
+
+from ..database import get_db, get_read_db
+from ..models import PredictionRun, PredictionRunResponse, PredictionScore
+from ..services.bulk_loader import advisory_xact_lock
+from ..services.features import feature_pipeline
+from ..services.predict import get_model, predict_fires
+from ..services.prediction_state import (
+    changed_locations, data_state, load_history, lookback_start,
+    save_predictions, save_watermarks, scored_date_range, start_run, summarize_predictions
 )
-from ..services.predict import predict_fires
+from ..services.response_cache import invalidate
+from ..services.rollup import refresh_daily_rollup
 
 # Создаем роутер
 router = APIRouter()
 
+# Прогнозы процесса рассчитываются по очереди: все запуски пользуются общим
+# конвейером признаков, а полный пересчет его сбрасывает
+_predict_lock = threading.Lock()
+
+def run_predictions(db: Session, incremental=False, summary=False):
+    """
+    Расчет и сохранение прогнозов (синхронно: pandas, модель и COPY через psycopg2)
+
+    В инкрементальном режиме оцениваются только локации, данные которых
+    изменились с прошлого прогноза, и загружается только окно истории,
+    нужное для расчета их признаков.
+
+    Запуски выполняются по очереди: в процессе - под _predict_lock,
+    между процессами сервера (PostgreSQL) - под блокировкой транзакции.
+    """
+    with _predict_lock:
+        advisory_xact_lock(db, PredictionRun.__tablename__)
+        try:
+            return _run_predictions(db, incremental, summary)
+        finally:
+            # Транзакция (и ее блокировка) завершается до освобождения
+            # _predict_lock, в том числе без записи прогнозов
+            db.rollback()
+
+
+def _run_predictions(db: Session, incremental, summary):
+    state = data_state(db)
+    if state.empty:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Недостаточно данных для создания прогнозов"
+        )
+
+    if incremental:
+        locations = changed_locations(db, state)
+        skipped = len(state) - len(locations)
+        if not locations:
+            result = {
+                "success": True,
+                "message": "Новых данных нет, прогнозы актуальны",
+                "scored_locations": 0,
+                "skipped_locations": skipped
+            }
+            if summary:
+                result["summary"] = summarize_predictions([])
+            else:
+                result["predictions"] = []
+            return result
+        coal_df, weather_df = load_history(db, locations, lookback_start(state, locations))
+    else:
+        locations = state.index.tolist()
+        skipped = 0
+        coal_df, weather_df = load_history(db)
+        # Полный пересчет строит признаки заново по всей истории
+        feature_pipeline.reset()
+
+    if weather_df.empty:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Недостаточно данных для создания прогнозов"
+        )
+
+    # Модель берется один раз: замена активной модели во время расчета
+    # не смешивает оценки и хеш модели в запуске
+    model = get_model()
+    predictions = predict_fires(coal_df, weather_df, locations=locations, model=model)
+
+    # Запуск становится актуальным только для локаций, получивших оценки:
+    # иначе он скрыл бы их прежние прогнозы, не дав новых
+    scored = sorted({pred["location"] for pred in predictions})
+    if not scored:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Недостаточно данных для создания прогнозов"
+        )
+    skipped += len(locations) - len(scored)
+    locations = scored
+
+    # Оценки сохраняются новым запуском, актуальный запуск локаций
+    # переключается водяными знаками в той же транзакции
+    previous_from, previous_to = scored_date_range(db, locations)
+    run = start_run(db, state, locations, incremental, model.sha256)
+    stats = save_predictions(db, run, predictions)
+    save_watermarks(db, state, locations, run.id)
+
+    # Дневные итоги пересчитываются за даты старых и новых оценок
+    if predictions:
+        dates = [pred["date"] for pred in predictions] + [d for d in (previous_from, previous_to) if d]
+        refresh_daily_rollup(db, min(dates), max(dates))
+    db.commit()
+    # Новый запуск скрывает все оценки предыдущих запусков этих локаций,
+    # поэтому сбрасываются ответы по всем датам
+    invalidate(PredictionScore.__tablename__)
+
+    result = {
+        "success": True,
+        "message": "Прогнозы успешно созданы и сохранены",
+        "run": PredictionRunResponse.model_validate(run).model_dump(),
+        "scored_locations": len(locations),
+        "skipped_locations": skipped,
+        "stats": stats
+    }
+    if summary:
+        result["summary"] = summarize_predictions(predictions)
+    else:
+        result["predictions"] = [
+            {
+                "date": pred["date"].isoformat(),
+                "location": pred["location"],
+                "probability": pred["probability"],
+                "risk_level": pred["risk_level"]
+            } for pred in predictions
+        ]
+    return result
+
+
 @router.post("/predict", status_code=status.HTTP_200_OK)
-async def generate_predictions(db: Session = Depends(get_db)):
+async def generate_predictions(
+    incremental: bool = Query(False, description="Пересчитать только локации с новыми данными"),
+    summary: bool = Query(False, description="Вернуть сводку вместо списка прогнозов"),
+    db: Session = Depends(get_db)
+):
     """
     Создание прогнозов возгораний на основе имеющихся данных
+
+    Расчет выполняется в пуле потоков и не блокирует цикл событий,
+    поэтому остальные запросы обслуживаются во время прогноза.
     """
     try:
-        # Получаем данные для модели
-        coal_temp_data = db.query(CoalTemperature).all()
-        weather_data = db.query(Weather).all()
-        fire_history_data = db.query(FireHistory).all()
-        
-        if not coal_temp_data or not weather_data or not fire_history_data:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Недостаточно данных для создания прогнозов"
-            )
-        
-        # Преобразуем данные в pandas DataFrames для модели ML
-        coal_df = pd.DataFrame([{
-            'date': data.date,
-            'location': data.location,
-            'temperature': data.temperature
-        } for data in coal_temp_data])
-        
-        weather_df = pd.DataFrame([{
-            'date': data.date,
-            'location': data.location,
-            'temperature': data.temperature,
-            'humidity': data.humidity,
-            'wind_speed': data.wind_speed,
-            'wind_direction': data.wind_direction
-        } for data in weather_data])
-        
-        fire_df = pd.DataFrame([{
-            'date': data.date,
-            'location': data.location,
-            'has_fire': data.has_fire,
-            'severity': data.severity
-        } for data in fire_history_data])
-        
-        # Получаем прогнозы от модели
-        # В будущем вызовем ML-модель
-        predictions = generate_mock_predictions(coal_df, weather_df, fire_df)
-        
-        # Сохраняем прогнозы в базу данных
-        saved_predictions = []
-        for pred in predictions:
-            # Проверяем, нет ли уже прогноза на эту дату и локацию
-            existing = db.query(FirePrediction).filter(
-                FirePrediction.date == pred['date'],
-                FirePrediction.location == pred['location']
-            ).first()
-            
-            if existing:
-                existing.fire_probability = pred['probability']
-                existing.risk_level = pred['risk_level']
-                db.add(existing)
-                saved_predictions.append(existing)
-            else:
-                new_prediction = FirePrediction(
-                    date=pred['date'],
-                    location=pred['location'],
-                    fire_probability=pred['probability'],
-                    risk_level=pred['risk_level']
-                )
-                db.add(new_prediction)
-                saved_predictions.append(new_prediction)
-        
-        db.commit()
-        
-        return {
-            "success": True,
-            "message": "Прогнозы успешно созданы и сохранены",
-            "predictions": [
-                {
-                    "date": pred.date.isoformat(),
-                    "location": pred.location,
-                    "probability": pred.fire_probability,
-                    "risk_level": pred.risk_level
-                } for pred in saved_predictions
-            ]
-        }
-    
+        return await run_in_threadpool(run_predictions, db, incremental, summary)
+
+    except HTTPException:
+        raise
     except Exception as e:
+        await run_in_threadpool(db.rollback)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Ошибка при создании прогнозов: {str(e)}"
         )
 
-def generate_mock_predictions(coal_df, weather_df, fire_df):
+
+@router.get("/predict/runs", status_code=status.HTTP_200_OK)
+async def list_prediction_runs(
+    limit: int = Query(20, ge=1, le=1000, description="Количество последних запусков"),
+    db: AsyncSession = Depends(get_read_db)
+):
     """
-    Генерирует имитационные прогнозы (будет заменена на реальную модель)
+    Последние запуски прогнозирования (для сравнения моделей и запусков)
     """
-    predictions = []
-    
-    # Получаем уникальные локации
-    locations = fire_df['location'].unique()
-    
-    # Получаем последнюю дату из истории
-    latest_date = fire_df['date'].max()
-    current_date = datetime.combine(latest_date, datetime.min.time())
-    
-    # Генерируем прогнозы на следующие 30 дней
-    for i in range(1, 31):
-        pred_date = current_date + timedelta(days=i)
-        
-        for location in locations:
-            probability = random.random()  # Случайная вероятность для имитации
-            
-            # Определяем уровень риска на основе вероятности
-            if probability > 0.7:
-                risk_level = "high"
-            elif probability > 0.4:
-                risk_level = "medium"
-            else:
-                risk_level = "low"
-            
-            predictions.append({
-                "date": pred_date.date(),
-                "location": location,
-                "probability": probability,
-                "risk_level": risk_level
-            })
-    
-    return predictions
\ No newline at end of file
+    runs = (await db.execute(
+        select(PredictionRun).order_by(PredictionRun.id.desc()).limit(limit)
+    )).scalars().all()
+    return {
+        "success": True,
+        "data": [PredictionRunResponse.model_validate(run).model_dump() for run in runs]
+    }
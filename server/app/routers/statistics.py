@@ -1,66 +1,127 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
-from datetime import datetime, date
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from datetime import datetime
+from typing import Optional
 
-from ..database import get_db
-from ..models import FireHistory, FirePrediction, Weather
+from ..database import get_read_db
+from ..models import ALL_LOCATIONS, ALL_PERIODS, FireHistory, PredictionScore, StatisticsAggregate, Weather
+from ..services.response_cache import cache_key, cached_json
+from ..services.statistics import aggregate_summary, current_risk_histogram, get_aggregate
 
 # Создаем роутер
 router = APIRouter()
 
+# Таблицы, из которых строится статистика (для сброса кеша)
+STATISTICS_TABLES = [FireHistory.__tablename__, PredictionScore.__tablename__, Weather.__tablename__]
+
 @router.get("/statistics", status_code=status.HTTP_200_OK)
-async def get_statistics(db: Session = Depends(get_db)):
+async def get_statistics(
+    request: Request,
+    location: Optional[str] = Query(None, description="Локация (по умолчанию - весь склад)"),
+    db: AsyncSession = Depends(get_read_db)
+):
     """
     Получение общей статистики о возгораниях, погоде и рисках
+
+    Показатели читаются из предрассчитанных агрегатов, а не из исходных таблиц.
     """
     try:
-        # Общее количество пожаров
-        total_fires = db.query(func.count(FireHistory.id)).filter(
-            FireHistory.has_fire == True
-        ).scalar()
-        
-        # Последний пожар
-        last_fire = db.query(FireHistory).filter(
-            FireHistory.has_fire == True
-        ).order_by(FireHistory.date.desc()).first()
-        
-        # Дни без пожаров (с последнего пожара)
-        days_since_last_fire = 0
-        if last_fire:
-            days_since_last_fire = (datetime.now().date() - last_fire.date).days
-        
-        # Средняя температура
-        avg_temp = db.query(func.avg(Weather.temperature)).scalar()
-        
-        # Текущий уровень риска (на основе последних прогнозов)
-        current_risk_subquery = db.query(
-            FirePrediction.risk_level, 
-            func.count(FirePrediction.id).label('count')
-        ).filter(
-            FirePrediction.date >= datetime.now().date()
-        ).group_by(
-            FirePrediction.risk_level
-        ).order_by(
-            desc('count')
-        ).first()
-        
-        current_risk_level = "Неизвестно"
-        if current_risk_subquery:
-            current_risk_level = current_risk_subquery[0]
-        
-        return {
-            "success": True,
-            "data": {
-                "totalFires": total_fires or 0,
-                "daysSinceLastFire": days_since_last_fire,
-                "averageTemperature": round(avg_temp, 1) if avg_temp else 0,
-                "currentRiskLevel": current_risk_level
+        async def build():
+            today = datetime.now().date()
+            aggregate = await get_aggregate(db, ALL_PERIODS, location)
+            summary = aggregate_summary(aggregate)
+
+            # Дни без пожаров (с последнего пожара)
+            days_since_last_fire = 0
+            if aggregate is not None and aggregate.last_fire_date:
+                days_since_last_fire = (today - aggregate.last_fire_date).days
+
+            # Текущий уровень риска: самый частый среди прогнозов на сегодня и далее
+            histogram = await current_risk_histogram(db, location, today)
+            current_risk_level = "Неизвестно"
+            if any(histogram.values()):
+                current_risk_level = max(histogram, key=histogram.get)
+
+            return {
+                "success": True,
+                "data": {
+                    "totalFires": summary["fires"],
+                    "daysSinceLastFire": days_since_last_fire,
+                    "averageTemperature": summary["averageTemperature"] or 0,
+                    "currentRiskLevel": current_risk_level,
+                    "currentRiskLevels": histogram
+                }
             }
-        }
-    
+
+        # Статистика зависит от текущей даты (дни без пожаров, будущие прогнозы)
+        params = {"today": datetime.now().date(), "location": location}
+        return await cached_json(request, cache_key("statistics", params, STATISTICS_TABLES), build)
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка при получении статистики: {str(e)}"
+        )
+
+@router.get("/statistics/monthly", status_code=status.HTTP_200_OK)
+async def get_monthly_statistics(
+    request: Request,
+    location: Optional[str] = Query(None, description="Локация (по умолчанию - весь склад)"),
+    period_from: Optional[str] = Query(None, alias="from", pattern=r"^\d{4}-\d{2}$", description="Первый месяц (YYYY-MM)"),
+    period_to: Optional[str] = Query(None, alias="to", pattern=r"^\d{4}-\d{2}$", description="Последний месяц (YYYY-MM)"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Статистика по месяцам: пожары, средняя температура и уровни риска прогнозов
+    """
+    try:
+        async def build():
+            query = select(StatisticsAggregate).where(
+                StatisticsAggregate.location == (location or ALL_LOCATIONS),
+                StatisticsAggregate.period != ALL_PERIODS
+            )
+            if period_from:
+                query = query.where(StatisticsAggregate.period >= period_from)
+            if period_to:
+                query = query.where(StatisticsAggregate.period <= period_to)
+            rows = (await db.execute(query.order_by(StatisticsAggregate.period))).scalars().all()
+            return {
+                "success": True,
+                "data": [{"period": row.period, **aggregate_summary(row)} for row in rows]
+            }
+
+        params = {"location": location, "from": period_from, "to": period_to}
+        return await cached_json(request, cache_key("statistics_monthly", params, STATISTICS_TABLES), build)
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка при получении статистики: {str(e)}"
+        )
+
+@router.get("/statistics/locations", status_code=status.HTTP_200_OK)
+async def get_location_statistics(request: Request, db: AsyncSession = Depends(get_read_db)):
+    """
+    Статистика за все время по каждой локации
+    """
+    try:
+        async def build():
+            rows = (await db.execute(
+                select(StatisticsAggregate).where(
+                    StatisticsAggregate.period == ALL_PERIODS,
+                    StatisticsAggregate.location != ALL_LOCATIONS
+                ).order_by(StatisticsAggregate.location)
+            )).scalars().all()
+            return {
+                "success": True,
+                "data": [{"location": row.location, **aggregate_summary(row)} for row in rows]
+            }
+
+        return await cached_json(request, cache_key("statistics_locations", {}, STATISTICS_TABLES), build)
+
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Ошибка при получении статистики: {str(e)}"
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,99 @@
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
+from typing import Optional
+import logging
+
+from ..services.data_processor import MAX_REPORTED_REJECTS
+from ..services.streaming import STREAM_TYPES, get_ingestor
+
+logger = logging.getLogger(__name__)
+
+# Создаем роутер
+router = APIRouter()
+
+
+def _check_type(type):
+    if type is not None and type not in STREAM_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Неизвестный тип показаний. Поддерживаемые типы: coal, weather"
+        )
+
+
+def _add_result(totals, result):
+    totals["accepted"] += result["accepted"]
+    totals["rejected"] += result["rejected"]
+    room = MAX_REPORTED_REJECTS - len(totals["rejects"])
+    totals["rejects"].extend(result["rejects"][:room])
+
+
+@router.post("/stream", status_code=status.HTTP_200_OK)
+async def stream_readings(
+    request: Request,
+    type: Optional[str] = Query(None, description="Тип показаний строк без поля type (coal, weather)"),
+    wait: bool = Query(False, description="Ответить после записи принятых показаний в БД")
+):
+    """
+    Потоковый прием показаний датчиков в формате NDJSON
+
+    Тело запроса (можно передавать по частям, Transfer-Encoding: chunked) -
+    объекты JSON по одному на строку с полями CSV-файлов coal или weather
+    и полем type, например
+    {"type": "coal", "date": "2024-03-01T10:15:00", "location": "Штабель 1", "temperature": 41.5}.
+    Строки разбираются по мере поступления, показания записываются
+    в БД микропакетами; если БД не успевает, чтение тела приостанавливается.
+
+    - **type**: Тип показаний для строк без поля type
+    - **wait**: Дождаться записи в БД (иначе показания записываются в течение STREAM_FLUSH_SECONDS)
+    """
+    _check_type(type)
+    ingestor = get_ingestor()
+    totals = {"accepted": 0, "rejected": 0, "rejects": []}
+    tail, line = b"", 1
+    async for chunk in request.stream():
+        lines = (tail + chunk).split(b"\n")
+        # Последняя строка может быть не дочитана
+        tail = lines.pop()
+        # Большие части тела разбираются порциями: обратное давление
+        # срабатывает между ними, а не после разбора всей части
+        for start in range(0, len(lines), ingestor.batch_rows):
+            portion = lines[start:start + ingestor.batch_rows]
+            _add_result(totals, await ingestor.submit(portion, line, type))
+            line += len(portion)
+    if tail.strip():
+        _add_result(totals, await ingestor.submit([tail], line, type))
+
+    written = await ingestor.sync() if wait else False
+    return {"success": True, **totals, "written": written, "pending_rows": ingestor.pending_rows}
+
+
+@router.websocket("/stream/ws")
+async def stream_readings_ws(websocket: WebSocket, type: Optional[str] = None):
+    """
+    Прием показаний через WebSocket: каждое текстовое сообщение - одна или
+    несколько строк NDJSON в формате POST /api/stream. На каждое сообщение
+    отправляется подтверждение {accepted, rejected, rejects, pending_rows};
+    пока БД не успевает, следующее сообщение не читается.
+    """
+    if type is not None and type not in STREAM_TYPES:
+        await websocket.close(code=1008, reason="Неизвестный тип показаний")
+        return
+    await websocket.accept()
+    ingestor = get_ingestor()
+    line = 1
+    try:
+        while True:
+            lines = (await websocket.receive_text()).split("\n")
+            result = await ingestor.submit(lines, line, type)
+            line += len(lines)
+            await websocket.send_json({**result, "pending_rows": ingestor.pending_rows})
+    except WebSocketDisconnect:
+        logger.info(f"Поток показаний закрыт клиентом, получено строк: {line - 1}")
+
+
+@router.get("/stream/status", status_code=status.HTTP_200_OK)
+async def stream_status():
+    """
+    Состояние буфера показаний этого процесса: строки в ожидании записи,
+    принятые, записанные и отброшенные строки, ожидания обратного давления
+    """
+    return {"success": True, "data": get_ingestor().status()}
@@ -1,18 +1,19 @@
-from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, status
+from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Query, status
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-import pandas as pd
-import csv
-from io import StringIO
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime
 import os
+import shutil
 import logging
 
-from ..database import get_db
-from ..models import (
-    CoalTemperature, CoalTemperatureCreate,
-    Weather, WeatherCreate,
-    FireHistory, FireHistoryCreate
-)
+from ..database import get_async_db, get_db
+from ..models import IngestJob
+from ..services.csv_stream import DEFAULT_CSV_CHUNK_ROWS, sniff_encoding
+from ..services.ingestion import DATA_MODELS, CsvFormatError, ingest_csv_stream
+from ..services.ingest_jobs import create_job, submit_job, job_status
+from ..services.upload_registry import DuplicateUpload, file_sha256, find_uploaded
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -21,17 +22,100 @@ logger = logging.getLogger(__name__)
 # Создаем роутер
 router = APIRouter()
 
+def store_upload(db: Session, type: str, file: UploadFile, chunk_rows=DEFAULT_CSV_CHUNK_ROWS, background=False):
+    """
+    Сохранение загруженного файла и запись его строк в БД (или постановка в очередь)
+
+    Хеширование, разбор CSV и COPY синхронные, поэтому функция
+    вызывается из эндпоинта в пуле потоков.
+    """
+    # Пропускаем побайтно совпадающий с уже загруженным файл
+    sha256 = file_sha256(file.file)
+    previous = find_uploaded(db, type, sha256)
+    if previous is not None:
+        logger.info(f"Файл {file.filename} уже был загружен ({previous.file_path}), пропускаем")
+        return {
+            "success": True,
+            "skipped": True,
+            "message": "Файл с таким содержимым уже был загружен",
+            "uploaded_at": previous.created_at
+        }
+
+    # Создаем директорию для загрузки файлов, если она не существует
+    upload_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "uploads")
+    os.makedirs(upload_dir, exist_ok=True)
+    logger.info(f"Директория для загрузок: {upload_dir}")
+    
+    # Путь для сохранения файла
+    file_path = os.path.join(upload_dir, f"{type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    
+    # Определяем кодировку по началу файла
+    encoding = sniff_encoding(file.file)
+    logger.info(f"Кодировка файла: {encoding}")
+
+    if background:
+        # Сохраняем файл и ставим его обработку в очередь
+        with open(file_path, "wb") as raw_file:
+            shutil.copyfileobj(file.file, raw_file)
+        logger.info(f"Файл сохранен в: {file_path}")
+
+        job = create_job(db, type, file.filename, file_path, encoding, chunk_rows, sha256)
+        submit_job(job.id)
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={
+                "success": True,
+                "message": "Файл принят в обработку",
+                "job_id": job.id,
+                "status_url": f"/api/upload/jobs/{job.id}"
+            }
+        )
+    
+    # Читаем файл порциями, параллельно сохраняя его локально;
+    # запись в реестр загрузок фиксируется вместе с данными
+    upload = {"sha256": sha256, "filename": file.filename, "file_path": file_path}
+    try:
+        with open(file_path, "wb") as raw_file:
+            stats = ingest_csv_stream(file.file, type, db, encoding, chunk_rows, raw_file, upload=upload)
+    except DuplicateUpload:
+        os.remove(file_path)
+        return {
+            "success": True,
+            "skipped": True,
+            "message": "Файл с таким содержимым уже был загружен"
+        }
+    except CsvFormatError as e:
+        logger.error(f"Ошибка при чтении CSV: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Ошибка при чтении CSV-файла: {str(e)}"
+        )
+    logger.info(f"Файл сохранен в: {file_path}")
+    
+    logger.info("Данные успешно загружены в базу данных")
+    return {"success": True, "message": "Файл успешно загружен и данные сохранены", "stats": stats}
+
+
 @router.post("/upload/{type}", status_code=status.HTTP_200_OK)
 async def upload_file(
     type: str, 
     file: UploadFile = File(...), 
+    chunk_rows: int = Query(DEFAULT_CSV_CHUNK_ROWS, ge=1000, le=1000000),
+    background: bool = Query(False),
     db: Session = Depends(get_db)
 ):
     """
     Загрузка CSV-файла с данными в базу данных.
+
+    Файл читается потоково порциями по chunk_rows строк: каждая порция сразу
+    записывается в БД, а исходные байты параллельно сохраняются в uploads/,
+    поэтому потребление памяти не зависит от размера файла.
+    Файл с тем же содержимым, что и ранее загруженный, пропускается без разбора.
     
-    - **type**: Тип данных (coal, weather, fire_history)
+    - **type**: Тип данных (coal, weather, fire_history, stacks)
     - **file**: CSV-файл с данными
+    - **chunk_rows**: Количество строк в одной порции
+    - **background**: Обработать файл в фоновой задаче и сразу вернуть ее id
     """
     logger.info(f"Начало загрузки файла: {file.filename}, тип: {type}")
     
@@ -42,68 +126,19 @@ async def upload_file(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Разрешены только CSV-файлы"
         )
+
+    if type not in DATA_MODELS:
+        logger.error(f"Неизвестный тип файла: {type}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Неизвестный тип файла. Поддерживаемые типы: coal, weather, fire_history, stacks"
+        )
     
     try:
-        # Создаем директорию для загрузки файлов, если она не существует
-        upload_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "uploads")
-        os.makedirs(upload_dir, exist_ok=True)
-        logger.info(f"Директория для загрузок: {upload_dir}")
-        
-        # Путь для сохранения файла
-        file_path = os.path.join(upload_dir, f"{type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
-        
-        # Читаем содержимое файла
-        contents = await file.read()
-        logger.info(f"Файл прочитан, размер: {len(contents)} байт")
-        
-        # Сохраняем файл локально для отладки
-        with open(file_path, "wb") as f:
-            f.write(contents)
-        logger.info(f"Файл сохранен в: {file_path}")
-        
-        # Преобразуем байты в строку
-        try:
-            s = contents.decode('utf-8')
-        except UnicodeDecodeError:
-            # Пробуем другие кодировки, если utf-8 не работает
-            try:
-                s = contents.decode('cp1251')  # Кириллица Windows
-            except UnicodeDecodeError:
-                s = contents.decode('latin-1')  # Универсальная кодировка
-        
-        logger.info("Содержимое файла декодировано")
-        
-        # Используем pandas для чтения CSV
-        try:
-            df = pd.read_csv(StringIO(s), na_values=['NA', 'N/A', ''], keep_default_na=False)
-            logger.info(f"Данные CSV загружены, строк: {len(df)}")
-            
-            # Выводим первые несколько строк для отладки
-            logger.info(f"Первые строки данных: {df.head(2).to_dict()}")
-        except Exception as e:
-            logger.error(f"Ошибка при чтении CSV: {str(e)}")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Ошибка при чтении CSV-файла: {str(e)}"
-            )
-        
-        # Обрабатываем данные в зависимости от типа файла
-        if type == "coal":
-            await process_coal_data(df, db)
-        elif type == "weather":
-            await process_weather_data(df, db)
-        elif type == "fire_history":
-            await process_fire_history_data(df, db)
-        else:
-            logger.error(f"Неизвестный тип файла: {type}")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Неизвестный тип файла. Поддерживаемые типы: coal, weather, fire_history"
-            )
-        
-        logger.info("Данные успешно загружены в базу данных")
-        return {"success": True, "message": "Файл успешно загружен и данные сохранены"}
+        return await run_in_threadpool(store_upload, db, type, file, chunk_rows, background)
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(f"Произошла ошибка при обработке файла: {str(e)}")
         raise HTTPException(
@@ -111,94 +146,21 @@ async def upload_file(
             detail=f"Ошибка при обработке файла: {str(e)}"
         )
 
-async def process_coal_data(df: pd.DataFrame, db: Session):
-    """Обработка данных о температуре угля"""
-    logger.info("Обработка данных о температуре угля")
-    try:
-        for _, row in df.iterrows():
-            try:
-                if isinstance(row['date'], str):
-                    date_obj = datetime.strptime(row['date'], "%Y-%m-%d").date()
-                else:
-                    date_obj = row['date']
-                
-                coal_data = CoalTemperature(
-                    date=date_obj,
-                    location=str(row['location']),
-                    temperature=float(row['temperature'])
-                )
-                db.add(coal_data)
-            except Exception as e:
-                logger.error(f"Ошибка при обработке строки данных угля: {row}, ошибка: {str(e)}")
-        
-        db.commit()
-        logger.info("Данные о температуре угля сохранены в базе")
-    except Exception as e:
-        db.rollback()
-        logger.error(f"Ошибка при сохранении данных о температуре угля: {str(e)}")
-        raise
 
-async def process_weather_data(df: pd.DataFrame, db: Session):
-    """Обработка погодных данных"""
-    logger.info("Обработка погодных данных")
-    try:
-        for _, row in df.iterrows():
-            try:
-                if isinstance(row['date'], str):
-                    date_obj = datetime.strptime(row['date'], "%Y-%m-%d").date()
-                else:
-                    date_obj = row['date']
-                
-                weather_data = Weather(
-                    date=date_obj,
-                    location=str(row['location']),
-                    temperature=float(row['temperature']),
-                    humidity=float(row['humidity']),
-                    wind_speed=float(row['wind_speed']),
-                    wind_direction=str(row['wind_direction'])
-                )
-                db.add(weather_data)
-            except Exception as e:
-                logger.error(f"Ошибка при обработке строки погодных данных: {row}, ошибка: {str(e)}")
-        
-        db.commit()
-        logger.info("Погодные данные сохранены в базе")
-    except Exception as e:
-        db.rollback()
-        logger.error(f"Ошибка при сохранении погодных данных: {str(e)}")
-        raise
+@router.get("/upload/jobs/{job_id}", status_code=status.HTTP_200_OK)
+async def get_upload_job(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    """
+    Состояние фоновой задачи загрузки: обработанные, записанные и отклоненные
+    строки, пропускная способность и оценка оставшегося времени
 
-async def process_fire_history_data(df: pd.DataFrame, db: Session):
-    """Обработка данных об истории возгораний"""
-    logger.info("Обработка данных об истории возгораний")
-    try:
-        for _, row in df.iterrows():
-            try:
-                if isinstance(row['date'], str):
-                    date_obj = datetime.strptime(row['date'], "%Y-%m-%d").date()
-                else:
-                    date_obj = row['date']
-                
-                # Корректное преобразование has_fire в булево значение
-                has_fire_value = row['has_fire']
-                if isinstance(has_fire_value, str):
-                    has_fire = has_fire_value.lower() in ['true', '1', 't', 'yes']
-                else:
-                    has_fire = bool(has_fire_value)
-                
-                fire_data = FireHistory(
-                    date=date_obj,
-                    location=str(row['location']),
-                    has_fire=has_fire,
-                    severity=int(row['severity'])
-                )
-                db.add(fire_data)
-            except Exception as e:
-                logger.error(f"Ошибка при обработке строки данных о возгораниях: {row}, ошибка: {str(e)}")
-        
-        db.commit()
-        logger.info("Данные об истории возгораний сохранены в базе")
-    except Exception as e:
-        db.rollback()
-        logger.error(f"Ошибка при сохранении данных об истории возгораний: {str(e)}")
-        raise
\ No newline at end of file
+    - **job_id**: Идентификатор задачи, полученный при загрузке
+
+    Читается из основной базы, а не из реплики: прогресс должен быть актуальным.
+    """
+    job = await db.get(IngestJob, job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Задача загрузки не найдена"
+        )
+    return {"success": True, "data": job_status(job)}
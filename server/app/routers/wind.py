@@ -0,0 +1,54 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from typing import Optional
+
+from ..database import get_read_db
+from ..models import Weather
+from ..services.response_cache import cache_key, cached_json
+from .map import latest_per_location
+
+# Создаем роутер
+router = APIRouter()
+
+# Таблицы, из которых строятся данные о ветре (для сброса кеша)
+WIND_TABLES = [Weather.__tablename__]
+
+
+@router.get("/wind", status_code=status.HTTP_200_OK)
+async def get_wind_data(
+    request: Request,
+    location: Optional[str] = Query(None, description="Локация (по умолчанию - все локации)"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Последние данные о ветре по каждой локации: дата, скорость и направление
+
+    - **location**: Локация (по умолчанию - все локации)
+    """
+    try:
+        async def build():
+            query = select(Weather.location, Weather.date, Weather.wind_speed, Weather.wind_direction)
+            if location:
+                query = query.where(Weather.location == location)
+            latest = latest_per_location(query, Weather.location, Weather.date, dialect=db.get_bind().dialect.name)
+            rows = (await db.execute(select(latest).order_by(latest.c.location))).all()
+            return {
+                "success": True,
+                "data": [
+                    {
+                        "location": row.location,
+                        "date": row.date.isoformat(),
+                        "wind_speed": row.wind_speed,
+                        "wind_direction": row.wind_direction
+                    } for row in rows
+                ]
+            }
+
+        return await cached_json(request, cache_key("wind", {"location": location}, WIND_TABLES), build)
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка при получении данных о ветре: {str(e)}"
+        )
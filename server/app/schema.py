@@ -0,0 +1,59 @@
+import logging
+import os
+
+from .database import engine
+
+logger = logging.getLogger(__name__)
+
+# Каталог server с alembic.ini и миграциями
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def alembic_config():
+    """
+    Конфигурация alembic с путями относительно каталога server
+    """
+    # alembic нужен только фоновым шагам запуска, поэтому импортируется здесь
+    from alembic.config import Config
+
+    config = Config(os.path.join(SERVER_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(SERVER_DIR, "migrations"))
+    # Логирование уже настроено приложением
+    config.attributes["configure_logger"] = False
+    return config
+
+
+def upgrade_schema(bind=engine, revision="head"):
+    """
+    Применение миграций схемы БД (заменяет Base.metadata.create_all)
+
+    База, созданная create_all до появления миграций, обновляется без
+    ручных действий: исходная миграция создает отсутствующие таблицы
+    и дополняет существующие недостающими колонками и ключами.
+    """
+    from alembic import command
+
+    config = alembic_config()
+    with bind.begin() as connection:
+        config.attributes["connection"] = connection
+        command.upgrade(config, revision)
+    logger.info(f"Схема БД обновлена до {revision}")
+
+
+def check_schema(bind=engine):
+    """
+    Проверка, что схема БД находится на последней миграции (без изменений в БД)
+
+    Исключение RuntimeError, если миграции не применены.
+    """
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    heads = set(ScriptDirectory.from_config(alembic_config()).get_heads())
+    with bind.connect() as connection:
+        current = set(MigrationContext.configure(connection).get_current_heads())
+    if current != heads:
+        raise RuntimeError(
+            f"Схема БД ({', '.join(sorted(current)) or 'без миграций'}) отстает от "
+            f"{', '.join(sorted(heads))}: выполните alembic upgrade head"
+        )
@@ -1,2 +1,2 @@
 from .predict import predict_fires
-from .data_processor import process_csv_data, validate_csv_data
\ No newline at end of file
+from .data_processor import process_csv_data, validate_csv_data, coerce_frame
\ No newline at end of file
@@ -0,0 +1,211 @@
+import csv
+import logging
+import time
+from datetime import datetime
+from io import StringIO
+
+from sqlalchemy import insert, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Количество строк в одной пачке при загрузке в БД
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def iter_chunks(df, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Разбиение DataFrame на последовательные пачки фиксированного размера
+    """
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start:start + chunk_size]
+
+
+def frame_to_records(df):
+    """
+    Преобразование DataFrame в список словарей с питоновскими значениями
+    (NaN/NaT заменяются на None)
+    """
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def _prepare_frame(df, table):
+    """
+    Оставляет только колонки таблицы и проставляет created_at для всей пачки,
+    так как COPY не вычисляет клиентские значения по умолчанию
+    """
+    columns = [col for col in df.columns if col in table.c]
+    frame = df[columns]
+    if "created_at" in table.c and "created_at" not in frame.columns:
+        frame = frame.assign(created_at=datetime.now())
+    return frame
+
+
+def _supports_copy(db: Session):
+    """
+    COPY FROM STDIN доступен только для PostgreSQL через psycopg2
+    """
+    dialect = db.get_bind().dialect
+    return dialect.name == "postgresql" and dialect.driver == "psycopg2"
+
+
+def _copy_chunk(db: Session, table, chunk, table_name=None):
+    """
+    Загрузка пачки через COPY FROM STDIN в формате CSV
+    """
+    buffer = StringIO()
+    chunk.to_csv(buffer, index=False, header=False, na_rep="", quoting=csv.QUOTE_MINIMAL)
+    buffer.seek(0)
+
+    columns = ", ".join(f'"{col}"' for col in chunk.columns)
+    raw_connection = db.connection().connection.dbapi_connection
+    with raw_connection.cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY "{table_name or table.name}" ({columns}) FROM STDIN WITH (FORMAT csv, NULL \'\')',
+            buffer
+        )
+
+
+def _insert_chunk(db: Session, table, chunk):
+    """
+    Загрузка пачки одним многострочным insert() (executemany)
+    """
+    db.execute(insert(table), frame_to_records(chunk))
+
+
+def _report(table, method, rows, seconds):
+    """
+    Статистика загрузки и запись в лог
+    """
+    stats = {
+        "rows": rows,
+        "seconds": round(seconds, 4),
+        "rows_per_second": round(rows / seconds, 1) if seconds > 0 else float(rows),
+        "method": method
+    }
+    logger.info(
+        f"Загружено {rows} строк в {table.name} ({method}): "
+        f"{stats['rows_per_second']} строк/с"
+    )
+    return stats
+
+
+def bulk_insert(db: Session, model, df, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Пакетная загрузка DataFrame в таблицу модели
+
+    На PostgreSQL (psycopg2) используется COPY FROM STDIN, на остальных
+    СУБД (SQLite) - insert() с пачками по chunk_size строк.
+    Транзакцию фиксирует вызывающий код.
+
+    Параметры:
+    - db: сессия SQLAlchemy
+    - model: SQLAlchemy модель целевой таблицы
+    - df: pandas DataFrame с уже приведенными типами
+    - chunk_size: количество строк в одной пачке
+
+    Возвращает:
+    - словарь {rows, seconds, rows_per_second, method}
+    """
+    table = model.__table__
+    frame = _prepare_frame(df, table)
+    method = "copy" if _supports_copy(db) else "executemany"
+    load_chunk = _copy_chunk if method == "copy" else _insert_chunk
+
+    started = time.perf_counter()
+    for chunk in iter_chunks(frame, chunk_size):
+        load_chunk(db, table, chunk)
+    seconds = time.perf_counter() - started
+
+    return _report(table, method, len(frame), seconds)
+
+
+def advisory_xact_lock(db: Session, name):
+    """
+    Блокировка до конца транзакции по имени (PostgreSQL): параллельные
+    пересчеты одних и тех же производных таблиц выполняются по очереди.
+    На остальных СУБД запись и так сериализуется блокировкой базы.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": name})
+
+
+# Диалектные insert() с поддержкой ON CONFLICT
+UPSERT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert
+}
+
+
+def _upsert_statement(dialect_name, table, key_columns, columns):
+    """
+    INSERT ... ON CONFLICT (ключ) DO UPDATE для заданных колонок
+    """
+    statement = UPSERT_INSERTS[dialect_name](table)
+    update_columns = {
+        col: statement.excluded[col] for col in columns if col not in key_columns
+    }
+    return statement.on_conflict_do_update(index_elements=list(key_columns), set_=update_columns)
+
+
+def _copy_upsert_chunk(db: Session, table, chunk, key_columns, staging):
+    """
+    Загрузка пачки через COPY во временную таблицу и перенос одним
+    INSERT ... SELECT ... ON CONFLICT DO UPDATE
+    """
+    db.execute(text(f'TRUNCATE "{staging}"'))
+    _copy_chunk(db, table, chunk, staging)
+
+    columns = ", ".join(f'"{col}"' for col in chunk.columns)
+    keys = ", ".join(f'"{col}"' for col in key_columns)
+    updates = ", ".join(
+        f'"{col}" = EXCLUDED."{col}"' for col in chunk.columns if col not in key_columns
+    )
+    db.execute(text(
+        f'INSERT INTO "{table.name}" ({columns}) SELECT {columns} FROM "{staging}" '
+        f'ON CONFLICT ({keys}) DO UPDATE SET {updates}'
+    ))
+
+
+def bulk_upsert(db: Session, model, df, key_columns, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Идемпотентная пакетная загрузка: INSERT ... ON CONFLICT DO UPDATE
+    по естественному ключу
+
+    Дубликаты ключа внутри загружаемых данных схлопываются (остается
+    последняя строка), так как одна команда не может обновить строку дважды.
+    На PostgreSQL (psycopg2) пачки идут через COPY во временную таблицу.
+    Транзакцию фиксирует вызывающий код.
+
+    Параметры:
+    - db: сессия SQLAlchemy
+    - model: SQLAlchemy модель целевой таблицы с уникальным ключом
+    - df: pandas DataFrame с уже приведенными типами
+    - key_columns: колонки естественного ключа
+    - chunk_size: количество строк в одной пачке
+
+    Возвращает:
+    - словарь {rows, seconds, rows_per_second, method}
+    """
+    table = model.__table__
+    frame = _prepare_frame(df, table).drop_duplicates(subset=list(key_columns), keep="last")
+
+    started = time.perf_counter()
+    if _supports_copy(db):
+        method = "copy_upsert"
+        staging = f"{table.name}_staging"
+        db.execute(text(
+            f'CREATE TEMP TABLE IF NOT EXISTS "{staging}" '
+            f'(LIKE "{table.name}" INCLUDING DEFAULTS) ON COMMIT DROP'
+        ))
+        for chunk in iter_chunks(frame, chunk_size):
+            _copy_upsert_chunk(db, table, chunk, key_columns, staging)
+    else:
+        method = "upsert"
+        statement = _upsert_statement(db.get_bind().dialect.name, table, key_columns, frame.columns)
+        for chunk in iter_chunks(frame, chunk_size):
+            db.execute(statement, frame_to_records(chunk))
+    seconds = time.perf_counter() - started
+
+    return _report(table, method, len(frame), seconds)
@@ -0,0 +1,109 @@
+import codecs
+import io
+import logging
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Кодировки, которые пробуем по порядку (utf-8, кириллица Windows, универсальная)
+ENCODINGS = ("utf-8", "cp1251", "latin-1")
+
+# Размер префикса файла для определения кодировки
+ENCODING_PREFIX_SIZE = 64 * 1024
+
+# Количество строк CSV в одной порции
+DEFAULT_CSV_CHUNK_ROWS = 50000
+
+# Значения, которые считаются пропущенными
+NA_VALUES = ["NA", "N/A", ""]
+
+
+def detect_encoding(prefix: bytes) -> str:
+    """
+    Определение кодировки по небольшому префиксу файла
+
+    Префикс может обрываться посреди многобайтового символа, поэтому
+    используется инкрементальный декодер без финализации.
+    """
+    if prefix.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+
+    for encoding in ENCODINGS:
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(prefix, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return ENCODINGS[-1]
+
+
+def sniff_encoding(binary_file) -> str:
+    """
+    Определение кодировки файла с возвратом указателя в начало
+    """
+    prefix = binary_file.read(ENCODING_PREFIX_SIZE)
+    binary_file.seek(0)
+    return detect_encoding(prefix)
+
+
+class TeeReader(io.RawIOBase):
+    """
+    Поток для чтения, который дублирует все прочитанные байты в sink
+
+    Закрытие обертки не закрывает исходный файл.
+    """
+
+    def __init__(self, source, sink=None):
+        self.source = source
+        self.sink = sink
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.source.read(len(buffer))
+        size = len(data)
+        buffer[:size] = data
+        if size and self.sink is not None:
+            self.sink.write(data)
+        return size
+
+    def drain(self, block_size=1024 * 1024):
+        """Дочитывает остаток источника в sink"""
+        if self.sink is None:
+            return
+        while True:
+            data = self.source.read(block_size)
+            if not data:
+                break
+            self.sink.write(data)
+
+
+def iter_csv_chunks(binary_file, encoding, chunksize=DEFAULT_CSV_CHUNK_ROWS, raw_sink=None):
+    """
+    Построчное чтение CSV порциями фиксированного размера
+
+    Параметры:
+    - binary_file: бинарный файловый объект (например, SpooledTemporaryFile)
+    - encoding: кодировка файла
+    - chunksize: количество строк в одной порции
+    - raw_sink: файл, в который параллельно записываются исходные байты
+
+    Возвращает:
+    - генератор pandas DataFrame
+    """
+    source = TeeReader(binary_file, raw_sink)
+    text = io.TextIOWrapper(io.BufferedReader(source), encoding=encoding, newline="")
+
+    reader = pd.read_csv(
+        text,
+        chunksize=chunksize,
+        na_values=NA_VALUES,
+        keep_default_na=False
+    )
+    with reader:
+        for chunk in reader:
+            yield chunk
+
+    source.drain()
@@ -1,92 +1,197 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime
 from io import StringIO
 
+# Формат дат во всех CSV-файлах
+DATE_FORMAT = "%Y-%m-%d"
+
+# Допустимые значения булевых полей
+TRUE_VALUES = ['true', '1', 't', 'yes']
+FALSE_VALUES = ['false', '0', 'f', 'no']
+
+# Декларативное описание колонок для каждого типа файла:
+# имя колонки -> тип значения и обязательность
+SCHEMAS = {
+    'coal': {
+        'date': {'type': 'date', 'required': True},
+        'location': {'type': 'str', 'required': True},
+        'temperature': {'type': 'float', 'required': True},
+    },
+    'weather': {
+        'date': {'type': 'date', 'required': True},
+        'location': {'type': 'str', 'required': True},
+        'temperature': {'type': 'float', 'required': True},
+        'humidity': {'type': 'float', 'required': True},
+        'wind_speed': {'type': 'float', 'required': True},
+        'wind_direction': {'type': 'str', 'required': False},
+    },
+    'fire_history': {
+        'date': {'type': 'date', 'required': True},
+        'location': {'type': 'str', 'required': True},
+        'has_fire': {'type': 'bool', 'required': True},
+        'severity': {'type': 'int', 'required': True},
+    },
+    'stacks': {
+        'location': {'type': 'str', 'required': True},
+        'x': {'type': 'float', 'required': True},
+        'y': {'type': 'float', 'required': True},
+        'footprint': {'type': 'str', 'required': False},
+    },
+}
+
+# Сколько причин отклонения строк выводить в сообщениях
+MAX_REPORTED_REJECTS = 20
+
+
+def _coerce_date(raw):
+    """Даты в фиксированном формате; возвращает (значения, маска ошибок)"""
+    if pd.api.types.is_datetime64_any_dtype(raw):
+        parsed = raw
+    else:
+        parsed = pd.to_datetime(raw.astype('string').str.strip(), format=DATE_FORMAT, errors='coerce')
+    return parsed.dt.date, parsed.isna()
+
+
+def _coerce_float(raw):
+    values = pd.to_numeric(raw, errors='coerce')
+    return values, values.isna()
+
+
+def _coerce_int(raw):
+    values = pd.to_numeric(raw, errors='coerce')
+    bad = values.isna() | (values % 1 != 0)
+    return values.where(~bad).astype('Int64'), bad
+
+
+def _coerce_bool(raw):
+    if pd.api.types.is_bool_dtype(raw):
+        return raw, pd.Series(False, index=raw.index)
+    if pd.api.types.is_numeric_dtype(raw):
+        # read_csv читает колонку 1/0 с пропусками как float64 (1.0/0.0)
+        return raw == 1, ~raw.isin([0, 1])
+    normalized = raw.astype('string').str.strip().str.lower()
+    is_true = normalized.isin(TRUE_VALUES)
+    is_false = normalized.isin(FALSE_VALUES)
+    return is_true, ~(is_true | is_false)
+
+
+def _coerce_str(raw):
+    values = raw.astype('string').str.strip()
+    values = values.where(values != '')
+    return values.astype(object).where(values.notna(), None), values.isna()
+
+
+COERCERS = {
+    'date': _coerce_date,
+    'float': _coerce_float,
+    'int': _coerce_int,
+    'bool': _coerce_bool,
+    'str': _coerce_str,
+}
+
+
+def required_columns(file_type):
+    """Список обязательных колонок для типа файла"""
+    return [name for name, spec in SCHEMAS[file_type].items() if spec['required']]
+
+
+def coerce_frame(df, file_type):
+    """
+    Векторное приведение типов и проверка всех колонок за один проход
+
+    Параметры:
+    - df: pandas DataFrame с исходными (строковыми) данными
+    - file_type: тип данных ('coal', 'weather', 'fire_history', 'stacks')
+
+    Возвращает:
+    - DataFrame с приведенными колонками из схемы (все строки)
+    - булева маска отклоненных строк
+    - Series с причинами отклонения (только для отклоненных строк)
+    """
+    schema = SCHEMAS[file_type]
+    missing = [col for col in required_columns(file_type) if col not in df.columns]
+    if missing:
+        raise ValueError(
+            f"CSV-файл типа {file_type} должен содержать колонки: {', '.join(required_columns(file_type))}"
+        )
+
+    columns = {}
+    problems = {}
+    for name, spec in schema.items():
+        raw = df[name] if name in df.columns else pd.Series(np.nan, index=df.index, dtype=object)
+        values, bad = COERCERS[spec['type']](raw)
+        absent = raw.isna()
+        if spec['type'] == 'str':
+            # Пустая строка после обрезки пробелов - тоже пропуск
+            absent = bad
+
+        columns[name] = values
+        if spec['required']:
+            problems[f"{name}: пропущено значение"] = absent
+        problems[f"{name}: некорректное значение"] = bad & ~absent
+
+    frame = pd.DataFrame(columns, index=df.index)
+    masks = pd.DataFrame(problems, index=df.index)
+    reject = masks.any(axis=1)
+
+    # Причины собираются одним матричным произведением маски на подписи
+    rejected = masks[reject]
+    reasons = rejected.dot(rejected.columns + '; ').str[:-2]
+    return frame, reject, reasons
+
+
+def describe_rejects(reasons, limit=MAX_REPORTED_REJECTS):
+    """
+    Список первых причин отклонения с номерами строк CSV-файла
+    (индекс DataFrame + строка заголовка + нумерация с единицы)
+    """
+    return [
+        {"line": int(index) + 2, "reason": reason}
+        for index, reason in reasons.head(limit).items()
+    ]
+
+
 def process_csv_data(content, file_type):
     """
     Обработка CSV данных и преобразование в pandas DataFrame
-    
+
     Параметры:
     - content: строковое содержимое CSV файла
-    - file_type: тип данных ('coal', 'weather', 'fire_history')
-    
+    - file_type: тип данных ('coal', 'weather', 'fire_history', 'stacks')
+
     Возвращает:
     - pandas DataFrame с обработанными данными
     """
     try:
         df = pd.read_csv(StringIO(content))
-        
-        # Проверка наличия необходимых колонок
-        if file_type == 'coal' and not all(col in df.columns for col in ['date', 'location', 'temperature']):
-            raise ValueError("CSV-файл с данными о температуре угля должен содержать колонки: date, location, temperature")
-        
-        elif file_type == 'weather' and not all(col in df.columns for col in ['date', 'location', 'temperature', 'humidity', 'wind_speed', 'wind_direction']):
-            raise ValueError("CSV-файл с погодными данными должен содержать колонки: date, location, temperature, humidity, wind_speed, wind_direction")
-        
-        elif file_type == 'fire_history' and not all(col in df.columns for col in ['date', 'location', 'has_fire', 'severity']):
-            raise ValueError("CSV-файл с историей возгораний должен содержать колонки: date, location, has_fire, severity")
-        
-        # Преобразование даты
-        if 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date']).dt.date
-        
-        # Преобразование числовых данных
-        if 'temperature' in df.columns:
-            df['temperature'] = pd.to_numeric(df['temperature'], errors='coerce')
-        
-        if 'humidity' in df.columns:
-            df['humidity'] = pd.to_numeric(df['humidity'], errors='coerce')
-        
-        if 'wind_speed' in df.columns:
-            df['wind_speed'] = pd.to_numeric(df['wind_speed'], errors='coerce')
-        
-        if 'severity' in df.columns:
-            df['severity'] = pd.to_numeric(df['severity'], errors='coerce').astype(int)
-        
-        # Преобразование булевых данных
-        if 'has_fire' in df.columns:
-            df['has_fire'] = df['has_fire'].map(lambda x: True if str(x).lower() in ['true', '1', 't', 'yes'] else False)
-        
-        return df
-    
+        frame, _, _ = coerce_frame(df, file_type)
+        return frame
+
     except Exception as e:
         raise ValueError(f"Ошибка при обработке CSV-файла: {str(e)}")
 
 def validate_csv_data(df, file_type):
     """
     Проверка корректности данных в DataFrame
-    
+
     Параметры:
     - df: pandas DataFrame с данными
-    - file_type: тип данных ('coal', 'weather', 'fire_history')
-    
+    - file_type: тип данных ('coal', 'weather', 'fire_history', 'stacks')
+
     Возвращает:
     - булево значение (True если данные корректны)
     - сообщение об ошибке (пустая строка если данные корректны)
     """
     if df.empty:
         return False, "CSV-файл не содержит данных"
-    
-    # Проверка на наличие пропущенных значений
-    missing_columns = []
-    
-    if file_type == 'coal':
-        for col in ['date', 'location', 'temperature']:
-            if df[col].isnull().any():
-                missing_columns.append(col)
-    
-    elif file_type == 'weather':
-        for col in ['date', 'location', 'temperature', 'humidity', 'wind_speed']:
-            if df[col].isnull().any():
-                missing_columns.append(col)
-    
-    elif file_type == 'fire_history':
-        for col in ['date', 'location', 'has_fire', 'severity']:
-            if df[col].isnull().any():
-                missing_columns.append(col)
-    
-    if missing_columns:
-        return False, f"В CSV-файле есть пропущенные значения в колонках: {', '.join(missing_columns)}"
-    
-    return True, ""
\ No newline at end of file
+
+    try:
+        _, reject, reasons = coerce_frame(df, file_type)
+    except ValueError as e:
+        return False, str(e)
+
+    if reject.any():
+        details = "; ".join(f"строка {item['line']}: {item['reason']}" for item in describe_rejects(reasons, 5))
+        return False, f"В CSV-файле есть некорректные строки ({int(reject.sum())}): {details}"
+
+    return True, ""
@@ -0,0 +1,180 @@
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Признаки в порядке, в котором их ожидает модель (заголовок feature_names= в model.txt)
+FEATURE_NAMES = [
+    "coal_temp", "temp_max", "temp_mean", "humidity_max", "humidity_mean", "precipitation",
+    "v_mean", "v_max", "p_mean", "p_max", "coal_temp_rolling_mean", "coal_temp_var"
+]
+
+# Значения для признаков, которых нет в загружаемых данных
+FEATURE_DEFAULTS = {
+    "precipitation": 0.0,
+    "p_mean": 1013.25,
+    "p_max": 1013.25
+}
+
+# Дневные агрегаты погодных данных: признак -> (колонка, функция)
+WEATHER_AGGREGATIONS = {
+    "temp_max": ("temperature", "max"),
+    "temp_mean": ("temperature", "mean"),
+    "humidity_max": ("humidity", "max"),
+    "humidity_mean": ("humidity", "mean"),
+    "v_mean": ("wind_speed", "mean"),
+    "v_max": ("wind_speed", "max")
+}
+
+# Окно (в днях) для скользящих признаков температуры угля
+ROLLING_WINDOW = 7
+
+# Сколько дней рассчитанных признаков хранить в памяти для каждой локации
+HISTORY_DAYS = 90
+
+
+def daily_coal(coal_df):
+    """
+    Средняя дневная температура угля по локациям: Series с индексом (location, date)
+    """
+    coal = coal_df.assign(date=pd.to_datetime(coal_df["date"]))
+    return coal.groupby(["location", "date"], sort=True)["temperature"].mean().rename("coal_temp")
+
+
+def daily_weather(weather_df):
+    """
+    Дневные погодные агрегаты по локациям и по всему складу
+
+    Возвращает:
+    - DataFrame с индексом (location, date)
+    - DataFrame с индексом date (агрегаты по всем локациям)
+    """
+    weather = weather_df.assign(date=pd.to_datetime(weather_df["date"]))
+    local = weather.groupby(["location", "date"]).agg(**WEATHER_AGGREGATIONS)
+    yard = weather.groupby("date").agg(**WEATHER_AGGREGATIONS)
+    return local, yard
+
+
+class FeaturePipeline:
+    """
+    Инкрементальный расчет дневных признаков модели по локациям
+
+    Для каждой локации хранится водяной знак - последняя рассчитанная дата.
+    При обновлении пересчитываются только дни начиная с водяного знака
+    (последний день пересчитывается, чтобы учесть догруженную за него погоду),
+    а контекст для скользящих окон берется из сохраненного хвоста дневных
+    температур угля. Загруженные данные заменяют сохраненный хвост: если
+    день в нем исправлен задним числом, локация пересчитывается с этого дня.
+    """
+
+    def __init__(self, window=ROLLING_WINDOW, history_days=HISTORY_DAYS):
+        self.window = window
+        self.history_days = history_days
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Сброс состояния: следующий вызов update() пересчитает всю историю"""
+        with self._lock:
+            index = pd.MultiIndex.from_arrays(
+                [pd.Index([], dtype=object), pd.DatetimeIndex([])], names=["location", "date"]
+            )
+            self.features = pd.DataFrame(columns=FEATURE_NAMES, index=index, dtype=np.float64)
+            self.watermarks = pd.Series(dtype="datetime64[ns]")
+            self._coal_history = pd.Series(dtype=np.float64, index=index, name="coal_temp")
+
+    def update(self, coal_df, weather_df):
+        """
+        Расчет признаков для новых дней
+
+        Параметры:
+        - coal_df: DataFrame с данными о температуре угля (date, location, temperature)
+        - weather_df: DataFrame с погодными данными
+
+        Возвращает:
+        - количество рассчитанных строк признаков
+        """
+        with self._lock:
+            coal = daily_coal(coal_df)
+            locations = coal.index.get_level_values("location")
+            dates = coal.index.get_level_values("date")
+            watermarks = locations.map(self.watermarks)
+            # Дни хвоста истории, значения которых изменились в БД
+            stored = self._coal_history.reindex(coal.index)
+            corrected = (stored.notna() & (stored != coal)).to_numpy()
+            changed = watermarks.isna() | (dates >= watermarks) | corrected
+            if not changed.any():
+                return 0
+            # Исправленный день меняет скользящие окна следующих дней:
+            # локация пересчитывается с самого раннего измененного дня
+            start = pd.Series(dates[changed], index=locations[changed]).groupby(level=0).min()
+            fresh = coal[dates >= locations.map(start)]
+
+            # Скользящие окна по хвосту истории и загруженным дням
+            combined = pd.concat([self._coal_history, coal])
+            combined = combined[~combined.index.duplicated(keep="last")].sort_index()
+            frame = combined.reset_index()
+            rolling = frame.groupby("location", sort=True).rolling(
+                f"{self.window}D", on="date", min_periods=1
+            )["coal_temp"]
+            frame["coal_temp_rolling_mean"] = rolling.mean().to_numpy()
+            frame["coal_temp_var"] = rolling.var().fillna(0.0).to_numpy()
+            frame = frame.set_index(["location", "date"]).loc[fresh.index]
+
+            # Погода по локации, при ее отсутствии - по всему складу за тот же день,
+            # а для пересчитываемых дней - ранее рассчитанные значения
+            local_weather, yard_weather = daily_weather(weather_df)
+            weather = local_weather.reindex(frame.index)
+            fallback = yard_weather.reindex(frame.index.get_level_values("date"))
+            weather = weather.fillna(fallback.set_axis(frame.index))
+            weather = weather.fillna(self.features[list(WEATHER_AGGREGATIONS)].reindex(frame.index))
+
+            new_features = frame.join(weather).assign(**FEATURE_DEFAULTS)[FEATURE_NAMES]
+
+            kept = self.features[~self.features.index.isin(new_features.index)]
+            self.features = pd.concat([kept, new_features]).sort_index()
+            self.watermarks = self.features.index.to_frame(index=False).groupby("location")["date"].max()
+
+            # Храним только нужный для окон хвост температур и ограниченную историю признаков
+            self._coal_history = self._trim(combined, self.window)
+            self.features = self._trim(self.features, self.history_days)
+
+            logger.info(f"Рассчитано строк признаков: {len(new_features)}")
+            return len(new_features)
+
+    def _trim(self, data, days):
+        """Оставляет для каждой локации последние days дней до водяного знака"""
+        locations = data.index.get_level_values("location")
+        cutoff = locations.map(self.watermarks) - pd.Timedelta(days=days)
+        return data[data.index.get_level_values("date") > cutoff]
+
+    def latest(self):
+        """
+        Последний рассчитанный вектор признаков для каждой локации
+
+        Возвращает:
+        - DataFrame с индексом location и колонками FEATURE_NAMES
+        """
+        with self._lock:
+            latest = self.features.groupby(level="location").tail(1)
+            return latest.droplevel("date")
+
+    def coal_trend(self):
+        """
+        Средний дневной прирост температуры угля за окно по локациям
+        """
+        with self._lock:
+            history = self._coal_history
+            return history.groupby(level="location").diff().groupby(level="location").mean().fillna(0.0)
+
+    def latest_date(self):
+        """Последняя дата, за которую рассчитаны признаки"""
+        with self._lock:
+            return self.watermarks.max() if not self.watermarks.empty else None
+
+
+# Общий экземпляр конвейера для эндпоинта прогнозов
+feature_pipeline = FeaturePipeline()
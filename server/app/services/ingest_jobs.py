@@ -0,0 +1,221 @@
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy.exc import OperationalError
+
+from .. import database
+from ..models import IngestJob, IngestJobResponse
+from ..settings import INGEST_WORKERS
+from .csv_stream import DEFAULT_CSV_CHUNK_ROWS
+from .ingestion import ingest_csv_stream
+from .upload_registry import DuplicateUpload
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Текущий прогресс выполняемых в этом процессе задач: job_id -> счетчики.
+# Запись прогресса в БД может не пройти (SQLite блокирует базу на время
+# транзакции с данными), поэтому эндпоинт состояния читает счетчики отсюда.
+_live_progress = {}
+
+
+def get_executor():
+    """
+    Пул потоков для фоновой загрузки (создается при первом обращении)
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+        return _executor
+
+
+def shutdown_executor():
+    """
+    Остановка пула; незавершенные задачи будут перезапущены при следующем старте
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def create_job(db, type, filename, file_path, encoding, chunk_rows=DEFAULT_CSV_CHUNK_ROWS, sha256=None):
+    """
+    Регистрация задачи загрузки для уже сохраненного на диск файла
+    """
+    job = IngestJob(
+        id=uuid.uuid4().hex,
+        type=type,
+        filename=filename,
+        file_path=file_path,
+        encoding=encoding,
+        sha256=sha256,
+        status="queued",
+        chunk_rows=chunk_rows,
+        bytes_total=os.path.getsize(file_path)
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def submit_job(job_id):
+    """
+    Постановка задачи в очередь пула
+    """
+    get_executor().submit(run_job, job_id)
+    logger.info(f"Задача загрузки {job_id} поставлена в очередь")
+
+
+def run_job(job_id):
+    """
+    Выполнение задачи загрузки в рабочем потоке
+
+    Состояние задачи обновляется в отдельной сессии после каждой порции,
+    данные фиксируются одной транзакцией в конце.
+    """
+    state_db = database.SessionLocal()
+    data_db = database.SessionLocal()
+    try:
+        job = state_db.get(IngestJob, job_id)
+        if job is None:
+            logger.error(f"Задача загрузки {job_id} не найдена")
+            return
+
+        job.status = "running"
+        job.started_at = datetime.now()
+        job.finished_at = None
+        job.error = None
+        job.bytes_processed = job.rows_parsed = job.rows_inserted = job.rows_rejected = 0
+        state_db.commit()
+
+        # SQLite допускает только одного писателя, и запись прогресса ждала бы
+        # конца транзакции с данными
+        persist_progress = state_db.get_bind().dialect.name != "sqlite"
+
+        def progress(totals, bytes_processed):
+            counters = {
+                "rows_parsed": totals["parsed"],
+                "rows_inserted": totals["rows"],
+                "rows_rejected": totals["rejected"],
+                "bytes_processed": bytes_processed
+            }
+            _live_progress[job_id] = counters
+            if not persist_progress:
+                return
+            try:
+                for key, value in counters.items():
+                    setattr(job, key, value)
+                state_db.commit()
+            except OperationalError as e:
+                state_db.rollback()
+                logger.debug(f"Не удалось сохранить прогресс задачи {job_id}: {str(e)}")
+
+        upload = None
+        if job.sha256:
+            upload = {"sha256": job.sha256, "filename": job.filename, "file_path": job.file_path}
+        try:
+            with open(job.file_path, "rb") as binary_file:
+                totals = ingest_csv_stream(
+                    binary_file, job.type, data_db, job.encoding, job.chunk_rows, progress=progress, upload=upload
+                )
+        except DuplicateUpload:
+            # Такой же файл зафиксирован параллельной загрузкой: данные откачены
+            job.status = "skipped"
+            job.error = "Файл с таким содержимым уже был загружен"
+            job.rows_inserted = 0
+            job.finished_at = datetime.now()
+            state_db.commit()
+            logger.info(f"Задача загрузки {job_id} пропущена: файл уже загружен")
+            return
+
+        job.status = "done"
+        job.rows_parsed = totals["parsed"]
+        job.rows_inserted = totals["rows"]
+        job.rows_rejected = totals["rejected"]
+        job.bytes_processed = job.bytes_total
+        job.finished_at = datetime.now()
+        state_db.commit()
+        logger.info(f"Задача загрузки {job_id} завершена, строк: {job.rows_inserted}")
+    except Exception as e:
+        logger.exception(f"Ошибка в задаче загрузки {job_id}: {str(e)}")
+        state_db.rollback()
+        job = state_db.get(IngestJob, job_id)
+        if job is not None:
+            job.status = "failed"
+            job.error = str(e)
+            job.finished_at = datetime.now()
+            state_db.commit()
+    finally:
+        _live_progress.pop(job_id, None)
+        data_db.close()
+        state_db.close()
+
+
+def resume_pending_jobs():
+    """
+    Повторная постановка в очередь задач, прерванных перезапуском сервера
+
+    Данные задачи фиксируются одной транзакцией, поэтому прерванная задача
+    ничего не записала и выполняется заново с начала файла.
+    """
+    db = database.SessionLocal()
+    try:
+        pending = db.query(IngestJob.id).filter(
+            IngestJob.status.in_(["queued", "running"])
+        ).order_by(IngestJob.created_at).all()
+    finally:
+        db.close()
+
+    for (job_id,) in pending:
+        submit_job(job_id)
+    if pending:
+        logger.info(f"Возобновлено задач загрузки: {len(pending)}")
+    return len(pending)
+
+
+def job_status(job: IngestJob):
+    """
+    Состояние задачи с пропускной способностью и оценкой оставшегося времени
+    """
+    result = IngestJobResponse.model_validate(job).model_dump()
+    counters = {
+        "rows_parsed": job.rows_parsed,
+        "rows_inserted": job.rows_inserted,
+        "rows_rejected": job.rows_rejected,
+        "bytes_processed": job.bytes_processed
+    }
+    if job.status == "running":
+        counters.update(_live_progress.get(job.id, {}))
+    result.update(counters)
+
+    elapsed = None
+    if job.started_at is not None:
+        elapsed = ((job.finished_at or datetime.now()) - job.started_at).total_seconds()
+
+    throughput = round(counters["rows_inserted"] / elapsed, 1) if elapsed else None
+
+    eta = None
+    if job.status in ("done", "skipped"):
+        eta = 0.0
+    elif job.status == "running" and elapsed and counters["bytes_processed"]:
+        remaining = max(job.bytes_total - counters["bytes_processed"], 0)
+        eta = round(elapsed * remaining / counters["bytes_processed"], 1)
+
+    result.update({
+        "bytes_total": job.bytes_total,
+        "progress": round(counters["bytes_processed"] / job.bytes_total, 4) if job.bytes_total else None,
+        "elapsed_seconds": round(elapsed, 1) if elapsed is not None else None,
+        "rows_per_second": throughput,
+        "eta_seconds": eta
+    })
+    return result
@@ -0,0 +1,166 @@
+import logging
+import time
+
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from ..models import CoalTemperature, Weather, FireHistory, Stack
+from .bulk_loader import bulk_insert, bulk_upsert
+from .data_processor import MAX_REPORTED_REJECTS, coerce_frame, describe_rejects
+from .partitions import PARTITIONED_TABLES, maintain_partitions
+from .csv_stream import DEFAULT_CSV_CHUNK_ROWS, iter_csv_chunks
+from .instrumentation import timed
+from .response_cache import invalidate
+from .rollup import ROLLUP_SOURCES, refresh_daily_rollup
+from .stacks import index_stacks, prepare_stacks
+from .upload_registry import DuplicateUpload, register_upload
+
+logger = logging.getLogger(__name__)
+
+
+class CsvFormatError(ValueError):
+    """Ошибка структуры CSV-файла (нет нужных колонок, не удалось разобрать)"""
+
+
+# Целевые таблицы по типу файла
+DATA_MODELS = {
+    "coal": CoalTemperature,
+    "weather": Weather,
+    "fire_history": FireHistory,
+    "stacks": Stack
+}
+
+# Естественные ключи таблиц: загрузка по ним идет через upsert,
+# поэтому повторная загрузка того же файла не создает дубликатов
+DATA_KEYS = {
+    "coal": ("date", "location"),
+    "weather": ("date", "location"),
+    "stacks": ("location",)
+}
+
+# Дополнительная обработка приведенных строк перед записью:
+# функция возвращает (frame, маска отклоненных строк, причины)
+DATA_PREPARERS = {
+    "stacks": prepare_stacks
+}
+
+# Обновление производных структур после записи порции
+DATA_INDEXERS = {
+    "stacks": index_stacks
+}
+
+
+def process_data(df: pd.DataFrame, db: Session, type: str):
+    """
+    Проверка, приведение типов и пакетная запись порции данных
+
+    Возвращает:
+    - статистику загрузки с количеством и причинами отклоненных строк
+    """
+    with timed("pandas"):
+        try:
+            frame, reject, reasons = coerce_frame(df, type)
+        except ValueError as e:
+            raise CsvFormatError(str(e)) from e
+
+        if type in DATA_PREPARERS:
+            frame, extra_reject, extra_reasons = DATA_PREPARERS[type](frame)
+            reasons = pd.concat([reasons, extra_reasons[~extra_reasons.index.isin(reasons.index)]]).sort_index()
+            reject = reject | extra_reject
+
+    if reject.any():
+        logger.error(f"Пропущено строк {type} с некорректными значениями: {int(reject.sum())}")
+        frame = frame[~reject]
+
+    try:
+        if type in DATA_KEYS:
+            stats = bulk_upsert(db, DATA_MODELS[type], frame, DATA_KEYS[type])
+        else:
+            stats = bulk_insert(db, DATA_MODELS[type], frame)
+        if type in DATA_INDEXERS:
+            DATA_INDEXERS[type](db, frame)
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении данных {type}: {str(e)}")
+        raise
+
+    stats["rejected"] = int(reject.sum())
+    stats["rejects"] = describe_rejects(reasons)
+    if "date" in frame.columns and not frame.empty:
+        stats["date_from"] = frame["date"].min()
+        stats["date_to"] = frame["date"].max()
+    return stats
+
+
+def ingest_csv_stream(binary_file, type: str, db: Session, encoding: str,
+                      chunk_rows: int = DEFAULT_CSV_CHUNK_ROWS, raw_file=None, progress=None, upload=None):
+    """
+    Потоковая загрузка CSV в БД порциями в одной транзакции
+
+    Параметры:
+    - binary_file: бинарный файловый объект с CSV
+    - type: тип данных ('coal', 'weather', 'fire_history')
+    - db: сессия SQLAlchemy
+    - encoding: кодировка файла
+    - chunk_rows: количество строк в одной порции
+    - raw_file: файл, в который параллельно сохраняются исходные байты
+    - progress: функция progress(totals, bytes_processed), вызывается после каждой порции
+    - upload: {sha256, filename, file_path} - запись файла в реестр загрузок в той же
+      транзакции; если такой файл уже зафиксирован, данные откатываются (DuplicateUpload).
+      Файл без загруженных строк не регистрируется
+
+    Возвращает:
+    - словарь {rows, parsed, rejected, rejects, chunks, method, seconds, rows_per_second,
+      date_from, date_to}
+    """
+    totals = {"rows": 0, "parsed": 0, "rejected": 0, "rejects": [], "chunks": 0}
+    started = time.perf_counter()
+    try:
+        try:
+            for chunk in iter_csv_chunks(binary_file, encoding, chunk_rows, raw_file):
+                chunk_stats = process_data(chunk, db, type)
+                totals["rows"] += chunk_stats["rows"]
+                totals["parsed"] += len(chunk)
+                totals["rejected"] += chunk_stats["rejected"]
+                room = MAX_REPORTED_REJECTS - len(totals["rejects"])
+                totals["rejects"].extend(chunk_stats["rejects"][:room])
+                totals["chunks"] += 1
+                totals["method"] = chunk_stats["method"]
+                if "date_from" in chunk_stats:
+                    totals["date_from"] = min(totals.get("date_from", chunk_stats["date_from"]), chunk_stats["date_from"])
+                    totals["date_to"] = max(totals.get("date_to", chunk_stats["date_to"]), chunk_stats["date_to"])
+                logger.info(f"Порция {totals['chunks']} загружена, всего строк: {totals['rows']}")
+                if progress is not None:
+                    progress(totals, binary_file.tell())
+        except (pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+            raise CsvFormatError(str(e)) from e
+        # Дневные итоги календаря пересчитываются за загруженные даты в той же транзакции
+        if type in ROLLUP_SOURCES and totals["rows"]:
+            refresh_daily_rollup(db, totals.get("date_from"), totals.get("date_to"))
+        # Файл без загруженных строк можно отправить повторно после исправления
+        if upload is not None and totals["rows"]:
+            if raw_file is not None:
+                raw_file.flush()
+            if not register_upload(db, type, rows=totals["rows"], **upload):
+                raise DuplicateUpload(upload["filename"])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    # Строки месяцев без своей секции попали в секцию по умолчанию:
+    # переносим их в новые секции отдельной короткой транзакцией
+    table = DATA_MODELS[type].__tablename__
+    if table in PARTITIONED_TABLES and totals["rows"]:
+        try:
+            maintain_partitions(db.get_bind(), [table])
+        except Exception as e:
+            logger.exception(f"Не удалось создать секции {table}: {str(e)}")
+
+    # Закешированные ответы по затронутым датам больше не актуальны
+    if totals["rows"]:
+        invalidate(table, totals.get("date_from"), totals.get("date_to"))
+
+    seconds = time.perf_counter() - started
+    totals["seconds"] = round(seconds, 4)
+    totals["rows_per_second"] = round(totals["rows"] / seconds, 1) if seconds > 0 else float(totals["rows"])
+    return totals
@@ -0,0 +1,344 @@
+"""
+Инструментирование запросов: количество и время запросов к БД, время pandas
+и модели, общая задержка по маршрутам
+
+Данные одного HTTP-запроса собираются в RequestStats (через contextvars,
+поэтому видны и в пуле потоков, и в асинхронных сессиях), отдаются клиенту
+в заголовке Server-Timing и накапливаются в реестре для /metrics
+(текстовый формат Prometheus).
+"""
+import contextvars
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Порог детектора N+1: предупреждение, если запрос одной формы выполнен
+# за HTTP-запрос больше раз (0 - детектор выключен)
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+
+# Границы корзин гистограммы задержки (секунды)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Маршрут запросов к БД вне HTTP-запросов (запуск, фоновые загрузки)
+BACKGROUND_ROUTE = "background"
+
+# Литералы, заменяемые при построении формы запроса
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+# Списки IN (...) разной длины
+_IN_LISTS = re.compile(r"\bIN \([^()]*\)", re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+
+
+def statement_shape(statement):
+    """
+    Форма SQL-запроса: без литералов, с одинаковой записью списков IN
+    и пробелов - запросы, отличающиеся только значениями, совпадают
+    """
+    shape = _LITERALS.sub("?", statement)
+    shape = _IN_LISTS.sub("IN (...)", shape)
+    return _SPACES.sub(" ", shape).strip()
+
+
+class RequestStats:
+    """Показатели одного HTTP-запроса"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.sections = defaultdict(float)
+        self.shapes = Counter()
+        self._lock = threading.Lock()
+
+    def record_query(self, statement, seconds):
+        with self._lock:
+            self.queries += 1
+            self.db_seconds += seconds
+            self.shapes[statement_shape(statement)] += 1
+
+    def record_section(self, name, seconds):
+        with self._lock:
+            self.sections[name] += seconds
+
+    def repeated_statements(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """Формы запросов, выполненные больше threshold раз"""
+        if threshold <= 0:
+            return []
+        return [(shape, count) for shape, count in self.shapes.most_common() if count > threshold]
+
+    def server_timing(self, total):
+        """Значение заголовка Server-Timing (длительности в миллисекундах)"""
+        parts = [f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries"']
+        parts += [f"{name};dur={seconds * 1000:.1f}" for name, seconds in sorted(self.sections.items())]
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current = contextvars.ContextVar("request_stats", default=None)
+
+
+def current_stats():
+    """Показатели текущего HTTP-запроса (None вне запроса)"""
+    return _current.get()
+
+
+class MetricsRegistry:
+    """
+    Накопленные показатели по маршрутам (потокобезопасно)
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = Counter()
+            self.latency_sum = defaultdict(float)
+            self.latency_buckets = defaultdict(lambda: [0] * (len(self.buckets) + 1))
+            self.queries = Counter()
+            self.db_seconds = defaultdict(float)
+            self.sections = defaultdict(float)
+            self.n_plus_one = Counter()
+
+    def observe_request(self, method, route, status, seconds, stats):
+        with self._lock:
+            self.requests[(method, route, status)] += 1
+            self.latency_sum[route] += seconds
+            counts = self.latency_buckets[route]
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[index] += 1
+            counts[-1] += 1
+            self.queries[route] += stats.queries
+            self.db_seconds[route] += stats.db_seconds
+            for name, value in stats.sections.items():
+                self.sections[(route, name)] += value
+
+    def observe_query(self, route, seconds):
+        with self._lock:
+            self.queries[route] += 1
+            self.db_seconds[route] += seconds
+
+    def observe_section(self, route, name, seconds):
+        with self._lock:
+            self.sections[(route, name)] += seconds
+
+    def observe_n_plus_one(self, route):
+        with self._lock:
+            self.n_plus_one[route] += 1
+
+    def render(self, pools=None):
+        """
+        Текстовый формат Prometheus
+
+        Параметры:
+        - pools: состояние пулов соединений (database.pool_metrics())
+        """
+        with self._lock:
+            lines = [
+                "# HELP http_requests_total Количество HTTP-запросов",
+                "# TYPE http_requests_total counter"
+            ]
+            for (method, route, status), count in sorted(self.requests.items()):
+                lines.append(f"http_requests_total{_labels(method=method, route=route, status=status)} {count}")
+
+            lines += [
+                "# HELP http_request_duration_seconds Задержка HTTP-запросов",
+                "# TYPE http_request_duration_seconds histogram"
+            ]
+            for route, counts in sorted(self.latency_buckets.items()):
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f"http_request_duration_seconds_bucket{_labels(route=route, le=bound)} {count}")
+                lines.append(f"http_request_duration_seconds_bucket{_labels(route=route, le='+Inf')} {counts[-1]}")
+                lines.append(f"http_request_duration_seconds_sum{_labels(route=route)} {self.latency_sum[route]:.6f}")
+                lines.append(f"http_request_duration_seconds_count{_labels(route=route)} {counts[-1]}")
+
+            lines += [
+                "# HELP db_queries_total Количество запросов к БД",
+                "# TYPE db_queries_total counter"
+            ]
+            for route, count in sorted(self.queries.items()):
+                lines.append(f"db_queries_total{_labels(route=route)} {count}")
+
+            lines += [
+                "# HELP db_query_seconds_total Время выполнения запросов к БД",
+                "# TYPE db_query_seconds_total counter"
+            ]
+            for route, seconds in sorted(self.db_seconds.items()):
+                lines.append(f"db_query_seconds_total{_labels(route=route)} {seconds:.6f}")
+
+            lines += [
+                "# HELP app_section_seconds_total Время участков обработки (pandas, model)",
+                "# TYPE app_section_seconds_total counter"
+            ]
+            for (route, name), seconds in sorted(self.sections.items()):
+                lines.append(f"app_section_seconds_total{_labels(route=route, section=name)} {seconds:.6f}")
+
+            lines += [
+                "# HELP db_n_plus_one_total HTTP-запросы с повторяющимися запросами к БД",
+                "# TYPE db_n_plus_one_total counter"
+            ]
+            for route, count in sorted(self.n_plus_one.items()):
+                lines.append(f"db_n_plus_one_total{_labels(route=route)} {count}")
+
+        if pools:
+            lines += _render_pools(pools)
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+# Показатели пулов: ключ pool_metrics() -> (метрика, тип, описание)
+POOL_GAUGES = {
+    "checked_out": ("db_pool_checked_out", "gauge", "Выданные соединения"),
+    "idle": ("db_pool_idle", "gauge", "Свободные соединения"),
+    "checkouts": ("db_pool_checkouts_total", "counter", "Выдачи соединений"),
+    "timeouts": ("db_pool_timeouts_total", "counter", "Таймауты ожидания соединения"),
+    "wait_seconds": ("db_pool_wait_seconds_total", "counter", "Время ожидания соединения"),
+    "max_wait_seconds": ("db_pool_max_wait_seconds", "gauge", "Наибольшее время ожидания соединения")
+}
+
+
+def _render_pools(pools):
+    lines = []
+    for key, (metric, kind, description) in POOL_GAUGES.items():
+        samples = [(name, state[key]) for name, state in pools.items() if key in state]
+        if not samples:
+            continue
+        lines += [f"# HELP {metric} {description}", f"# TYPE {metric} {kind}"]
+        lines += [f"{metric}{_labels(engine=name)} {value}" for name, value in samples]
+    return lines
+
+
+registry = MetricsRegistry()
+
+
+@contextmanager
+def timed(section):
+    """
+    Замер участка обработки (например, "pandas" или "model") для текущего
+    HTTP-запроса; работает и как декоратор
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        stats = _current.get()
+        if stats is not None:
+            stats.record_section(section, seconds)
+        else:
+            registry.observe_section(BACKGROUND_ROUTE, section, seconds)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    seconds = time.perf_counter() - started
+    stats = _current.get()
+    if stats is not None:
+        stats.record_query(statement, seconds)
+    else:
+        registry.observe_query(BACKGROUND_ROUTE, seconds)
+
+
+def _handle_error(exception_context):
+    # Неудачный запрос не вызывает after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+
+def instrument_engine(engine):
+    """
+    Подключение замеров запросов к движку (для асинхронного - к его sync_engine)
+    """
+    engine = getattr(engine, "sync_engine", engine)
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def route_name(scope):
+    """Шаблон пути маршрута (/api/calendar/{year}/{month}) или путь без маршрута"""
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if not template:
+        return "unmatched"
+    # В части версий FastAPI это маршрут подключенного роутера без префикса
+    # (/calendar/{year}/{month}): префикс берется из фактического пути
+    extra = scope["path"].rstrip("/").count("/") - template.rstrip("/").count("/")
+    if extra > 0:
+        template = "/".join(scope["path"].split("/")[:extra + 1]) + template
+    return template
+
+
+class InstrumentationMiddleware:
+    """
+    ASGI-middleware: показатели запроса в заголовке Server-Timing, в реестре
+    метрик и предупреждение детектора N+1
+    """
+
+    def __init__(self, app, registry=registry, threshold=N_PLUS_ONE_THRESHOLD):
+        self.app = app
+        self.registry = registry
+        self.threshold = threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        response_status = {"code": 500}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                response_status["code"] = message["status"]
+                total = time.perf_counter() - stats.started
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", stats.server_timing(total).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            self.finish(scope, stats, response_status["code"])
+
+    def finish(self, scope, stats, status_code):
+        route = route_name(scope)
+        seconds = time.perf_counter() - stats.started
+        self.registry.observe_request(scope["method"], route, status_code, seconds, stats)
+
+        repeated = stats.repeated_statements(self.threshold)
+        if repeated:
+            self.registry.observe_n_plus_one(route)
+            for shape, count in repeated:
+                logger.warning(
+                    f"Возможный N+1 в {scope['method']} {route}: запрос выполнен {count} раз "
+                    f"(порог {self.threshold}): {shape[:300]}"
+                )
@@ -0,0 +1,418 @@
+"""
+Реестр моделей прогнозирования: версии в каталоге, активная модель
+с атомарной заменой и теневая оценка модели-кандидата
+
+Каталог реестра (MODEL_REGISTRY_DIR):
+
+    <версия>/model.txt        - текстовый файл модели LightGBM
+    <версия>/metadata.json    - признаки, SHA-256, дата обучения, дата регистрации
+    ACTIVE                    - версия активной модели
+    SHADOW                    - версия модели для теневой оценки (если есть)
+
+Указатели ACTIVE и SHADOW общие для всех процессов сервера: процесс,
+заметивший их изменение, загружает новую модель в фоне и подменяет ссылку
+на нее одним присваиванием. Выполняющиеся прогнозы дорабатывают
+на модели, взятой в начале запроса.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from .features import FEATURE_NAMES
+from .tree_model import TreeEnsemble
+from .upload_registry import file_sha256
+
+logger = logging.getLogger(__name__)
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Модель, поставляемая с приложением: первая версия пустого реестра
+MODEL_PATH = os.getenv("MODEL_PATH", os.path.join(SERVER_DIR, "predict", "model.txt"))
+
+# Каталог реестра моделей
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", os.path.join(SERVER_DIR, "predict", "models"))
+
+# Чем вычислять модель: numpy (TreeEnsemble, без загрузки lightgbm) или lightgbm
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "numpy")
+
+# Как часто процесс проверяет указатели ACTIVE и SHADOW (секунды)
+MODEL_REFRESH_SECONDS = float(os.getenv("MODEL_REFRESH_SECONDS", "10"))
+
+MODEL_FILE = "model.txt"
+METADATA_FILE = "metadata.json"
+ACTIVE_POINTER = "ACTIVE"
+SHADOW_POINTER = "SHADOW"
+
+
+class ModelRegistryError(ValueError):
+    """Версия не найдена или файл модели не подходит"""
+
+
+def read_model(path, backend=MODEL_BACKEND):
+    """
+    Чтение модели из текстового файла LightGBM
+
+    Возвращает:
+    - TreeEnsemble (backend="numpy") или lightgbm.Booster (backend="lightgbm")
+    """
+    if backend == "lightgbm":
+        import lightgbm as lgb
+        return lgb.Booster(model_file=path)
+    if backend != "numpy":
+        raise ValueError(f"Неизвестный MODEL_BACKEND: {backend}")
+    return TreeEnsemble.from_file(path)
+
+
+def read_feature_names(path):
+    """Имена признаков из строки feature_names= файла модели"""
+    with open(path, encoding="utf-8") as model_file:
+        for line in model_file:
+            if line.startswith("feature_names="):
+                return line.split("=", 1)[1].split()
+            if line.startswith("Tree="):
+                break
+    raise ModelRegistryError("В файле модели нет строки feature_names")
+
+
+class LoadedModel:
+    """Загруженная модель вместе с версией и метаданными"""
+
+    def __init__(self, version, model, metadata):
+        self.version = version
+        self.model = model
+        self.metadata = metadata
+        self.sha256 = metadata["sha256"]
+        self.loaded_at = datetime.now()
+
+
+class ModelRegistry:
+    """
+    Версии моделей в каталоге root и модели, загруженные этим процессом
+    """
+
+    def __init__(self, root=MODEL_REGISTRY_DIR, backend=MODEL_BACKEND, refresh_seconds=MODEL_REFRESH_SECONDS):
+        self.root = root
+        self.backend = backend
+        self.refresh_seconds = refresh_seconds
+        self._active = None
+        self._shadow = None
+        self._loading = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._first_load_lock = threading.Lock()
+        self._shadow_executor = None
+        self._shadow_busy = threading.Event()
+        self.shadow_report = None
+        self.shadow_skipped = 0
+
+    # Версии
+
+    def _path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def metadata(self, version):
+        try:
+            with open(self._path(version, METADATA_FILE), encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            raise ModelRegistryError(f"Версия модели {version} не найдена") from None
+
+    def versions(self):
+        """Метаданные всех версий по дате регистрации"""
+        if not os.path.isdir(self.root):
+            return []
+        result = []
+        for name in os.listdir(self.root):
+            if os.path.isfile(self._path(name, METADATA_FILE)):
+                result.append(self.metadata(name))
+        return sorted(result, key=lambda item: item["registered_at"])
+
+    def register(self, source_path, version=None, trained_at=None):
+        """
+        Регистрация файла модели новой версией
+
+        Признаки модели проверяются по FEATURE_NAMES, модель пробно загружается.
+        Файл с тем же содержимым, что и у существующей версии, не дублируется.
+        Каталог версии собирается во временном каталоге и переименовывается
+        целиком, поэтому другие процессы не видят его частично записанным.
+
+        Параметры:
+        - version: имя версии (по умолчанию - дата обучения и начало SHA-256)
+        - trained_at: дата обучения (datetime; по умолчанию - время изменения файла)
+
+        Возвращает:
+        - метаданные версии
+        """
+        feature_names = read_feature_names(source_path)
+        if feature_names != FEATURE_NAMES:
+            raise ModelRegistryError(f"Признаки модели {feature_names} не совпадают с ожидаемыми {FEATURE_NAMES}")
+        with open(source_path, "rb") as model_file:
+            sha256 = file_sha256(model_file)
+        for existing in self.versions():
+            if existing["sha256"] == sha256:
+                return existing
+
+        model = read_model(source_path, self.backend)
+        trained_at = trained_at or datetime.fromtimestamp(os.path.getmtime(source_path))
+        version = version or f"{trained_at:%Y%m%d}-{sha256[:8]}"
+        if os.sep in version or version.startswith(".") or version in (ACTIVE_POINTER, SHADOW_POINTER):
+            raise ModelRegistryError(f"Недопустимое имя версии: {version}")
+        if os.path.exists(self._path(version)):
+            raise ModelRegistryError(f"Версия модели {version} уже существует")
+
+        metadata = {
+            "version": version,
+            "feature_names": feature_names,
+            "sha256": sha256,
+            "trained_at": trained_at.isoformat(timespec="seconds"),
+            "registered_at": datetime.now().isoformat(timespec="seconds"),
+            "trees": model.num_trees()
+        }
+        os.makedirs(self.root, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".staging-", dir=self.root)
+        try:
+            shutil.copyfile(source_path, os.path.join(staging, MODEL_FILE))
+            with open(os.path.join(staging, METADATA_FILE), "w", encoding="utf-8") as file:
+                json.dump(metadata, file, ensure_ascii=False, indent=2)
+            os.rename(staging, self._path(version))
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            # Тот же файл одновременно зарегистрирован другим процессом
+            if os.path.isfile(self._path(version, METADATA_FILE)) and self.metadata(version)["sha256"] == sha256:
+                return self.metadata(version)
+            raise
+        logger.info(f"Зарегистрирована модель {version} ({sha256[:12]})")
+        return metadata
+
+    def ensure_default(self, path=MODEL_PATH):
+        """
+        Пустой реестр: регистрируем поставляемую модель и делаем ее активной
+        """
+        if self._read_pointer(ACTIVE_POINTER):
+            return
+        metadata = self.register(path)
+        self._write_pointer(ACTIVE_POINTER, metadata["version"])
+
+    # Указатели ACTIVE / SHADOW
+
+    def _read_pointer(self, name):
+        try:
+            with open(self._path(name), encoding="utf-8") as file:
+                return file.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _write_pointer(self, name, version):
+        """Атомарная запись указателя (временный файл и os.replace)"""
+        os.makedirs(self.root, exist_ok=True)
+        if version is None:
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+            return
+        descriptor, temporary = tempfile.mkstemp(prefix=f".{name}-", dir=self.root)
+        with os.fdopen(descriptor, "w", encoding="utf-8") as file:
+            file.write(version)
+        os.replace(temporary, self._path(name))
+
+    # Загрузка и замена
+
+    def load(self, version):
+        """Загрузка версии (синхронно) с проверкой контрольной суммы"""
+        metadata = self.metadata(version)
+        path = self._path(version, MODEL_FILE)
+        with open(path, "rb") as model_file:
+            if file_sha256(model_file) != metadata["sha256"]:
+                raise ModelRegistryError(f"Контрольная сумма модели {version} не совпадает с метаданными")
+        return self._load_file(version, path, metadata)
+
+    def _load_file(self, version, path, metadata):
+        model = read_model(path, self.backend)
+        if model.feature_name() != FEATURE_NAMES:
+            raise ModelRegistryError(f"Признаки модели {version} не совпадают с ожидаемыми {FEATURE_NAMES}")
+        return LoadedModel(version, model, metadata)
+
+    def _swap(self, role, loaded):
+        # Присваивание ссылки атомарно: запросы, уже взявшие модель, дорабатывают на ней
+        with self._lock:
+            if role == ACTIVE_POINTER:
+                self._active = loaded
+            else:
+                self._shadow = loaded
+        if loaded is not None:
+            logger.info(f"Модель {loaded.version} загружена ({role.lower()}, {self.backend})")
+
+    def _load_in_background(self, role, version):
+        """Загрузка версии в фоновом потоке и замена после успешной загрузки"""
+        with self._lock:
+            if self._loading.get(role) == version:
+                return
+            self._loading[role] = version
+
+        def load():
+            try:
+                loaded = self.load(version)
+                # Пока модель загружалась, указатель могли переключить на другую версию
+                if self._read_pointer(role) == version:
+                    self._swap(role, loaded)
+            except Exception as e:
+                logger.exception(f"Не удалось загрузить модель {version}: {str(e)}")
+            finally:
+                with self._lock:
+                    if self._loading.get(role) == version:
+                        del self._loading[role]
+
+        threading.Thread(target=load, name=f"model-{role.lower()}", daemon=True).start()
+
+    def refresh(self, force=False):
+        """
+        Проверка указателей (не чаще refresh_seconds): при изменении
+        версия загружается в фоне, до замены работает текущая модель
+        """
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.refresh_seconds:
+            return
+        self._checked_at = now
+
+        for role, current in ((ACTIVE_POINTER, self._active), (SHADOW_POINTER, self._shadow)):
+            version = self._read_pointer(role)
+            if version == (current.version if current else None):
+                continue
+            if version is None:
+                # Без указателя ACTIVE остается загруженная модель
+                if role == SHADOW_POINTER:
+                    self._swap(role, None)
+            elif role == ACTIVE_POINTER and current is None:
+                # Активной модели еще нет: прогнозу нужна модель сейчас
+                self._swap(role, self.load(version))
+            else:
+                self._load_in_background(role, version)
+
+    def active(self):
+        """
+        Активная модель; при первом обращении реестр заполняется
+        поставляемой моделью и модель загружается синхронно
+        """
+        if self._active is None:
+            with self._first_load_lock:
+                if self._active is None:
+                    self._load_first()
+        else:
+            self.refresh()
+        if self._active is None:
+            raise ModelRegistryError("Активная модель не задана")
+        return self._active
+
+    def _load_first(self, path=MODEL_PATH):
+        try:
+            self.ensure_default(path)
+        except OSError as e:
+            # Каталог реестра недоступен для записи: работаем с поставляемой моделью
+            logger.warning(f"Реестр моделей {self.root} недоступен ({str(e)}), используется {path}")
+            with open(path, "rb") as model_file:
+                sha256 = file_sha256(model_file)
+            self._swap(ACTIVE_POINTER, self._load_file("default", path, {"version": "default", "sha256": sha256}))
+            return
+        self.refresh(force=True)
+
+    def shadow(self):
+        """Модель теневой оценки (None - теневая оценка выключена)"""
+        self.refresh()
+        return self._shadow
+
+    def activate(self, version):
+        """
+        Назначение активной версии: модель загружается в фоне и заменяет
+        текущую после загрузки; остальные процессы переключаются
+        при следующей проверке указателя
+        """
+        self.metadata(version)
+        self._write_pointer(ACTIVE_POINTER, version)
+        if self._shadow is not None and self._shadow.version == version:
+            self._write_pointer(SHADOW_POINTER, None)
+        self._load_in_background(ACTIVE_POINTER, version)
+
+    def set_shadow(self, version):
+        """Назначение версии для теневой оценки (None - выключить)"""
+        if version is not None:
+            self.metadata(version)
+        self._write_pointer(SHADOW_POINTER, version)
+        if version is None:
+            self._swap(SHADOW_POINTER, None)
+        else:
+            self._load_in_background(SHADOW_POINTER, version)
+
+    # Теневая оценка
+
+    def submit_shadow(self, matrix, primary, primary_version, compare):
+        """
+        Теневая оценка кандидата на той же матрице признаков в отдельном потоке:
+        прогноз не ждет ее завершения. Если предыдущая теневая оценка еще
+        выполняется, новая пропускается, чтобы не копить очередь.
+
+        Параметры:
+        - matrix: матрица признаков прогноза
+        - primary: вероятности модели, давшей прогноз
+        - primary_version: версия этой модели
+        - compare: функция (вероятности кандидата, вероятности основной модели) -> словарь отчета
+        """
+        shadow = self._shadow
+        if shadow is None or shadow.version == primary_version:
+            return
+        if self._shadow_busy.is_set():
+            self.shadow_skipped += 1
+            return
+        self._shadow_busy.set()
+        with self._lock:
+            if self._shadow_executor is None:
+                self._shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-shadow")
+
+        def score():
+            try:
+                started = time.perf_counter()
+                candidate = shadow.model.predict(matrix)
+                report = {
+                    "version": shadow.version,
+                    "active_version": primary_version,
+                    "rows": len(matrix),
+                    **compare(candidate, primary),
+                    "seconds": round(time.perf_counter() - started, 4),
+                    "scored_at": datetime.now().isoformat(timespec="seconds")
+                }
+                self.shadow_report = report
+                logger.info(f"Теневая оценка {shadow.version} против {primary_version}: {report}")
+            except Exception as e:
+                logger.exception(f"Теневая оценка модели {shadow.version} завершилась ошибкой: {str(e)}")
+            finally:
+                self._shadow_busy.clear()
+
+        self._shadow_executor.submit(score)
+
+    def shutdown(self):
+        """Остановка потока теневой оценки"""
+        with self._lock:
+            if self._shadow_executor is not None:
+                self._shadow_executor.shutdown(wait=False, cancel_futures=True)
+                self._shadow_executor = None
+
+    def status(self):
+        """Состояние реестра в этом процессе"""
+        self.refresh()
+        active, shadow = self._active, self._shadow
+        return {
+            "backend": self.backend,
+            "active": active.version if active else None,
+            "active_loaded_at": active.loaded_at.isoformat(timespec="seconds") if active else None,
+            "shadow": shadow.version if shadow else None,
+            "loading": dict(self._loading),
+            "shadow_report": self.shadow_report,
+            "shadow_skipped": self.shadow_skipped
+        }
+
+
+registry = ModelRegistry()
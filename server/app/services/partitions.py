@@ -0,0 +1,116 @@
+import logging
+import os
+from datetime import date
+
+from sqlalchemy import text
+
+from ..models import CoalTemperature, Weather
+
+logger = logging.getLogger(__name__)
+
+# Таблицы, секционированные по месяцам (миграция 0002_partitions_and_indexes)
+PARTITIONED_TABLES = (CoalTemperature.__tablename__, Weather.__tablename__)
+
+# На сколько месяцев вперед от текущего заранее создаются секции
+PARTITION_PREMAKE_MONTHS = int(os.getenv("PARTITION_PREMAKE_MONTHS", "3"))
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_partition_name(table, month):
+    """Имя секции таблицы за месяц: weather_p202303"""
+    return f"{table}_p{month.year:04d}{month.month:02d}"
+
+
+def default_partition_name(table):
+    """Секция по умолчанию: строки месяцев, для которых еще нет своей секции"""
+    return f"{table}_default"
+
+
+def _is_partitioned(conn, table):
+    return conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :table AND c.relnamespace = current_schema()::regnamespace"
+    ), {"table": table}).first() is not None
+
+
+def _attached_partitions(conn, table):
+    return set(conn.execute(text(
+        "SELECT child.relname FROM pg_inherits i "
+        "JOIN pg_class parent ON parent.oid = i.inhparent "
+        "JOIN pg_class child ON child.oid = i.inhrelid "
+        "WHERE parent.relname = :table AND parent.relnamespace = current_schema()::regnamespace"
+    ), {"table": table}).scalars())
+
+
+def _default_months(conn, table):
+    """Месяцы, строки которых лежат в секции по умолчанию"""
+    return set(conn.execute(text(
+        f"SELECT DISTINCT date_trunc('month', date)::date FROM {default_partition_name(table)}"
+    )).scalars())
+
+
+def create_month_partition(conn, table, month):
+    """
+    Создание секции таблицы за месяц
+
+    Если в секции по умолчанию уже есть строки этого месяца, они переносятся
+    в новую таблицу до ее подключения: PostgreSQL не позволяет создать секцию,
+    диапазон которой пересекается со строками секции по умолчанию.
+    """
+    name = month_partition_name(table, month)
+    default = default_partition_name(table)
+    bounds = {"start": month, "end": _add_months(month, 1)}
+    values = f"FOR VALUES FROM ('{bounds['start'].isoformat()}') TO ('{bounds['end'].isoformat()}')"
+    in_range = "date >= :start AND date < :end"
+
+    if conn.execute(text(f"SELECT 1 FROM {default} WHERE {in_range} LIMIT 1"), bounds).first() is None:
+        conn.execute(text(f"CREATE TABLE {name} PARTITION OF {table} {values}"))
+        return
+
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)"))
+    moved = conn.execute(text(f"INSERT INTO {name} SELECT * FROM {default} WHERE {in_range}"), bounds).rowcount
+    conn.execute(text(f"DELETE FROM {default} WHERE {in_range}"), bounds)
+    conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {name} {values}"))
+    logger.info(f"Секция {name} создана, из {default} перенесено строк: {moved}")
+
+
+def maintain_partitions(bind, tables=PARTITIONED_TABLES, months_ahead=PARTITION_PREMAKE_MONTHS, today=None):
+    """
+    Создание недостающих месячных секций
+
+    Секции создаются на текущий месяц и months_ahead месяцев вперед, а также
+    на месяцы, строки которых попали в секцию по умолчанию (например, при
+    загрузке архивных данных). Для баз без секционирования (SQLite, схема
+    до миграции) ничего не делает.
+
+    Параметры:
+    - bind: движок SQLAlchemy (DDL выполняется в отдельной короткой транзакции)
+
+    Возвращает:
+    - количество созданных секций
+    """
+    if bind.dialect.name != "postgresql":
+        return 0
+
+    current = (today or date.today()).replace(day=1)
+    upcoming = {_add_months(current, offset) for offset in range(months_ahead + 1)}
+    created = 0
+    for table in tables:
+        with bind.begin() as conn:
+            if not _is_partitioned(conn, table):
+                continue
+            # Параллельные загрузки и процессы не должны создавать одну секцию дважды
+            conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:table))"), {"table": table})
+            existing = _attached_partitions(conn, table)
+            months = sorted(upcoming | _default_months(conn, table))
+            for month in months:
+                if month_partition_name(table, month) not in existing:
+                    create_month_partition(conn, table, month)
+                    created += 1
+    if created:
+        logger.info(f"Создано месячных секций: {created}")
+    return created
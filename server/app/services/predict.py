@@ -1,60 +1,133 @@
-import pandas as pd
+import logging
+from datetime import timedelta
+
 import numpy as np
-from datetime import datetime, timedelta
-import random
+import pandas as pd
+
+from .features import FEATURE_NAMES, feature_pipeline
+from .instrumentation import timed
+from .model_registry import registry
+
+logger = logging.getLogger(__name__)
+
+# Пороги вероятности для уровней риска (проверяются по порядку)
+RISK_THRESHOLDS = [(0.7, "high"), (0.4, "medium")]
+DEFAULT_RISK_LEVEL = "low"
+
+# Компактные коды уровней риска для хранения оценок
+RISK_LEVEL_CODES = {"low": 0, "medium": 1, "high": 2}
+
+
+def load_model():
+    """
+    Загрузка активной модели реестра (при запуске сервера)
+    """
+    loaded = registry.active()
+    logger.info(f"Активная модель {loaded.version} ({registry.backend}): деревьев {loaded.model.num_trees()}")
+    return loaded.model
+
+
+def get_model():
+    """
+    Активная модель реестра; при первом обращении модель загружается с диска
+
+    Возвращает:
+    - LoadedModel: модель, ее версия и SHA-256. Запрос берет модель один раз,
+      поэтому замена активной модели во время прогноза его не затрагивает.
+    """
+    return registry.active()
+
+
+def get_model_hash():
+    """
+    SHA-256 файла активной модели
+    """
+    return get_model().sha256
+
 
-def predict_fires(coal_df, weather_df, fire_df, days_ahead=30):
+def risk_levels(probabilities):
     """
-    Прогнозирование вероятности возгораний на основе данных
-    
-    В будущем здесь будет реализация модели машинного обучения с использованием
-    scikit-learn, imbalanced-learn и scikit-survival
-    
+    Векторное присвоение уровней риска по порогам вероятности
+    """
+    conditions = [probabilities > threshold for threshold, _ in RISK_THRESHOLDS]
+    choices = [level for _, level in RISK_THRESHOLDS]
+    return np.select(conditions, choices, default=DEFAULT_RISK_LEVEL)
+
+
+def build_feature_matrix(features, trend, days_ahead):
+    """
+    Матрица признаков для всех пар (локация, день прогноза) одним массивом
+
+    Погодные признаки и скользящие характеристики сохраняются, температура
+    угля продлевается по дневному тренду.
+
+    Возвращает:
+    - numpy массив формы (локации * days_ahead, len(FEATURE_NAMES))
+    """
+    base = features.to_numpy(dtype=np.float64)
+    matrix = np.repeat(base, days_ahead, axis=0)
+
+    horizon = np.tile(np.arange(1, days_ahead + 1, dtype=np.float64), len(features))
+    coal_idx = FEATURE_NAMES.index("coal_temp")
+    matrix[:, coal_idx] += np.repeat(trend.reindex(features.index).to_numpy(), days_ahead) * horizon
+    return matrix
+
+
+def compare_predictions(candidate, primary):
+    """
+    Расхождение вероятностей модели-кандидата и активной модели
+    для отчета теневой оценки
+    """
+    delta = candidate - primary
+    return {
+        "mean_delta": round(float(delta.mean()), 6),
+        "mean_abs_delta": round(float(np.abs(delta).mean()), 6),
+        "max_abs_delta": round(float(np.abs(delta).max()), 6),
+        "risk_level_changes": int((risk_levels(candidate) != risk_levels(primary)).sum())
+    }
+
+
+def predict_fires(coal_df, weather_df, fire_df=None, days_ahead=30, locations=None, model=None):
+    """
+    Прогнозирование вероятности возгораний моделью LightGBM
+
     Параметры:
     - coal_df: DataFrame с данными о температуре угля
     - weather_df: DataFrame с погодными данными
     - fire_df: DataFrame с историей возгораний
     - days_ahead: количество дней для прогноза
-    
+    - locations: оценивать только эти локации (None - все рассчитанные)
+    - model: LoadedModel, которой оценивать (None - активная модель реестра)
+
     Возвращает:
     - список прогнозов в формате [{date, location, probability, risk_level}, ...]
     """
-    # Этот код будет заменен на реальную модель машинного обучения
-    predictions = []
-    
-    # Получаем уникальные локации
-    locations = fire_df['location'].unique()
-    
-    # Получаем последнюю дату из истории
-    latest_date = fire_df['date'].max()
-    if isinstance(latest_date, str):
-        current_date = datetime.strptime(latest_date, "%Y-%m-%d")
-    else:
-        current_date = datetime.combine(latest_date, datetime.min.time())
-    
-    # Генерируем прогнозы на будущие дни
-    for i in range(1, days_ahead + 1):
-        pred_date = current_date + timedelta(days=i)
-        
-        for location in locations:
-            # Здесь в будущем будет использоваться модель ML
-            # Сейчас используем простую имитацию
-            
-            probability = random.random()  # Случайная вероятность для имитации
-            
-            # Определяем уровень риска на основе вероятности
-            if probability > 0.7:
-                risk_level = "high"
-            elif probability > 0.4:
-                risk_level = "medium"
-            else:
-                risk_level = "low"
-            
-            predictions.append({
-                "date": pred_date.date(),
-                "location": location,
-                "probability": probability,
-                "risk_level": risk_level
-            })
-    
-    return predictions
\ No newline at end of file
+    with timed("pandas"):
+        # Признаки досчитываются только для новых дней
+        feature_pipeline.update(coal_df, weather_df)
+        features = feature_pipeline.latest()
+        if locations is not None:
+            features = features[features.index.isin(locations)]
+        if features.empty:
+            return []
+        trend = feature_pipeline.coal_trend()
+        latest_date = feature_pipeline.latest_date()
+
+        matrix = build_feature_matrix(features, trend, days_ahead)
+
+    # Все пары (локация, день) оцениваются одним вызовом модели
+    model = model or get_model()
+    with timed("model"):
+        probabilities = model.model.predict(matrix)
+    # Кандидат оценивается на той же матрице в фоне, ответ его не ждет
+    registry.submit_shadow(matrix, probabilities, model.version, compare_predictions)
+
+    with timed("pandas"):
+        dates = [(latest_date + timedelta(days=i)).date() for i in range(1, days_ahead + 1)]
+        predictions = pd.DataFrame({
+            "date": np.tile(np.array(dates, dtype=object), len(features)),
+            "location": np.repeat(features.index.to_numpy(), days_ahead),
+            "probability": probabilities,
+            "risk_level": risk_levels(probabilities)
+        })
+        return predictions.to_dict("records")
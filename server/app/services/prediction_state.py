@@ -0,0 +1,211 @@
+import logging
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from ..models import CoalTemperature, Weather, PredictionRun, PredictionScore, PredictionWatermark
+from .bulk_loader import bulk_insert, bulk_upsert
+from .features import ROLLING_WINDOW
+from .predict import RISK_LEVEL_CODES, get_model_hash
+
+logger = logging.getLogger(__name__)
+
+# Сколько дней истории загружать для пересчета признаков в инкрементальном режиме
+FEATURE_LOOKBACK_DAYS = ROLLING_WINDOW + 1
+
+COAL_COLUMNS = ["date", "location", "temperature"]
+WEATHER_COLUMNS = ["date", "location", "temperature", "humidity", "wind_speed", "wind_direction"]
+
+
+def _frame(db: Session, model, columns, *criteria):
+    """
+    Выборка нужных колонок сразу в DataFrame без создания ORM-объектов
+    """
+    statement = select(*[getattr(model, col) for col in columns]).where(*criteria)
+    return pd.DataFrame(db.execute(statement).all(), columns=columns)
+
+
+def load_history(db: Session, locations=None, since=None):
+    """
+    Данные о температуре угля и погоде для расчета признаков
+
+    Параметры:
+    - locations: ограничить данные угля этими локациями (None - все)
+    - since: загружать данные начиная с этой даты (None - всю историю)
+
+    Погода загружается по всем локациям, так как используется как общая по складу.
+    """
+    coal_criteria = []
+    weather_criteria = []
+    if locations is not None:
+        coal_criteria.append(CoalTemperature.location.in_(locations))
+    if since is not None:
+        coal_criteria.append(CoalTemperature.date >= since)
+        weather_criteria.append(Weather.date >= since)
+
+    coal_df = _frame(db, CoalTemperature, COAL_COLUMNS, *coal_criteria)
+    weather_df = _frame(db, Weather, WEATHER_COLUMNS, *weather_criteria)
+    return coal_df, weather_df
+
+
+def data_state(db: Session):
+    """
+    Текущее состояние входных данных по локациям
+
+    Возвращает:
+    - DataFrame с индексом location и колонками last_data_date, data_updated_at
+      (время последнего изменения данных угля, погоды по локации или общей погоды склада)
+    """
+    coal = pd.DataFrame(db.execute(
+        select(
+            CoalTemperature.location,
+            func.max(CoalTemperature.date),
+            func.max(CoalTemperature.created_at)
+        ).group_by(CoalTemperature.location)
+    ).all(), columns=["location", "last_data_date", "coal_updated_at"]).set_index("location")
+
+    weather = pd.DataFrame(db.execute(
+        select(Weather.location, func.max(Weather.created_at)).group_by(Weather.location)
+    ).all(), columns=["location", "weather_updated_at"]).set_index("location")
+
+    # Погода по локациям без данных угля считается общей для всего склада
+    yard_updated_at = weather.loc[~weather.index.isin(coal.index), "weather_updated_at"].max()
+
+    state = coal.join(weather, how="left")
+    state["yard_updated_at"] = yard_updated_at
+    state["data_updated_at"] = state[["coal_updated_at", "weather_updated_at", "yard_updated_at"]].max(axis=1)
+    return state[["last_data_date", "data_updated_at"]]
+
+
+def changed_locations(db: Session, state):
+    """
+    Локации, входные данные которых изменились с момента последнего прогноза
+    """
+    watermarks = pd.DataFrame(
+        db.execute(select(PredictionWatermark.location, PredictionWatermark.data_updated_at)).all(),
+        columns=["location", "scored_data_updated_at"]
+    ).set_index("location")
+
+    merged = state.join(watermarks, how="left")
+    changed = (
+        merged["scored_data_updated_at"].isna()
+        | merged["data_updated_at"].isna()
+        | (merged["data_updated_at"] > merged["scored_data_updated_at"])
+    )
+    return merged.index[changed].tolist()
+
+
+def lookback_start(state, locations):
+    """
+    Дата, начиная с которой нужны данные для пересчета признаков локаций
+    """
+    last_date = state.loc[locations, "last_data_date"].min()
+    return last_date - timedelta(days=FEATURE_LOOKBACK_DAYS)
+
+
+def save_watermarks(db: Session, state, locations, run_id=None):
+    """
+    Запоминание состояния данных, по которому пересчитаны локации,
+    и запуска, оценки которого теперь считаются актуальными
+    """
+    if not locations:
+        return
+    frame = state.loc[locations].reset_index()
+    frame["data_updated_at"] = frame["data_updated_at"].astype(object).where(frame["data_updated_at"].notna(), None)
+    frame["run_id"] = run_id
+    frame["scored_at"] = datetime.now()
+    bulk_upsert(db, PredictionWatermark, frame, ("location",))
+
+
+def start_run(db: Session, state, locations, incremental=False, model_hash=None):
+    """
+    Регистрация запуска прогнозирования (id доступен сразу, фиксация - вместе с оценками)
+
+    model_hash - SHA-256 модели, давшей оценки (None - активная модель)
+    """
+    snapshot = state.loc[locations, "data_updated_at"].max()
+    run = PredictionRun(
+        model_hash=model_hash or get_model_hash(),
+        feature_snapshot_at=None if pd.isna(snapshot) else snapshot.to_pydatetime(),
+        incremental=incremental,
+        locations=len(locations)
+    )
+    db.add(run)
+    db.flush()
+    return run
+
+
+def save_predictions(db: Session, run: PredictionRun, predictions):
+    """
+    Сохранение оценок запуска: float32 вероятности и коды уровней риска
+
+    Параметры:
+    - run: запуск прогнозирования
+    - predictions: список прогнозов [{date, location, probability, risk_level}, ...]
+
+    Возвращает:
+    - статистику записи {rows, seconds, rows_per_second, method}
+    """
+    frame = pd.DataFrame(predictions, columns=["date", "location", "probability", "risk_level"])
+    scores = pd.DataFrame({
+        "run_id": run.id,
+        "location": frame["location"],
+        "date": frame["date"],
+        "probability": frame["probability"].astype(np.float32),
+        "risk": frame["risk_level"].map(RISK_LEVEL_CODES).astype(np.int16)
+    })
+    run.rows = len(scores)
+    run.feature_date = frame["date"].min() - timedelta(days=1) if not frame.empty else None
+    return bulk_insert(db, PredictionScore, scores)
+
+
+def latest_scores(*criteria):
+    """
+    Запрос актуальных прогнозов: для каждой локации - оценки последнего
+    оценившего ее запуска (по водяным знакам, без сканирования старых запусков)
+
+    Колонки: date, location, fire_probability, risk_level.
+    Дополнительные условия передаются в criteria (например, по PredictionScore.date).
+    """
+    risk_level = case(
+        {code: level for level, code in RISK_LEVEL_CODES.items()},
+        value=PredictionScore.risk
+    )
+    return select(
+        PredictionScore.date,
+        PredictionScore.location,
+        PredictionScore.probability.label("fire_probability"),
+        risk_level.label("risk_level")
+    ).join(
+        PredictionWatermark,
+        (PredictionWatermark.location == PredictionScore.location)
+        & (PredictionWatermark.run_id == PredictionScore.run_id)
+    ).where(*criteria)
+
+
+def scored_date_range(db: Session, locations):
+    """
+    Диапазон дат актуальных оценок локаций (до переключения на новый запуск)
+    """
+    scores = latest_scores(PredictionScore.location.in_(locations)).subquery()
+    return db.execute(select(func.min(scores.c.date), func.max(scores.c.date))).one()
+
+
+def summarize_predictions(predictions):
+    """
+    Краткая сводка по прогнозам вместо полного списка
+    """
+    frame = pd.DataFrame(predictions, columns=["date", "location", "probability", "risk_level"])
+    if frame.empty:
+        return {"count": 0, "locations": 0, "date_from": None, "date_to": None, "risk_levels": {}}
+    return {
+        "count": len(frame),
+        "locations": int(frame["location"].nunique()),
+        "date_from": frame["date"].min().isoformat(),
+        "date_to": frame["date"].max().isoformat(),
+        "max_probability": float(frame["probability"].max()),
+        "risk_levels": {level: int(count) for level, count in frame["risk_level"].value_counts().items()}
+    }
@@ -0,0 +1,268 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# Время жизни закешированного ответа (секунды)
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+
+# Максимальное количество ответов в кеше процесса
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+
+# Адрес внешнего хранилища (redis://...); если не задан - кеш в памяти процесса
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL")
+
+
+class MemoryCache:
+    """
+    Кеш ответов в памяти процесса с временем жизни и вытеснением LRU
+
+    Счетчики версий данных хранятся отдельно и не вытесняются:
+    потеря счетчика сделала бы снова доступными устаревшие ответы.
+    Счетчики видны только этому процессу (shared = False).
+    """
+
+    # Счетчики версий общие для всех процессов сервера
+    shared = False
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def counters(self, names):
+        with self._lock:
+            return [self._counters.get(name, 0) for name in names]
+
+    def incr(self, name):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + 1
+            return self._counters[name]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCache:
+    """
+    Общий для нескольких процессов кеш в Redis (нужен пакет redis)
+    """
+
+    shared = True
+
+    def __init__(self, url, ttl=RESPONSE_CACHE_TTL, prefix="coal-fire:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, value, ex=max(int(self.ttl), 1))
+
+    def counters(self, names):
+        values = self.client.mget([self.prefix + "v:" + name for name in names])
+        return [int(value) if value is not None else 0 for value in values]
+
+    def incr(self, name):
+        return self.client.incr(self.prefix + "v:" + name)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + "r:*"):
+            self.client.delete(key)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    Хранилище кеша (создается при первом обращении)
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = RedisCache(RESPONSE_CACHE_URL) if RESPONSE_CACHE_URL else MemoryCache()
+        return _backend
+
+
+def set_backend(backend):
+    """
+    Подмена хранилища (например, собственной реализацией с get/set/counters/incr/clear)
+    """
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def _month_buckets(start, end):
+    """Месяцы вида YYYY-MM, которые пересекает диапазон дат"""
+    buckets = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        buckets.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return buckets
+
+
+def _version_names(tables, date_range):
+    """
+    Счетчики версий, от которых зависит ответ
+
+    Для каждой таблицы:
+    - any - увеличивается при любой записи (ответы без диапазона дат)
+    - all - увеличивается при записи без известного диапазона дат
+    - YYYY-MM - увеличивается при записи дат этого месяца
+    """
+    names = []
+    for table in tables:
+        if date_range is None:
+            names.append(f"{table}:any")
+        else:
+            names.append(f"{table}:all")
+            names.extend(f"{table}:{bucket}" for bucket in _month_buckets(*date_range))
+    return names
+
+
+def invalidate(table, date_from=None, date_to=None):
+    """
+    Сброс закешированных ответов, зависящих от таблицы (и диапазона дат)
+
+    Ответы не удаляются: увеличиваются версии данных, входящие в ключ кеша,
+    и старые записи вытесняются по LRU или времени жизни.
+    """
+    backend = get_backend()
+    backend.incr(f"{table}:any")
+    if date_from is None or date_to is None:
+        backend.incr(f"{table}:all")
+    else:
+        for bucket in _month_buckets(date_from, date_to):
+            backend.incr(f"{table}:{bucket}")
+    logger.debug(f"Кеш ответов сброшен для {table} ({date_from} - {date_to})")
+
+
+def cache_key(endpoint, params, tables, date_range=None):
+    """
+    Ключ ответа: эндпоинт, параметры и текущие версии зависимых данных
+
+    Параметры:
+    - endpoint: имя эндпоинта
+    - params: словарь параметров запроса
+    - tables: таблицы, из которых строится ответ
+    - date_range: (date_from, date_to), если ответ зависит только от этих дат
+    """
+    names = _version_names(tables, date_range)
+    versions = get_backend().counters(names)
+    raw = json.dumps([endpoint, params, dict(zip(names, versions))], sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _etag_matches(request: Request, etag):
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def key_etag(key):
+    """
+    ETag из ключа ответа или None
+
+    Ключ содержит версии данных, поэтому годится как ETag, только если
+    счетчики версий общие для всех процессов: при кеше в памяти другой
+    процесс не видит записи этого и отвечал бы 304 на устаревший ETag.
+    """
+    if not getattr(get_backend(), "shared", False):
+        return None
+    return f'"{key}"'
+
+
+def body_etag(body):
+    """ETag из хеша тела ответа"""
+    return f'"{hashlib.sha1(body).hexdigest()}"'
+
+
+def _not_modified_response(etag):
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+def not_modified(request: Request, key):
+    """
+    Ответ 304, если клиент прислал ETag текущей версии ответа, иначе None
+
+    Без общего хранилища кеша (key_etag() is None) всегда None.
+    """
+    etag = key_etag(key)
+    if etag is not None and _etag_matches(request, etag):
+        return _not_modified_response(etag)
+    return None
+
+
+def _encode_json(payload):
+    return json.dumps(jsonable_encoder(payload), ensure_ascii=False).encode("utf-8")
+
+
+async def cached_json(request: Request, key, build):
+    """
+    JSON-ответ из кеша с поддержкой ETag / If-None-Match
+
+    Параметры:
+    - request: запрос (для заголовка If-None-Match)
+    - key: ключ из cache_key()
+    - build: асинхронная функция без аргументов, строящая ответ при промахе кеша
+
+    ETag - хеш тела ответа, поэтому он одинаков во всех процессах сервера
+    при любом хранилище кеша. Если тело есть в кеше, ответ 304 отдается
+    без обращения к БД. Сериализация больших ответов выполняется
+    в пуле потоков, чтобы не блокировать цикл событий.
+    """
+    backend = get_backend()
+    body = backend.get("r:" + key)
+    if body is None:
+        body = await run_in_threadpool(_encode_json, await build())
+        backend.set("r:" + key, body)
+        cache_status = "miss"
+    else:
+        cache_status = "hit"
+
+    etag = body_etag(body)
+    if _etag_matches(request, etag):
+        return _not_modified_response(etag)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "X-Cache": cache_status}
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,158 @@
+import logging
+from datetime import datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from ..models import ALL_LOCATIONS, DailyRollup, FireHistory, PredictionScore, StatisticsAggregate, Weather
+from .bulk_loader import advisory_xact_lock, bulk_upsert
+from .predict import RISK_LEVEL_CODES
+from .prediction_state import latest_scores
+from .statistics import refresh_statistics
+
+logger = logging.getLogger(__name__)
+
+# Типы загружаемых файлов, от которых зависят дневные итоги
+ROLLUP_SOURCES = {"weather", "fire_history"}
+
+ROLLUP_KEY = ["date", "location"]
+
+# Колонки гистограммы уровней риска
+RISK_COLUMNS = [f"risk_{level}" for level in RISK_LEVEL_CODES]
+
+
+def _with_yard_rows(frame):
+    """Строки исходных данных дублируются под локацией ALL_LOCATIONS для итогов по складу"""
+    return pd.concat([frame, frame.assign(location=ALL_LOCATIONS)], ignore_index=True)
+
+
+def _weather_rollup(db: Session, date_from, date_to):
+    weather = pd.DataFrame(db.execute(
+        select(
+            Weather.date, Weather.location, Weather.temperature,
+            Weather.humidity, Weather.wind_speed, Weather.wind_direction
+        ).where(Weather.date.between(date_from, date_to))
+    ).all(), columns=["date", "location", "temperature", "humidity", "wind_speed", "wind_direction"])
+    weather = _with_yard_rows(weather)
+
+    daily = weather.groupby(ROLLUP_KEY).agg(
+        weather_rows=("temperature", "size"),
+        temperature=("temperature", "mean"),
+        humidity=("humidity", "mean"),
+        wind_speed=("wind_speed", "mean")
+    )
+    # Преобладающее за день направление ветра
+    directions = weather.dropna(subset=["wind_direction"])
+    counts = directions.groupby(ROLLUP_KEY + ["wind_direction"]).size()
+    if not counts.empty:
+        prevailing = counts.groupby(level=ROLLUP_KEY).idxmax().str[-1]
+        daily["wind_direction"] = prevailing.reindex(daily.index)
+    else:
+        daily["wind_direction"] = None
+    return daily
+
+
+def _fire_rollup(db: Session, date_from, date_to):
+    fires = pd.DataFrame(db.execute(
+        select(FireHistory.date, FireHistory.location, FireHistory.has_fire, FireHistory.severity)
+        .where(FireHistory.date.between(date_from, date_to))
+    ).all(), columns=["date", "location", "has_fire", "severity"])
+    fires = _with_yard_rows(fires.astype({"has_fire": bool}))
+
+    return fires.groupby(ROLLUP_KEY).agg(
+        fire_rows=("has_fire", "size"),
+        fire_count=("has_fire", "sum"),
+        max_severity=("severity", "max")
+    )
+
+
+def _prediction_rollup(db: Session, date_from, date_to):
+    predictions = pd.DataFrame(db.execute(
+        latest_scores(PredictionScore.date.between(date_from, date_to))
+    ).all(), columns=["date", "location", "fire_probability", "risk_level"])
+    predictions["risk"] = predictions["risk_level"].map(RISK_LEVEL_CODES)
+    predictions = _with_yard_rows(predictions)
+
+    daily = predictions.groupby(ROLLUP_KEY).agg(
+        prediction_rows=("risk", "size"),
+        max_probability=("fire_probability", "max"),
+        max_risk=("risk", "max")
+    )
+    # Количество прогнозов каждого уровня риска
+    histogram = predictions.groupby(ROLLUP_KEY + ["risk_level"]).size().unstack(fill_value=0)
+    histogram = histogram.reindex(columns=list(RISK_LEVEL_CODES), fill_value=0).add_prefix("risk_")
+    return daily.join(histogram)
+
+
+def refresh_daily_rollup(db: Session, date_from, date_to):
+    """
+    Пересчет дневных итогов за диапазон дат из исходных таблиц
+
+    Читаются только строки диапазона, итоги за остальные даты не меняются.
+    Пересчеты в разных транзакциях выполняются по очереди, строки пишутся
+    через upsert по ключу (date, location). Фиксация транзакции - на вызывающей стороне.
+
+    Возвращает:
+    - количество записанных строк итогов
+    """
+    if date_from is None or date_to is None:
+        return 0
+
+    # Загрузки, поток показаний и прогнозы пересчитывают итоги одновременно:
+    # блокировка берется до чтения, чтобы видеть данные завершившихся пересчетов
+    advisory_xact_lock(db, DailyRollup.__tablename__)
+    rollup = pd.concat([
+        _weather_rollup(db, date_from, date_to),
+        _fire_rollup(db, date_from, date_to),
+        _prediction_rollup(db, date_from, date_to)
+    ], axis=1)
+    counts = ["weather_rows", "fire_rows", "fire_count", "prediction_rows"] + RISK_COLUMNS
+    rollup[counts] = rollup[counts].fillna(0).astype(int)
+    rollup = rollup.astype({"max_severity": "Int64", "max_risk": "Int64"})
+    rollup = rollup.reset_index().assign(updated_at=datetime.now())
+
+    db.execute(delete(DailyRollup).where(DailyRollup.date.between(date_from, date_to)))
+    bulk_upsert(db, DailyRollup, rollup, ROLLUP_KEY)
+    logger.info(f"Дневные итоги пересчитаны за {date_from} - {date_to}: {len(rollup)} строк")
+
+    # Агрегаты статистики строятся из дневных итогов тех же месяцев
+    refresh_statistics(db, date_from, date_to)
+    return len(rollup)
+
+
+def rebuild_daily_rollup(db: Session, window_days=31):
+    """
+    Полное построение дневных итогов (для существующей базы) окнами по window_days дней
+    """
+    bounds = [
+        db.execute(select(func.min(model.date), func.max(model.date))).one()
+        for model in (Weather, FireHistory, PredictionScore)
+    ]
+    starts = [low for low, _ in bounds if low is not None]
+    ends = [high for _, high in bounds if high is not None]
+    if not starts:
+        return 0
+
+    rows = 0
+    start, end = min(starts), max(ends)
+    while start <= end:
+        window_end = min(start + timedelta(days=window_days - 1), end)
+        rows += refresh_daily_rollup(db, start, window_end)
+        start = window_end + timedelta(days=1)
+    db.commit()
+    return rows
+
+
+def ensure_daily_rollup(db: Session):
+    """
+    Построение дневных итогов и агрегатов статистики, если они еще не построены,
+    а исходные данные уже есть
+    """
+    built = all(
+        db.execute(select(model.__table__).limit(1)).first() is not None
+        for model in (DailyRollup, StatisticsAggregate)
+    )
+    if built:
+        return 0
+    return rebuild_daily_rollup(db)
@@ -0,0 +1,146 @@
+import json
+import logging
+import math
+import os
+import zlib
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from ..models import Stack, StackCell
+from .bulk_loader import bulk_insert
+
+logger = logging.getLogger(__name__)
+
+# Размер ячейки сеточного индекса в единицах координат карты
+GRID_CELL_SIZE = float(os.getenv("STACK_GRID_CELL_SIZE", "10"))
+
+# Начиная с этого уровня масштаба в ответ карты добавляются контуры штабелей
+FOOTPRINT_MIN_ZOOM = 2
+
+# Минимальное количество вершин контура
+MIN_FOOTPRINT_VERTICES = 3
+
+
+def parse_footprints(footprints):
+    """
+    Разбор контуров вида "x1 y1; x2 y2; x3 y3"
+
+    Параметры:
+    - footprints: Series со строками контуров (None - контура нет)
+
+    Возвращает:
+    - DataFrame вершин с колонками x, y и индексом исходной строки
+    - булева маска строк с некорректным контуром
+    """
+    present = footprints.dropna()
+    vertices = present.str.split(";").explode().str.strip()
+    vertices = vertices[vertices != ""]
+    pairs = vertices.str.split(r"\s+", expand=True, regex=True).reindex(columns=[0, 1, 2])
+    points = pd.DataFrame({
+        "x": pd.to_numeric(pairs[0], errors="coerce"),
+        "y": pd.to_numeric(pairs[1], errors="coerce")
+    })
+
+    bad_vertex = points.isna().any(axis=1) | pairs[2].notna()
+    counts = points.groupby(level=0).size().reindex(present.index, fill_value=0)
+    bad = bad_vertex.groupby(level=0).any().reindex(present.index, fill_value=True)
+    bad = bad | (counts < MIN_FOOTPRINT_VERTICES)
+    return points, bad.reindex(footprints.index, fill_value=False)
+
+
+def prepare_stacks(frame):
+    """
+    Контуры в JSON и ограничивающие прямоугольники для загружаемых штабелей
+
+    Возвращает:
+    - DataFrame с колонками таблицы stacks
+    - булева маска отклоненных строк
+    - Series с причинами отклонения
+    """
+    points, bad = parse_footprints(frame["footprint"])
+    valid_points = points[~points.index.isin(bad[bad].index)]
+
+    bounds = valid_points.groupby(level=0).agg(
+        min_x=("x", "min"), min_y=("y", "min"), max_x=("x", "max"), max_y=("y", "max")
+    ).reindex(frame.index)
+    # Без контура прямоугольник вырождается в точку маркера
+    bounds = bounds.fillna({
+        "min_x": frame["x"], "max_x": frame["x"], "min_y": frame["y"], "max_y": frame["y"]
+    })
+
+    footprint = pd.Series({
+        index: json.dumps(group.to_numpy().tolist())
+        for index, group in valid_points.groupby(level=0)
+    }, dtype=object)
+    prepared = frame.assign(footprint=footprint.reindex(frame.index)).join(bounds)
+    prepared["footprint"] = prepared["footprint"].astype(object).where(prepared["footprint"].notna(), None)
+
+    reasons = pd.Series("footprint: некорректный контур", index=bad[bad].index)
+    return prepared, bad, reasons
+
+
+def grid_cells(frame):
+    """
+    Ячейки сетки, которые пересекает прямоугольник каждого штабеля
+
+    Возвращает:
+    - DataFrame с колонками cell_x, cell_y, location
+    """
+    cx0 = np.floor(frame["min_x"].to_numpy() / GRID_CELL_SIZE).astype(np.int64)
+    cy0 = np.floor(frame["min_y"].to_numpy() / GRID_CELL_SIZE).astype(np.int64)
+    nx = np.floor(frame["max_x"].to_numpy() / GRID_CELL_SIZE).astype(np.int64) - cx0 + 1
+    ny = np.floor(frame["max_y"].to_numpy() / GRID_CELL_SIZE).astype(np.int64) - cy0 + 1
+
+    # Все ячейки всех прямоугольников одним массивом
+    totals = nx * ny
+    owner = np.repeat(np.arange(len(frame)), totals)
+    offset = np.arange(totals.sum()) - np.repeat(np.cumsum(totals) - totals, totals)
+    return pd.DataFrame({
+        "cell_x": cx0[owner] + offset // ny[owner],
+        "cell_y": cy0[owner] + offset % ny[owner],
+        "location": frame["location"].to_numpy()[owner]
+    })
+
+
+def index_stacks(db: Session, frame):
+    """
+    Перестроение ячеек сеточного индекса для загруженных штабелей
+    """
+    if frame.empty:
+        return
+    db.execute(delete(StackCell).where(StackCell.location.in_(frame["location"].tolist())))
+    cells = grid_cells(frame)
+    bulk_insert(db, StackCell, cells)
+    logger.info(f"Проиндексировано штабелей: {len(frame)}, ячеек: {len(cells)}")
+
+
+def stacks_in_view(min_x, min_y, max_x, max_y):
+    """
+    Запрос локаций штабелей, прямоугольник которых пересекает область просмотра
+
+    Кандидаты выбираются по диапазону ячеек (первичный ключ stack_cells),
+    затем проверяются точные границы.
+    """
+    cells = select(StackCell.location).where(
+        StackCell.cell_x.between(math.floor(min_x / GRID_CELL_SIZE), math.floor(max_x / GRID_CELL_SIZE)),
+        StackCell.cell_y.between(math.floor(min_y / GRID_CELL_SIZE), math.floor(max_y / GRID_CELL_SIZE))
+    )
+    return select(Stack.location).where(
+        Stack.location.in_(cells),
+        Stack.max_x >= min_x,
+        Stack.min_x <= max_x,
+        Stack.max_y >= min_y,
+        Stack.min_y <= max_y
+    )
+
+
+def placeholder_coordinates(location):
+    """
+    Постоянная точка для локации без загруженной геометрии
+    (по хешу имени, чтобы маркер не перемещался между запросами)
+    """
+    digest = zlib.crc32(location.encode("utf-8"))
+    return {"x": 10 + digest % 80, "y": 10 + (digest // 80) % 80}
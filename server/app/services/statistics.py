@@ -0,0 +1,146 @@
+import logging
+from datetime import date, datetime
+
+import pandas as pd
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from ..models import ALL_LOCATIONS, ALL_PERIODS, DailyRollup, StatisticsAggregate
+from .bulk_loader import advisory_xact_lock, bulk_upsert
+from .predict import RISK_LEVEL_CODES
+
+logger = logging.getLogger(__name__)
+
+# Колонки агрегатов, которые суммируются при переходе к более крупному периоду
+SUM_COLUMNS = [
+    "fire_rows", "fire_count", "weather_rows", "temperature_sum", "prediction_rows",
+    *[f"risk_{level}" for level in RISK_LEVEL_CODES]
+]
+
+# Ключ агрегатов: строки пишутся через upsert
+AGGREGATE_KEY = ("period", "location")
+
+
+def month_period(day):
+    """Период вида YYYY-MM для даты"""
+    return f"{day.year:04d}-{day.month:02d}"
+
+
+def _month_bounds(date_from, date_to):
+    """Первый день месяца date_from и последний день месяца date_to"""
+    start = date_from.replace(day=1)
+    end = (pd.Timestamp(date_to) + pd.offsets.MonthEnd(0)).date()
+    return start, end
+
+
+def refresh_statistics(db: Session, date_from, date_to):
+    """
+    Пересчет месячных агрегатов и итогов за все время по дневным итогам
+
+    Пересчитываются только месяцы, пересекающие диапазон дат, и итоги
+    за все время для затронутых локаций. Фиксация - на вызывающей стороне.
+    """
+    if date_from is None or date_to is None:
+        return 0
+
+    advisory_xact_lock(db, StatisticsAggregate.__tablename__)
+    start, end = _month_bounds(date_from, date_to)
+    columns = [
+        "date", "location", "fire_rows", "fire_count", "weather_rows", "temperature",
+        "prediction_rows", *[f"risk_{level}" for level in RISK_LEVEL_CODES]
+    ]
+    daily = pd.DataFrame(db.execute(
+        select(*[getattr(DailyRollup, col) for col in columns])
+        .where(DailyRollup.date.between(start, end))
+    ).all(), columns=columns)
+
+    daily["period"] = [month_period(day) for day in daily["date"]]
+    daily["temperature_sum"] = daily["temperature"].fillna(0.0) * daily["weather_rows"]
+    daily["fire_date"] = pd.to_datetime(daily["date"]).where(daily["fire_count"] > 0)
+
+    monthly = daily.groupby(["period", "location"]).agg(
+        **{col: (col, "sum") for col in SUM_COLUMNS},
+        last_fire_date=("fire_date", "max")
+    ).reset_index()
+    monthly["last_fire_date"] = monthly["last_fire_date"].dt.date
+
+    periods = [month_period(day) for day in pd.date_range(start, end, freq="MS")]
+    # Затронутые локации - и новые, и те, у которых в этих месяцах были данные
+    # (их итоги за все время нужно пересчитать, даже если месяцы опустели)
+    previous = db.execute(
+        select(StatisticsAggregate.location).distinct().where(StatisticsAggregate.period.in_(periods))
+    ).scalars().all()
+    db.execute(delete(StatisticsAggregate).where(StatisticsAggregate.period.in_(periods)))
+    bulk_upsert(db, StatisticsAggregate, monthly.assign(updated_at=datetime.now()), AGGREGATE_KEY)
+
+    # Итоги за все время для затронутых локаций складываются из их месяцев;
+    # у локаций без оставшихся месяцев строка итогов удаляется
+    locations = sorted(set(monthly["location"]) | set(previous))
+    if locations:
+        monthly_rows = pd.DataFrame(db.execute(
+            select(StatisticsAggregate.__table__).where(
+                StatisticsAggregate.location.in_(locations),
+                StatisticsAggregate.period != ALL_PERIODS
+            )
+        ).all(), columns=[col.name for col in StatisticsAggregate.__table__.columns])
+        monthly_rows["last_fire_date"] = pd.to_datetime(monthly_rows["last_fire_date"])
+        totals = monthly_rows.groupby("location").agg(
+            **{col: (col, "sum") for col in SUM_COLUMNS},
+            last_fire_date=("last_fire_date", "max")
+        ).reset_index().assign(period=ALL_PERIODS, updated_at=datetime.now())
+        totals["last_fire_date"] = totals["last_fire_date"].dt.date
+
+        db.execute(delete(StatisticsAggregate).where(
+            StatisticsAggregate.period == ALL_PERIODS,
+            StatisticsAggregate.location.in_(locations)
+        ))
+        bulk_upsert(db, StatisticsAggregate, totals, AGGREGATE_KEY)
+
+    logger.info(f"Агрегаты статистики пересчитаны за {periods[0]} - {periods[-1]}")
+    return len(monthly)
+
+
+async def get_aggregate(db: AsyncSession, period=ALL_PERIODS, location=None):
+    """
+    Строка агрегатов за период по локации (по умолчанию - весь склад за все время)
+    """
+    return await db.get(StatisticsAggregate, (period, location or ALL_LOCATIONS))
+
+
+async def current_risk_histogram(db: AsyncSession, location=None, today=None):
+    """
+    Количество актуальных прогнозов каждого уровня риска на сегодня и далее
+
+    Читаются только дневные итоги горизонта прогноза, а не оценки.
+    """
+    today = today or date.today()
+    columns = [getattr(DailyRollup, f"risk_{level}") for level in RISK_LEVEL_CODES]
+    sums = (await db.execute(
+        select(*[func.coalesce(func.sum(col), 0) for col in columns]).where(
+            DailyRollup.location == (location or ALL_LOCATIONS),
+            DailyRollup.date >= today
+        )
+    )).one()
+    return dict(zip(RISK_LEVEL_CODES, (int(value) for value in sums)))
+
+
+def aggregate_summary(aggregate):
+    """
+    Словарь показателей по строке агрегатов
+    """
+    if aggregate is None:
+        return {
+            "fireRows": 0, "fires": 0, "lastFireDate": None, "averageTemperature": None,
+            "predictions": 0, "riskLevels": {level: 0 for level in RISK_LEVEL_CODES}
+        }
+    return {
+        "fireRows": aggregate.fire_rows,
+        "fires": aggregate.fire_count,
+        "lastFireDate": aggregate.last_fire_date.isoformat() if aggregate.last_fire_date else None,
+        "averageTemperature": (
+            round(aggregate.temperature_sum / aggregate.weather_rows, 1) if aggregate.weather_rows else None
+        ),
+        "predictions": aggregate.prediction_rows,
+        "riskLevels": {level: getattr(aggregate, f"risk_{level}") for level in RISK_LEVEL_CODES}
+    }
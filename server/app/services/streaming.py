@@ -0,0 +1,339 @@
+"""
+Потоковый прием показаний датчиков: температура угля и погода
+
+Показания приходят строками NDJSON (HTTP-запрос с передачей по частям или
+сообщения WebSocket), проверяются сразу при приеме и копятся в памяти.
+В БД они записываются микропакетами: при накоплении STREAM_BATCH_ROWS строк
+одного типа или раз в STREAM_FLUSH_SECONDS. Запись выполняет одна фоновая
+задача цикла событий (в пуле потоков, через bulk_upsert), поэтому пакеты
+не конкурируют за блокировки таблиц.
+
+Если БД не успевает и в памяти больше STREAM_MAX_PENDING_ROWS строк, прием
+приостанавливается до записи очередного пакета: эндпоинт перестает читать
+тело запроса или сообщения WebSocket, и отправителя притормаживает TCP.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import re
+import time
+from collections import Counter
+from datetime import datetime
+
+import pandas as pd
+from starlette.concurrency import run_in_threadpool
+
+from .. import database
+from .bulk_loader import bulk_upsert
+from .data_processor import MAX_REPORTED_REJECTS, SCHEMAS, coerce_frame
+from .ingestion import DATA_KEYS, DATA_MODELS
+from .partitions import PARTITIONED_TABLES, maintain_partitions
+from .response_cache import invalidate
+from .rollup import ROLLUP_SOURCES, refresh_daily_rollup
+
+logger = logging.getLogger(__name__)
+
+# Типы показаний, принимаемых потоком
+STREAM_TYPES = ("coal", "weather")
+
+# Размер микропакета: при накоплении стольких строк одного типа пакет пишется сразу
+STREAM_BATCH_ROWS = int(os.getenv("STREAM_BATCH_ROWS", "5000"))
+
+# Наибольшая задержка записи показаний (секунды)
+STREAM_FLUSH_SECONDS = float(os.getenv("STREAM_FLUSH_SECONDS", "1.0"))
+
+# Сколько строк может ждать записи, прежде чем прием приостанавливается
+STREAM_MAX_PENDING_ROWS = int(os.getenv("STREAM_MAX_PENDING_ROWS", "50000"))
+
+# Сколько раз пакет пытаются записать, прежде чем отбросить
+STREAM_WRITE_ATTEMPTS = int(os.getenv("STREAM_WRITE_ATTEMPTS", "3"))
+
+# Метка времени показания сводится к дате: таблицы хранят одно значение
+# на локацию за день, и более позднее показание дня заменяет предыдущее
+_TIMESTAMP = re.compile(r"^(\d{4}-\d{2}-\d{2})[T ].*$")
+
+# Служебная колонка с меткой времени показания: по ней упорядочивается
+# микропакет перед записью, в БД она не попадает
+EVENT_TIME = "event_at"
+
+
+def parse_readings(lines, first_line=1, default_type=None):
+    """
+    Разбор и проверка строк NDJSON
+
+    Каждая строка - объект JSON с полями CSV-файла своего типа и полем
+    type (coal или weather; без него - default_type). Дата может быть
+    меткой времени ISO 8601: она сохраняется в колонке EVENT_TIME
+    (метки без часового пояса считаются UTC), а дата показания - день метки.
+
+    Параметры:
+    - lines: строки (str или bytes) без разделителей
+    - first_line: номер первой строки в потоке (для сообщений об ошибках)
+    - default_type: тип показаний без поля type
+
+    Возвращает:
+    - словарь тип -> DataFrame приведенных строк
+    - количество отклоненных строк
+    - первые причины отклонения [{line, reason}, ...]
+    """
+    records = {type: [] for type in STREAM_TYPES}
+    numbers = {type: [] for type in STREAM_TYPES}
+    rejects = []
+    for number, line in enumerate(lines, first_line):
+        if not line.strip():
+            continue
+        try:
+            reading = json.loads(line)
+        except ValueError:
+            rejects.append((number, "некорректный JSON"))
+            continue
+        if not isinstance(reading, dict):
+            rejects.append((number, "ожидается объект JSON"))
+            continue
+        type = reading.pop("type", default_type)
+        if type not in records:
+            rejects.append((number, f"неизвестный тип показаний: {type}"))
+            continue
+        records[type].append(reading)
+        numbers[type].append(number)
+
+    frames = {}
+    for type, rows in records.items():
+        if not rows:
+            continue
+        # Отсутствующие поля становятся пропусками и отклоняются при приведении
+        df = pd.DataFrame(rows, index=numbers[type]).reindex(columns=list(SCHEMAS[type]))
+        event_at = pd.to_datetime(df["date"], errors="coerce", utc=True, format="ISO8601")
+        df["date"] = df["date"].astype("string").str.replace(_TIMESTAMP, r"\1", regex=True)
+        frame, reject, reasons = coerce_frame(df, type)
+        rejects.extend(reasons.items())
+        frames[type] = frame[~reject].assign(**{EVENT_TIME: event_at[~reject]})
+
+    rejects.sort()
+    return frames, len(rejects), [
+        {"line": int(number), "reason": reason} for number, reason in rejects[:MAX_REPORTED_REJECTS]
+    ]
+
+
+def write_batch(type, frame, known_months):
+    """
+    Запись микропакета одной транзакцией (синхронно, в пуле потоков)
+
+    Строки упорядочиваются по метке времени показания (при равных метках -
+    по порядку поступления), поэтому из нескольких показаний локации за день
+    в пакете остается самое позднее по времени, а не последнее пришедшее.
+    Между пакетами действует порядок записи: показание, пришедшее после
+    записи пакета с более поздним показанием того же дня, заменит его.
+
+    Дневные итоги пересчитываются за даты пакета; секции создаются,
+    только если в пакете есть месяц, которого этот процесс еще не видел.
+    """
+    frame = frame.sort_values(EVENT_TIME, kind="stable").drop(columns=EVENT_TIME)
+    table = DATA_MODELS[type].__tablename__
+    date_from, date_to = frame["date"].min(), frame["date"].max()
+    db = database.SessionLocal()
+    try:
+        stats = bulk_upsert(db, DATA_MODELS[type], frame, DATA_KEYS[type])
+        if type in ROLLUP_SOURCES:
+            refresh_daily_rollup(db, date_from, date_to)
+        db.commit()
+
+        months = {day.replace(day=1) for day in pd.unique(frame["date"])}
+        if table in PARTITIONED_TABLES and not months <= known_months:
+            try:
+                maintain_partitions(db.get_bind(), [table])
+                known_months |= months
+            except Exception as e:
+                logger.exception(f"Не удалось создать секции {table}: {str(e)}")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    invalidate(table, date_from, date_to)
+    return stats
+
+
+class StreamIngestor:
+    """
+    Буфер показаний в памяти и фоновая задача записи микропакетов
+
+    Работает в цикле событий процесса: прием (submit) и запись (_flush)
+    не выполняются одновременно с другими изменениями буфера, поэтому
+    блокировки не нужны.
+    """
+
+    def __init__(self, batch_rows=STREAM_BATCH_ROWS, flush_seconds=STREAM_FLUSH_SECONDS,
+                 max_pending_rows=STREAM_MAX_PENDING_ROWS, write_attempts=STREAM_WRITE_ATTEMPTS):
+        self.batch_rows = batch_rows
+        self.flush_seconds = flush_seconds
+        self.max_pending_rows = max_pending_rows
+        self.write_attempts = write_attempts
+        # Тип -> список (DataFrame, номер попытки записи)
+        self._buffers = {type: [] for type in STREAM_TYPES}
+        self._buffered = Counter()
+        # Строки в буфере и в записываемом пакете
+        self.pending_rows = 0
+        self.totals = Counter()
+        self.backpressure_seconds = 0.0
+        self.last_error = None
+        self.last_flush_at = None
+        self._known_months = set()
+        self._cycles_started = 0
+        self._cycles_done = 0
+        self._wake = asyncio.Event()
+        self._progress = asyncio.Condition()
+        self._closing = False
+        # Задача записи создается в пустом контексте: иначе она унаследует
+        # показатели HTTP-запроса, в котором буфер создан (instrumentation)
+        self._task = contextvars.Context().run(asyncio.create_task, self._run())
+
+    async def submit(self, lines, first_line=1, default_type=None):
+        """
+        Прием строк NDJSON: разбор в пуле потоков и постановка в буфер
+
+        Если записи ждет больше max_pending_rows строк, ожидает записи
+        очередного пакета (обратное давление на отправителя).
+
+        Возвращает:
+        - {accepted, rejected, rejects}
+        """
+        frames, rejected, rejects = await run_in_threadpool(parse_readings, lines, first_line, default_type)
+        if self.pending_rows >= self.max_pending_rows:
+            started = time.perf_counter()
+            self.totals["backpressure_waits"] += 1
+            # Пакет пишется сразу, не дожидаясь таймера
+            self._wake.set()
+            async with self._progress:
+                await self._progress.wait_for(lambda: self.pending_rows < self.max_pending_rows)
+            self.backpressure_seconds += time.perf_counter() - started
+
+        accepted = 0
+        for type, frame in frames.items():
+            if frame.empty:
+                continue
+            self._buffers[type].append((frame, 1))
+            self._buffered[type] += len(frame)
+            accepted += len(frame)
+            if self._buffered[type] >= self.batch_rows:
+                self._wake.set()
+        self.pending_rows += accepted
+        self.totals["accepted"] += accepted
+        self.totals["rejected"] += rejected
+        return {"accepted": accepted, "rejected": rejected, "rejects": rejects}
+
+    async def sync(self):
+        """
+        Ожидание записи всех показаний, принятых до вызова
+
+        Возвращает:
+        - False, если за это время запись какого-либо пакета не удалась
+          (показания будут записаны повторно или отброшены)
+        """
+        errors = self.totals["retries"] + self.totals["failed"]
+        # Текущий цикл мог забрать буфер раньше: нужен следующий
+        target = self._cycles_started + 1
+        self._wake.set()
+        async with self._progress:
+            await self._progress.wait_for(lambda: self._cycles_done >= target)
+        return self.totals["retries"] + self.totals["failed"] == errors
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            closing = self._closing
+            await self._flush()
+            if closing:
+                return
+
+    async def _flush(self):
+        """Запись накопленных пакетов всех типов"""
+        self._cycles_started += 1
+        try:
+            for type in STREAM_TYPES:
+                if self._buffers[type]:
+                    await self._flush_type(type)
+        finally:
+            self._cycles_done += 1
+            self.last_flush_at = datetime.now()
+            async with self._progress:
+                self._progress.notify_all()
+
+    async def _flush_type(self, type):
+        batches, self._buffers[type] = self._buffers[type], []
+        self._buffered[type] = 0
+        frame = pd.concat([frame for frame, _ in batches], ignore_index=True)
+        attempt = max(attempt for _, attempt in batches)
+        try:
+            await run_in_threadpool(write_batch, type, frame, self._known_months)
+        except Exception as e:
+            self.last_error = f"{type}: {str(e)}"
+            if attempt < self.write_attempts and not self._closing:
+                # Пакет возвращается в начало буфера и пишется следующим циклом;
+                # пока БД недоступна, буфер растет до порога обратного давления
+                logger.warning(f"Пакет {type} из {len(frame)} строк не записан (попытка {attempt}): {str(e)}")
+                self._buffers[type].insert(0, (frame, attempt + 1))
+                self._buffered[type] += len(frame)
+                self.totals["retries"] += 1
+                return
+            logger.exception(f"Пакет {type} из {len(frame)} строк отброшен: {str(e)}")
+            self.totals["failed"] += len(frame)
+        else:
+            self.totals["written"] += len(frame)
+            self.totals["batches"] += 1
+        self.pending_rows -= len(frame)
+
+    async def close(self):
+        """Запись оставшихся показаний и остановка фоновой задачи"""
+        self._closing = True
+        self._wake.set()
+        await self._task
+
+    def status(self):
+        return {
+            "pending_rows": self.pending_rows,
+            "buffered": {type: self._buffered[type] for type in STREAM_TYPES},
+            "accepted": self.totals["accepted"],
+            "rejected": self.totals["rejected"],
+            "written": self.totals["written"],
+            "failed": self.totals["failed"],
+            "batches": self.totals["batches"],
+            "retries": self.totals["retries"],
+            "backpressure_waits": self.totals["backpressure_waits"],
+            "backpressure_seconds": round(self.backpressure_seconds, 3),
+            "last_flush_at": self.last_flush_at,
+            "last_error": self.last_error,
+            "batch_rows": self.batch_rows,
+            "flush_seconds": self.flush_seconds,
+            "max_pending_rows": self.max_pending_rows
+        }
+
+
+_ingestor = None
+
+
+def get_ingestor():
+    """
+    Буфер показаний процесса (создается в цикле событий при первом обращении)
+    """
+    global _ingestor
+    if _ingestor is None:
+        _ingestor = StreamIngestor()
+    return _ingestor
+
+
+async def shutdown_ingestor():
+    """
+    Запись оставшихся показаний при остановке сервера
+    """
+    global _ingestor
+    if _ingestor is not None:
+        ingestor, _ingestor = _ingestor, None
+        await ingestor.close()
@@ -0,0 +1,289 @@
+"""
+Вычисление модели LightGBM без lightgbm: текстовый дамп модели (model.txt)
+разбирается в плоские массивы узлов numpy и вычисляется векторно
+для всего пакета строк
+
+Выходной лист дерева находится по битовым маскам листьев (QuickScorer):
+узел, условие которого не выполнено, исключает листья своего левого
+поддерева, а выходной лист - самый левый из оставшихся. Условия проверяются
+по ярусам (k-й узел каждого дерева) сразу для всех деревьев и строк.
+Для деревьев больше чем из 64 листьев используется пошаговый обход от корня.
+
+Поддерживаются числовые разбиения (в том числе обработка пропусков
+None/Zero/NaN) и целевые функции binary и regression; для категориальных
+разбиений, линейных деревьев и многоклассовых моделей нужен lightgbm.
+"""
+import numpy as np
+
+# Порог, ниже которого LightGBM считает значение нулем (kZeroThreshold)
+ZERO_THRESHOLD = 1e-35
+
+# Биты decision_type узла
+_CATEGORICAL_MASK = 1
+_DEFAULT_LEFT_MASK = 2
+
+# Типы обработки пропусков (биты 2-3 decision_type)
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+
+# Наибольшее количество листьев дерева для вычисления битовыми масками (uint64)
+MAX_MASK_LEAVES = 64
+
+# Количество элементов (деревья x строки) промежуточных массивов одной порции:
+# порция должна помещаться в кеш процессора
+CHUNK_ELEMENTS = 40000
+
+
+class ModelFormatError(ValueError):
+    """Дамп модели не поддерживается или поврежден"""
+
+
+def _parse_blocks(text):
+    """Заголовок модели и блоки деревьев как словари ключ -> строка значения"""
+    header, trees = {}, []
+    current = header
+    for line in text.splitlines():
+        line = line.strip()
+        if line == "end of trees":
+            break
+        if line.startswith("Tree="):
+            current = {}
+            trees.append(current)
+            continue
+        key, _, value = line.partition("=")
+        if key:
+            current[key] = value
+    return header, trees
+
+
+def _values(block, key, dtype):
+    return np.array(block[key].split(), dtype=dtype) if block.get(key) else np.empty(0, dtype=dtype)
+
+
+def _go_left(values, threshold, missing_type, default_left):
+    """Направление разбиения по правилам LightGBM (NumericalDecision)"""
+    missing = np.isnan(values)
+    values = np.where(missing & (missing_type != MISSING_NAN), 0.0, values)
+    use_default = ((missing_type == MISSING_ZERO) & (np.abs(values) <= ZERO_THRESHOLD)) | \
+                  ((missing_type == MISSING_NAN) & missing)
+    return np.where(use_default, default_left, values <= threshold)
+
+
+class TreeEnsemble:
+    """
+    Ансамбль деревьев LightGBM в плоских массивах numpy
+
+    Узлы всех деревьев хранятся подряд: feature, threshold, left, right,
+    default_left, missing_type; ссылка на лист кодируется отрицательным
+    числом -(номер листа) - 1, листья всех деревьев - в leaf_value.
+    Интерфейс совпадает с используемой частью lightgbm.Booster:
+    predict, feature_name, num_trees.
+    """
+
+    def __init__(self, text):
+        header, trees = _parse_blocks(text)
+        if not trees:
+            raise ModelFormatError("В модели нет деревьев")
+        if int(header.get("num_class", 1)) != 1 or int(header.get("num_tree_per_iteration", 1)) != 1:
+            raise ModelFormatError("Многоклассовые модели не поддерживаются")
+
+        self.feature_names = header.get("feature_names", "").split()
+        self.max_feature_idx = int(header.get("max_feature_idx", len(self.feature_names) - 1))
+        self.average_output = "average_output" in header
+        self.objective, self.sigmoid = self._parse_objective(header.get("objective", "regression"))
+
+        features, thresholds, lefts, rights, decisions = [], [], [], [], []
+        leaf_values, roots = [], []
+        node_offset = leaf_offset = 0
+        for index, tree in enumerate(trees):
+            if int(tree.get("num_cat", 0)) or int(tree.get("is_linear", 0)):
+                raise ModelFormatError(f"Дерево {index}: категориальные разбиения и линейные деревья не поддерживаются")
+            leaves = _values(tree, "leaf_value", np.float64)
+            if int(tree["num_leaves"]) == 1:
+                # Дерево из одного листа: корень сразу ссылается на лист
+                roots.append(-leaf_offset - 1)
+            else:
+                left = _values(tree, "left_child", np.int64)
+                right = _values(tree, "right_child", np.int64)
+                roots.append(node_offset)
+                features.append(_values(tree, "split_feature", np.int64))
+                thresholds.append(_values(tree, "threshold", np.float64))
+                decisions.append(_values(tree, "decision_type", np.int64))
+                # Сквозная нумерация узлов и листьев всех деревьев
+                lefts.append(np.where(left >= 0, left + node_offset, left - leaf_offset))
+                rights.append(np.where(right >= 0, right + node_offset, right - leaf_offset))
+                node_offset += len(left)
+            leaf_values.append(leaves)
+            leaf_offset += len(leaves)
+
+        decision = np.concatenate(decisions) if decisions else np.empty(0, dtype=np.int64)
+        if (decision & _CATEGORICAL_MASK).any():
+            raise ModelFormatError("Категориальные разбиения не поддерживаются")
+        self.feature = np.concatenate(features).astype(np.intp) if features else np.empty(0, np.intp)
+        self.threshold = np.concatenate(thresholds) if thresholds else np.empty(0)
+        self.left = np.concatenate(lefts).astype(np.intp) if lefts else np.empty(0, np.intp)
+        self.right = np.concatenate(rights).astype(np.intp) if rights else np.empty(0, np.intp)
+        self.default_left = (decision & _DEFAULT_LEFT_MASK).astype(bool)
+        self.missing_type = ((decision >> 2) & 3).astype(np.int8)
+        self.leaf_value = np.concatenate(leaf_values)
+        self.roots = np.array(roots, dtype=np.intp)
+        self.depth = self._max_depth()
+        # Без обработки пропусков Zero/NaN пропуск просто заменяется нулем
+        self._plain_missing = not self.missing_type.any()
+        self._compiled = self._compile()
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding="utf-8") as model_file:
+            return cls(model_file.read())
+
+    @staticmethod
+    def _parse_objective(objective):
+        name, *params = objective.split()
+        options = dict(param.split(":", 1) for param in params if ":" in param)
+        if name == "binary":
+            return name, float(options.get("sigmoid", 1.0))
+        if name in ("regression", "regression_l1", "huber", "fair", "quantile", "mape") and "sqrt" not in params:
+            return name, None
+        raise ModelFormatError(f"Целевая функция {name} не поддерживается")
+
+    def _max_depth(self):
+        """Наибольшая глубина дерева - количество шагов обхода"""
+        depth, level = 0, self.roots[self.roots >= 0]
+        while level.size:
+            depth += 1
+            children = np.concatenate([self.left[level], self.right[level]])
+            level = children[children >= 0]
+        return depth
+
+    def _leaf_spans(self, root):
+        """
+        Листья дерева слева направо и для каждого узла - диапазон номеров
+        листьев его левого поддерева
+        """
+        leaves, spans = [], {}
+
+        def visit(node):
+            if node < 0:
+                leaves.append(-node - 1)
+                return
+            first = len(leaves)
+            visit(int(self.left[node]))
+            spans[node] = (first, len(leaves))
+            visit(int(self.right[node]))
+
+        visit(root)
+        return leaves, spans
+
+    def _compile(self):
+        """
+        Ярусы узлов для вычисления по маскам: массивы (ярус, дерево) признаков,
+        порогов и масок листьев левого поддерева. Пустые места ярусов
+        (в деревьях с меньшим количеством узлов) имеют пустую маску.
+
+        Возвращает:
+        - None, если в каком-либо дереве больше MAX_MASK_LEAVES листьев
+        """
+        starts = [int(root) for root in self.roots if root >= 0]
+        ends = starts[1:] + [len(self.feature)]
+        levels = max((end - start for start, end in zip(starts, ends)), default=0)
+
+        left_leaves = np.zeros((levels, len(starts)), dtype=np.uint64)
+        slot_node = np.zeros((levels, len(starts)), dtype=np.intp)
+        leaf_bases, leaf_table = [], []
+        for column, (start, end) in enumerate(zip(starts, ends)):
+            leaves, spans = self._leaf_spans(start)
+            if len(leaves) > MAX_MASK_LEAVES:
+                return None
+            # Узлы дерева идут подряд, корень - первый
+            for node in range(start, end):
+                first, last = spans[node]
+                left_leaves[node - start, column] = ((1 << (last - first)) - 1) << first
+                slot_node[node - start, column] = node
+            leaf_bases.append(len(leaf_table))
+            leaf_table.extend(self.leaf_value[leaves])
+
+        return {
+            "feature": self.feature[slot_node],
+            "threshold": self.threshold[slot_node][..., None],
+            "missing_type": self.missing_type[slot_node][..., None],
+            "default_left": self.default_left[slot_node][..., None],
+            "left_leaves": left_leaves[..., None],
+            "leaf_bases": np.array(leaf_bases, dtype=np.intp)[:, None],
+            "leaf_table": np.array(leaf_table, dtype=np.float64),
+            # Деревья из одного листа дают постоянную добавку
+            "bias": float(sum(self.leaf_value[-root - 1] for root in self.roots if root < 0))
+        }
+
+    def feature_name(self):
+        return list(self.feature_names)
+
+    def num_trees(self):
+        return len(self.roots)
+
+    def _raw_compiled(self, columns):
+        """Сумма листьев по маскам; columns - признаки порции (признак, строка)"""
+        compiled = self._compiled
+        removed = np.zeros((len(compiled["leaf_bases"]), columns.shape[1]), dtype=np.uint64)
+        for level in range(len(compiled["feature"])):
+            values = columns[compiled["feature"][level]]
+            if self._plain_missing:
+                go_right = values > compiled["threshold"][level]
+            else:
+                go_right = ~_go_left(
+                    values, compiled["threshold"][level],
+                    compiled["missing_type"][level], compiled["default_left"][level]
+                )
+            removed |= go_right * compiled["left_leaves"][level]
+
+        # Выходной лист - младший бит оставшихся листьев (номер бита - из экспоненты)
+        alive = ~removed
+        _, exponent = np.frexp((alive & (~alive + np.uint64(1))).astype(np.float64))
+        # Суммирование по деревьям по порядку, как в LightGBM
+        leaves = compiled["leaf_table"][compiled["leaf_bases"] + exponent - 1]
+        return leaves.sum(axis=0) + compiled["bias"]
+
+    def _raw_traversal(self, columns):
+        """Сумма листьев пошаговым обходом от корня; columns - (признак, строка)"""
+        samples = np.arange(columns.shape[1])
+        nodes = np.repeat(self.roots[:, None], columns.shape[1], axis=1)
+        for _ in range(self.depth):
+            internal = nodes >= 0
+            if not internal.any():
+                break
+            current = np.where(internal, nodes, 0)
+            go_left = _go_left(
+                columns[self.feature[current], samples], self.threshold[current],
+                self.missing_type[current], self.default_left[current]
+            )
+            nodes = np.where(internal, np.where(go_left, self.left[current], self.right[current]), nodes)
+        return self.leaf_value[-nodes - 1].sum(axis=0)
+
+    def predict(self, data, raw_score=False):
+        """
+        Прогноз модели для матрицы признаков (строки - объекты)
+
+        Возвращает:
+        - вероятности (binary) или значения (regression); raw_score - сумму листьев
+        """
+        data = np.asarray(data, dtype=np.float64)
+        if data.ndim == 1:
+            data = data.reshape(1, -1)
+        if data.shape[1] <= self.max_feature_idx:
+            raise ValueError(f"Ожидается признаков: {self.max_feature_idx + 1}, получено: {data.shape[1]}")
+
+        # Признак - строка массива: значения признака порции идут подряд
+        columns = data.T
+        if self._plain_missing:
+            columns = np.where(np.isnan(columns), 0.0, columns)
+        columns = np.ascontiguousarray(columns)
+
+        evaluate = self._raw_compiled if self._compiled is not None else self._raw_traversal
+        chunk_rows = max(1, CHUNK_ELEMENTS // self.num_trees())
+        raw = np.empty(len(data))
+        for start in range(0, len(data), chunk_rows):
+            raw[start:start + chunk_rows] = evaluate(columns[:, start:start + chunk_rows])
+        if self.average_output:
+            raw /= self.num_trees()
+        if raw_score or self.sigmoid is None:
+            return raw
+        return 1.0 / (1.0 + np.exp(-self.sigmoid * raw))
@@ -0,0 +1,70 @@
+import hashlib
+import logging
+import os
+from datetime import datetime
+
+from sqlalchemy.orm import Session
+
+from ..models import UploadedFile
+from .bulk_loader import UPSERT_INSERTS
+
+logger = logging.getLogger(__name__)
+
+# Размер блока при вычислении хеша файла
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class DuplicateUpload(Exception):
+    """Файл с таким содержимым уже загружен (в том числе параллельным запросом)"""
+
+
+def file_sha256(binary_file):
+    """
+    SHA-256 содержимого файла блоками с возвратом указателя в начало
+    """
+    digest = hashlib.sha256()
+    while True:
+        block = binary_file.read(HASH_BLOCK_SIZE)
+        if not block:
+            break
+        digest.update(block)
+    binary_file.seek(0)
+    return digest.hexdigest()
+
+
+def find_uploaded(db: Session, type, sha256):
+    """
+    Ранее загруженный файл того же типа с таким же содержимым
+    """
+    return db.query(UploadedFile).filter(
+        UploadedFile.type == type,
+        UploadedFile.sha256 == sha256
+    ).first()
+
+
+def register_upload(db: Session, type, sha256, filename, file_path, rows):
+    """
+    Запись загруженного файла в реестр в транзакции с его данными
+
+    Вставка идет через ON CONFLICT DO NOTHING по (type, sha256): если такой же
+    файл одновременно загружен и зафиксирован другим запросом, вставка ничего
+    не меняет, и вызывающий код откатывает транзакцию с данными.
+    Фиксация - на вызывающей стороне.
+
+    Возвращает:
+    - False, если файл с таким содержимым уже в реестре
+    """
+    statement = UPSERT_INSERTS[db.get_bind().dialect.name](UploadedFile).values(
+        type=type,
+        sha256=sha256,
+        filename=filename,
+        file_path=file_path,
+        size=os.path.getsize(file_path),
+        rows=rows,
+        created_at=datetime.now()
+    ).on_conflict_do_nothing(index_elements=["type", "sha256"])
+    if db.execute(statement).rowcount == 0:
+        logger.info(f"Файл {filename} ({sha256[:12]}) уже загружен параллельным запросом")
+        return False
+    logger.info(f"Файл {filename} ({sha256[:12]}) добавлен в реестр загрузок")
+    return True
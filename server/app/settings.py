@@ -0,0 +1,56 @@
+import os
+
+from dotenv import load_dotenv
+
+# Переменные окружения из файла .env (если он есть)
+load_dotenv()
+
+
+def env_bool(name, default=False):
+    """
+    Логическое значение переменной окружения (1/true/yes/on)
+    """
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Строка подключения к основной базе данных (запись и чтение);
+# без переменной окружения - локальный файл SQLite в каталоге server
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    f"sqlite:///{os.path.join(SERVER_DIR, 'coal_fire.db')}"
+)
+
+# Строка подключения к реплике только для чтения (GET-эндпоинты);
+# если не задана, чтение идет из основной базы
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL") or None
+
+# Постоянные соединения пула каждого движка
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+
+# Дополнительные соединения сверх DB_POOL_SIZE при пиковой нагрузке
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+# Время ожидания свободного соединения (секунды)
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# Соединения старше этого возраста (секунды) переоткрываются: прокси и балансировщики
+# молча обрывают долго простаивающие соединения
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# Проверка соединения перед выдачей из пула
+DB_POOL_PRE_PING = env_bool("DB_POOL_PRE_PING", True)
+
+# Ограничение времени выполнения запроса в PostgreSQL (миллисекунды, 0 - без ограничения)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+# Действие со схемой БД при запуске: upgrade - применить миграции,
+# check - только проверить версию, off - ничего не делать (миграции при деплое)
+DB_SCHEMA_MODE = os.getenv("DB_SCHEMA_MODE", "upgrade").strip().lower()
+
+# Количество потоков, обрабатывающих очередь фоновых загрузок CSV
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
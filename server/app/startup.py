@@ -0,0 +1,101 @@
+import logging
+import os
+import threading
+import time
+
+# Отсчет холодного старта: модуль импортируется приложением первым
+IMPORT_STARTED = time.perf_counter()
+
+logger = logging.getLogger(__name__)
+
+# Целевое время от импорта приложения до готовности (секунды)
+COLD_START_TARGET_SECONDS = float(os.getenv("COLD_START_TARGET_SECONDS", "5"))
+
+# Шаги, без которых экземпляр не готов принимать запросы
+REQUIRED_STEPS = ("schema", "model")
+
+
+def elapsed():
+    """Секунды с начала импорта приложения"""
+    return round(time.perf_counter() - IMPORT_STARTED, 3)
+
+
+class StartupState:
+    """
+    Состояние фоновых шагов запуска (схема БД, модель, дневные итоги, ...)
+
+    Приложение начинает принимать запросы сразу, а шаги выполняются
+    в фоновых потоках; готовность определяется обязательными шагами.
+    """
+
+    def __init__(self, required=REQUIRED_STEPS, target=COLD_START_TARGET_SECONDS):
+        self.required = required
+        self.target = target
+        self.listening_seconds = None
+        self.ready_seconds = None
+        self._steps = {}
+        self._lock = threading.Lock()
+
+    def _set(self, name, **values):
+        with self._lock:
+            self._steps.setdefault(name, {}).update(values)
+
+    def listening(self):
+        """Отметка о том, что сервер принимает запросы"""
+        self.listening_seconds = elapsed()
+        logger.info(f"Сервер принимает запросы через {self.listening_seconds} с после импорта")
+
+    def run(self, name, func):
+        """
+        Выполнение шага запуска с замером времени; ошибка шага логируется
+        и не прерывает остальные шаги
+
+        Возвращает:
+        - True, если шаг выполнен успешно
+        """
+        self._set(name, status="running", error=None)
+        started = time.perf_counter()
+        try:
+            func()
+        except Exception as e:
+            logger.exception(f"Шаг запуска {name} завершился ошибкой: {str(e)}")
+            self._set(name, status="failed", error=str(e), seconds=round(time.perf_counter() - started, 3))
+            return False
+        self._set(name, status="done", seconds=round(time.perf_counter() - started, 3))
+        self._check_ready()
+        return True
+
+    def skip(self, name):
+        self._set(name, status="skipped")
+        self._check_ready()
+
+    def is_ready(self):
+        with self._lock:
+            return all(self._steps.get(name, {}).get("status") in ("done", "skipped") for name in self.required)
+
+    def _check_ready(self):
+        if self.ready_seconds is not None or not self.is_ready():
+            return
+        self.ready_seconds = elapsed()
+        if self.ready_seconds > self.target:
+            logger.warning(f"Готов к работе через {self.ready_seconds} с, цель - {self.target} с")
+        else:
+            logger.info(f"Готов к работе через {self.ready_seconds} с (цель - {self.target} с)")
+
+    def snapshot(self):
+        with self._lock:
+            steps = {name: dict(step) for name, step in self._steps.items()}
+        return {
+            "ready": self.is_ready(),
+            "listening_seconds": self.listening_seconds,
+            "ready_seconds": self.ready_seconds,
+            "target_seconds": self.target,
+            "steps": steps
+        }
+
+
+def run_in_background(name, func):
+    """Запуск функции в фоновом потоке-демоне"""
+    thread = threading.Thread(target=func, name=name, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,7 @@
+"""
+Бенчмарки API: генератор синтетических данных склада и замеры горячих путей
+
+Запуск из каталога server: python -m benchmarks --help
+"""
+from .generator import generate_yard, write_yard
+from .runner import compare, run, save_results
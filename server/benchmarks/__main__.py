@@ -0,0 +1,107 @@
+"""
+Командная строка бенчмарков (запуск из каталога server):
+
+    python -m benchmarks generate --stacks 100 --days 365 --out data/
+    python -m benchmarks run --stacks 50 --days 365 [--database-url postgresql://...]
+    python -m benchmarks model --max-rows 1000000
+    python -m benchmarks compare results/old.json results/new.json
+"""
+import argparse
+import json
+import logging
+import sys
+from datetime import date
+
+from .generator import write_yard
+from . import model
+from .runner import compare, run, save_results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Бенчмарки API прогноза возгораний")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_data_options(command):
+        command.add_argument("--stacks", type=int, default=50, help="Количество штабелей")
+        command.add_argument("--days", type=int, default=365, help="Количество дней данных")
+        command.add_argument("--start", type=date.fromisoformat, default=date(2023, 1, 1), help="Первый день (YYYY-MM-DD)")
+        command.add_argument("--seed", type=int, default=0, help="Зерно генератора случайных чисел")
+
+    generate = commands.add_parser("generate", help="Сгенерировать CSV-файлы склада")
+    add_data_options(generate)
+    generate.add_argument("--out", required=True, help="Каталог для CSV-файлов")
+
+    bench = commands.add_parser("run", help="Замерить горячие пути API")
+    add_data_options(bench)
+    bench.add_argument("--database-url", help="Отдельная БД для бенчмарка (по умолчанию - временный файл SQLite)")
+    bench.add_argument("--repeat", type=int, default=5, help="Количество замеров каждого сценария")
+    bench.add_argument("--no-memory", action="store_true", help="Не замерять пиковую память (tracemalloc)")
+    bench.add_argument("--output", help="Файл результатов (по умолчанию - benchmarks/results/)")
+    bench.add_argument("--verbose", action="store_true", help="Показывать журнал приложения")
+
+    trees = commands.add_parser("model", help="Сравнить вычисление модели numpy и lightgbm")
+    trees.add_argument("--model-path", default=model.DEFAULT_MODEL_PATH, help="Текстовый файл модели LightGBM")
+    trees.add_argument("--max-rows", type=int, default=1_000_000, help="Наибольший размер пакета")
+    trees.add_argument("--repeat", type=int, default=100, help="Количество замеров малых пакетов")
+    trees.add_argument("--output", help="Файл результатов (по умолчанию - benchmarks/results/)")
+
+    diff = commands.add_parser("compare", help="Сравнить два файла результатов")
+    diff.add_argument("old", help="Результаты до изменения")
+    diff.add_argument("new", help="Результаты после изменения")
+    diff.add_argument("--metric", default="p50_ms", help="Метрика сравнения (p50_ms, p99_ms, peak_traced_mb, ...)")
+    diff.add_argument("--threshold", type=float, default=0.1, help="Допустимый рост метрики (доля)")
+    return parser.parse_args(argv)
+
+
+def print_report(report, output, extra, extra_title):
+    """Таблица результатов прогона и путь к сохраненному файлу"""
+    print(f"{'сценарий':<28}{'p50, мс':>12}{'p99, мс':>12}{'запр/с':>10}{'строк/с':>14}{extra_title:>14}")
+    for name, result in report["results"].items():
+        value = result.get(extra, "")
+        print(f"{name:<28}{result['p50_ms']:>12}{result['p99_ms']:>12}{result['requests_per_second']:>10}"
+              f"{result.get('rows_per_second', ''):>14}{value if value == '' else f'{value:.3g}':>14}")
+    print(f"Результаты сохранены: {save_results(report, output)}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.command == "generate":
+        for type, (path, rows) in write_yard(args.out, args.stacks, args.days, args.start, args.seed).items():
+            print(f"{type}: {rows} строк -> {path}")
+        return 0
+
+    if args.command == "run":
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+        if not args.verbose:
+            for name in ("app", "httpx"):
+                logging.getLogger(name).setLevel(logging.WARNING)
+        report = run(args.database_url, args.stacks, args.days, args.start, args.seed,
+                     args.repeat, not args.no_memory)
+        print_report(report, args.output, "peak_traced_mb", "пик, МБ")
+        return 0
+
+    if args.command == "model":
+        report = model.run(args.model_path, args.max_rows, args.repeat)
+        meta = report["meta"]
+        print(f"Загрузка модели: numpy {meta['numpy_load_seconds']} с, lightgbm {meta['lightgbm_load_seconds']} с "
+              f"(импорт lightgbm с загрузкой в новом процессе - {meta['lightgbm_import_seconds']} с)")
+        print_report(report, args.output, "max_abs_diff", "расхождение")
+        return 0
+
+    with open(args.old, encoding="utf-8") as file:
+        old = json.load(file)
+    with open(args.new, encoding="utf-8") as file:
+        new = json.load(file)
+    rows = compare(old, new, args.metric, args.threshold)
+    print(f"{old['meta'].get('commit')} -> {new['meta'].get('commit')}, метрика {args.metric}")
+    for key in ("dialect", "stacks", "days", "repeat"):
+        if old["meta"].get(key) != new["meta"].get(key):
+            print(f"Внимание: прогоны различаются по {key}: {old['meta'].get(key)} -> {new['meta'].get(key)}")
+    for name, before, after, change, regression in rows:
+        print(f"{name:<28}{before:>12}{after:>12}{change:>+10.1%}{'  РЕГРЕССИЯ' if regression else ''}")
+    return 1 if any(row[4] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
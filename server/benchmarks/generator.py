@@ -0,0 +1,121 @@
+"""
+Генератор синтетических данных угольного склада для бенчмарков
+
+Для N штабелей за M дней создаются CSV в форматах загрузки:
+coal.csv, weather.csv, fire_history.csv и stacks.csv.
+"""
+import os
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# Направления ветра, как в server/examples/weather.csv
+WIND_DIRECTIONS = np.array(["С", "СВ", "В", "ЮВ", "Ю", "ЮЗ", "З", "СЗ"])
+
+# Температура угля, выше которой возможно возгорание
+FIRE_TEMPERATURE = 60.0
+
+# Размер штабеля на плане склада и расстояние между штабелями
+STACK_SIZE = (8.0, 4.0)
+STACK_SPACING = 12.0
+
+
+def stack_names(stacks):
+    """Имена локаций: Штабель 001, Штабель 002, ..."""
+    width = max(3, len(str(stacks)))
+    return [f"Штабель {i:0{width}d}" for i in range(1, stacks + 1)]
+
+
+def generate_yard(stacks=50, days=365, start=date(2023, 1, 1), seed=0):
+    """
+    Синтетические данные склада в виде DataFrame
+
+    Температура угля растет от самонагревания с разной для штабелей скоростью
+    и сбрасывается при формировании нового штабеля (цикл хранения 60-180 дней);
+    погода имеет сезонный ход; возгорания случаются при высокой температуре угля.
+
+    Возвращает:
+    - словарь тип файла -> DataFrame (coal, weather, fire_history, stacks)
+    """
+    rng = np.random.default_rng(seed)
+    names = np.array(stack_names(stacks), dtype=object)
+    dates = pd.date_range(start, periods=days, freq="D")
+    day_of_year = dates.dayofyear.to_numpy()
+
+    # Погода: сезонный ход температуры и общий для склада фон плюс локальный шум
+    season = 10.0 + 15.0 * np.sin(2 * np.pi * (day_of_year - 110) / 365.0)
+    air = season + rng.normal(0.0, 3.0, size=days) + rng.normal(0.0, 0.7, size=(stacks, days))
+    humidity = np.clip(75.0 - 0.8 * (air - 10.0) + rng.normal(0.0, 8.0, size=(stacks, days)), 15.0, 100.0)
+    wind_speed = rng.gamma(2.0, 2.2, size=days) + rng.normal(0.0, 0.5, size=(stacks, days)).clip(-1.0, 1.0)
+    wind_speed = wind_speed.clip(0.0, None)
+    wind_direction = WIND_DIRECTIONS[rng.integers(0, len(WIND_DIRECTIONS), size=days)]
+
+    # Уголь: самонагревание в течение цикла хранения штабеля
+    rate = rng.uniform(0.05, 0.45, size=(stacks, 1))
+    cycle = rng.integers(60, 180, size=(stacks, 1))
+    offset = rng.integers(0, 180, size=(stacks, 1))
+    age = (np.arange(days)[None, :] + offset) % cycle
+    coal = air + 5.0 + rate * age + rng.normal(0.0, 1.0, size=(stacks, days))
+
+    # Возгорания: вероятность растет с превышением порога
+    excess = np.clip(coal - FIRE_TEMPERATURE, 0.0, None)
+    has_fire = rng.random(size=(stacks, days)) < np.clip(excess / 40.0, 0.0, 0.5)
+    severity = np.where(has_fire, np.clip(1 + excess // 8, 1, 5), 0).astype(int)
+
+    location = np.repeat(names, days)
+    day = np.tile(dates.strftime("%Y-%m-%d").to_numpy(), stacks)
+
+    frames = {
+        "coal": pd.DataFrame({
+            "date": day, "location": location, "temperature": coal.ravel().round(1)
+        }),
+        "weather": pd.DataFrame({
+            "date": day,
+            "location": location,
+            "temperature": air.ravel().round(1),
+            "humidity": humidity.ravel().round(1),
+            "wind_speed": wind_speed.ravel().round(1),
+            "wind_direction": np.tile(wind_direction, stacks)
+        }),
+        "fire_history": pd.DataFrame({
+            "date": day,
+            "location": location,
+            "has_fire": np.where(has_fire.ravel(), "true", "false"),
+            "severity": severity.ravel()
+        })
+    }
+
+    # Штабели на плане: сетка прямоугольников
+    columns = max(1, int(np.ceil(np.sqrt(stacks))))
+    position = np.arange(stacks)
+    x = (position % columns) * STACK_SPACING + STACK_SPACING / 2
+    y = (position // columns) * STACK_SPACING + STACK_SPACING / 2
+    half_w, half_h = STACK_SIZE[0] / 2, STACK_SIZE[1] / 2
+    frames["stacks"] = pd.DataFrame({
+        "location": names,
+        "x": x,
+        "y": y,
+        "footprint": [
+            f"{cx - half_w} {cy - half_h}; {cx + half_w} {cy - half_h}; "
+            f"{cx + half_w} {cy + half_h}; {cx - half_w} {cy + half_h}"
+            for cx, cy in zip(x, y)
+        ]
+    })
+    return frames
+
+
+def write_yard(out_dir, stacks=50, days=365, start=date(2023, 1, 1), seed=0):
+    """
+    Запись синтетических данных в CSV-файлы каталога out_dir
+
+    Возвращает:
+    - словарь тип файла -> (путь, количество строк)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    files = {}
+    for type, frame in generate_yard(stacks, days, start, seed).items():
+        path = os.path.join(out_dir, f"{type}.csv")
+        frame.to_csv(path, index=False)
+        files[type] = (path, len(frame))
+    return files
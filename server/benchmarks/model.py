@@ -0,0 +1,111 @@
+"""
+Сравнение вычисления модели: TreeEnsemble (numpy) и lightgbm.Booster
+
+Для пакетов от 1 до max_rows строк замеряется время predict обоими способами
+и наибольшее расхождение вероятностей; отдельно - время загрузки модели
+и импорта lightgbm в новом процессе.
+"""
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from .runner import git_commit, summarize
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODEL_PATH = os.path.join(SERVER_DIR, "predict", "model.txt")
+
+# Наибольшее суммарное количество строк замеров одного размера пакета
+MEASURED_ROWS = 100_000
+
+
+def feature_ranges(model_path):
+    """Диапазоны признаков из строки feature_infos модели ([min:max] по признакам)"""
+    with open(model_path, encoding="utf-8") as model_file:
+        for line in model_file:
+            if line.startswith("feature_infos="):
+                ranges = [info.strip("[]").split(":") for info in line.split("=", 1)[1].split()]
+                return np.array([[float(low), float(high)] for low, high in ranges])
+    raise ValueError(f"В {model_path} нет feature_infos")
+
+
+def batch_sizes(max_rows):
+    """1, 10, 100, ... до max_rows включительно"""
+    sizes, size = [], 1
+    while size <= max_rows:
+        sizes.append(size)
+        size *= 10
+    return sizes
+
+
+def lightgbm_import_seconds(model_path):
+    """Импорт lightgbm и загрузка модели в новом процессе (numpy уже импортирован)"""
+    code = (
+        "import time, numpy; started = time.perf_counter(); import lightgbm; "
+        f"lightgbm.Booster(model_file={model_path!r}); print(time.perf_counter() - started)"
+    )
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return round(float(output.strip().splitlines()[-1]), 4)
+
+
+def run(model_path=DEFAULT_MODEL_PATH, max_rows=1_000_000, repeat=100, seed=0):
+    """
+    Замер predict для пакетов 1..max_rows строк
+
+    Признаки берутся равномерно из диапазонов обучающих данных модели.
+    Каждый пакет замеряется repeat раз, но не больше чем на MEASURED_ROWS
+    строк в сумме (пакет из миллиона строк - один раз).
+
+    Возвращает:
+    - словарь meta / results в формате runner.run (сценарии numpy_<строки>
+      и lightgbm_<строки>, в numpy_* - расхождение max_abs_diff)
+    """
+    import lightgbm as lgb
+    from app.services.tree_model import TreeEnsemble
+
+    started = time.perf_counter()
+    ensemble = TreeEnsemble.from_file(model_path)
+    numpy_load = time.perf_counter() - started
+    started = time.perf_counter()
+    booster = lgb.Booster(model_file=model_path)
+    lightgbm_load = time.perf_counter() - started
+
+    ranges = feature_ranges(model_path)
+    rng = np.random.default_rng(seed)
+    data = ranges[:, 0] + (ranges[:, 1] - ranges[:, 0]) * rng.random((max_rows, len(ranges)))
+
+    results = {}
+    for rows in batch_sizes(max_rows):
+        batch = data[:rows]
+        runs = max(1, min(repeat, MEASURED_ROWS // rows))
+        outputs = {}
+        for name, model in (("numpy", ensemble), ("lightgbm", booster)):
+            seconds = []
+            for _ in range(runs):
+                started = time.perf_counter()
+                outputs[name] = model.predict(batch)
+                seconds.append(time.perf_counter() - started)
+            results[f"{name}_{rows}"] = summarize(seconds, rows)
+        results[f"numpy_{rows}"]["max_abs_diff"] = float(np.abs(outputs["numpy"] - outputs["lightgbm"]).max())
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "benchmark": "model",
+            "model_path": model_path,
+            "trees": ensemble.num_trees(),
+            "repeat": repeat,
+            "numpy_load_seconds": round(numpy_load, 4),
+            "lightgbm_load_seconds": round(lightgbm_load, 4),
+            "lightgbm_import_seconds": lightgbm_import_seconds(model_path)
+        },
+        "results": results
+    }
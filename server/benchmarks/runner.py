@@ -0,0 +1,320 @@
+"""
+Замеры горячих путей API от запроса до ответа
+
+Приложение запускается в процессе (TestClient, с lifespan) на отдельной базе:
+по умолчанию - новый файл SQLite во временном каталоге, либо PostgreSQL
+по переданному адресу. Для каждого сценария считаются задержки (p50/p99),
+пропускная способность и пиковая память; результаты сохраняются в JSON.
+"""
+import gc
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from .generator import write_yard
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Каталог результатов по умолчанию
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# Порядок загрузки: сначала штабели, затем данные датчиков
+UPLOAD_TYPES = ("stacks", "coal", "weather", "fire_history")
+
+# Сколько ждать готовности приложения (/ready), секунды
+READY_TIMEOUT = 120
+
+
+def git_commit():
+    """Текущий коммит репозитория (или None вне git)"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def max_rss_mb():
+    """Пиковый резидентный размер процесса (МБ)"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # В Linux - килобайты, в macOS - байты
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def summarize(seconds, rows=None):
+    """
+    Статистика замеров: задержки в миллисекундах и пропускная способность
+    """
+    ms = np.array(seconds) * 1000.0
+    result = {
+        "runs": len(ms),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        "min_ms": round(float(ms.min()), 3),
+        "max_ms": round(float(ms.max()), 3),
+        "requests_per_second": round(len(ms) / float(np.sum(seconds)), 2)
+    }
+    if rows is not None:
+        result["rows"] = rows
+        result["rows_per_second"] = round(rows / float(np.median(seconds)), 1)
+    return result
+
+
+def traced_peak_mb(call):
+    """Пиковое выделение памяти Python за один вызов (МБ, по tracemalloc)"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        call()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / (1024 * 1024), 2)
+
+
+class Benchmark:
+    """
+    Сценарии замеров для запущенного в процессе приложения
+
+    Параметры:
+    - client: TestClient приложения
+    - repeat: количество замеров каждого сценария
+    - trace_memory: дополнительный прогон сценария под tracemalloc
+    """
+
+    def __init__(self, client, repeat=5, trace_memory=True):
+        self.client = client
+        self.repeat = repeat
+        self.trace_memory = trace_memory
+        self.results = {}
+
+    def request(self, method, url, **kwargs):
+        response = self.client.request(method, url, **kwargs)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {url}: {response.status_code} {response.text[:500]}")
+        return response
+
+    def measure(self, name, call, before=None, rows=None):
+        """
+        Замер сценария: repeat вызовов call, перед каждым - before (не замеряется)
+        """
+        seconds = []
+        for _ in range(self.repeat):
+            if before is not None:
+                before()
+            started = time.perf_counter()
+            call()
+            seconds.append(time.perf_counter() - started)
+
+        result = summarize(seconds, rows)
+        if self.trace_memory:
+            if before is not None:
+                before()
+            result["peak_traced_mb"] = traced_peak_mb(call)
+        self.results[name] = result
+        logger.info(f"{name}: p50 {result['p50_ms']} мс, p99 {result['p99_ms']} мс")
+        return result
+
+    def upload(self, type, path, rows):
+        """
+        Загрузка CSV; первый замер - вставка в пустую таблицу, остальные - upsert
+        тех же строк. Отметка о загрузке удаляется после каждого замера,
+        иначе повтор того же файла был бы пропущен без разбора.
+        """
+        def call():
+            with open(path, "rb") as file:
+                self.request("POST", f"/api/upload/{type}", files={"file": (os.path.basename(path), file, "text/csv")})
+
+        self.measure(f"upload_{type}", call, before=forget_uploads, rows=rows)
+        forget_uploads()
+
+    def stream(self, paths):
+        """
+        Прием показаний NDJSON одним запросом до записи в БД
+        (POST /api/stream?wait=true); paths - тип -> CSV с показаниями
+        """
+        body = "\n".join(
+            pd.read_csv(path, dtype=str).assign(type=type)
+            .to_json(orient="records", lines=True, force_ascii=False).rstrip("\n")
+            for type, path in paths.items()
+        ).encode("utf-8")
+        rows = body.count(b"\n") + 1
+        self.measure("stream_ndjson", lambda: self.request("POST", "/api/stream?wait=true", content=body), rows=rows)
+
+    def get(self, name, urls):
+        """
+        GET-запросы по списку адресов: без кеша ответов (кеш очищается
+        перед каждым запросом) и с кешем
+        """
+        from app.services.response_cache import get_backend
+
+        state = {"index": 0}
+
+        def call():
+            url = urls[state["index"] % len(urls)]
+            state["index"] += 1
+            self.request("GET", url)
+
+        self.measure(f"{name}_miss", call, before=get_backend().clear)
+        for url in urls:
+            self.request("GET", url)
+        self.measure(f"{name}_hit", call)
+
+
+def forget_uploads():
+    """Удаление отметок о загруженных файлах и сохраненных копий этих файлов"""
+    from app.database import SessionLocal
+    from app.models import UploadedFile
+
+    db = SessionLocal()
+    try:
+        for upload in db.query(UploadedFile).all():
+            if upload.file_path and os.path.exists(upload.file_path):
+                os.remove(upload.file_path)
+            db.delete(upload)
+        db.commit()
+    finally:
+        db.close()
+
+
+def wait_ready(client, timeout=READY_TIMEOUT):
+    """Ожидание готовности приложения после запуска"""
+    deadline = time.monotonic() + timeout
+    while True:
+        response = client.get("/ready")
+        if response.status_code == 200:
+            return response.json()
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Приложение не готово за {timeout} с: {response.text}")
+        time.sleep(0.1)
+
+
+def month_urls(start, days):
+    """Адреса календаря для всех месяцев периода данных"""
+    months = pd.date_range(start, periods=days, freq="D").to_period("M").unique()
+    return [f"/api/calendar/{month.year}/{month.month}" for month in months]
+
+
+def run(database_url=None, stacks=50, days=365, start=None, seed=0, repeat=5, trace_memory=True, work_dir=None):
+    """
+    Полный прогон: генерация данных, загрузка, прогноз и чтение
+
+    База данных должна быть отдельной, бенчмарочной: в нее загружаются
+    синтетические данные. Адрес передается приложению через DATABASE_URL,
+    поэтому функция должна вызываться до импорта app в этом процессе.
+
+    Возвращает:
+    - словарь с описанием прогона (meta) и результатами сценариев (results)
+    """
+    start = start or date(2023, 1, 1)
+    work_dir = work_dir or tempfile.mkdtemp(prefix="coal-fire-bench-")
+    if database_url is None:
+        database_url = f"sqlite:///{os.path.join(work_dir, 'bench.db')}"
+    if "app.database" in sys.modules:
+        raise RuntimeError("Приложение уже импортировано: адрес БД бенчмарка не будет применен")
+    os.environ["DATABASE_URL"] = database_url
+
+    generated = time.perf_counter()
+    files = write_yard(os.path.join(work_dir, "data"), stacks, days, start, seed)
+    generated = round(time.perf_counter() - generated, 3)
+    logger.info(f"Данные сгенерированы за {generated} с: {work_dir}")
+
+    # Импорт приложения - только после установки DATABASE_URL
+    from fastapi.testclient import TestClient
+    from app.database import engine
+    from app.main import app
+
+    with TestClient(app) as client:
+        ready = wait_ready(client)
+        bench = Benchmark(client, repeat, trace_memory)
+
+        for type in UPLOAD_TYPES:
+            path, rows = files[type]
+            bench.upload(type, path, rows)
+
+        bench.measure("predict_full", lambda: bench.request("POST", "/api/predict?summary=true"))
+        bench.measure("predict_incremental", lambda: bench.request("POST", "/api/predict?incremental=true&summary=true"))
+
+        bench.get("calendar_month", month_urls(start, days))
+        bench.get("map", ["/api/map"])
+        bench.get("statistics", ["/api/statistics"])
+
+        # Последним: повторный прием показаний обновляет данные всех локаций
+        bench.stream({type: files[type][0] for type in ("coal", "weather")})
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "dialect": engine.dialect.name,
+            "stacks": stacks,
+            "days": days,
+            "seed": seed,
+            "repeat": repeat,
+            "rows": {type: rows for type, (_, rows) in files.items()},
+            "generate_seconds": generated,
+            "ready_seconds": ready.get("ready_seconds"),
+            "max_rss_mb": max_rss_mb()
+        },
+        "results": bench.results
+    }
+
+
+def save_results(report, path=None):
+    """
+    Сохранение результатов в JSON; по умолчанию -
+    benchmarks/results/<время>_<коммит>.json
+
+    Возвращает:
+    - путь к файлу
+    """
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(RESULTS_DIR, f"{stamp}_{report['meta']['commit'] or 'nogit'}.json")
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    return path
+
+
+def compare(old, new, metric="p50_ms", threshold=0.1):
+    """
+    Сравнение двух прогонов по сценариям
+
+    Возвращает:
+    - список строк (сценарий, старое значение, новое значение, изменение в долях,
+      признак регрессии - рост больше threshold)
+    """
+    rows = []
+    for name, result in new["results"].items():
+        before = old["results"].get(name, {}).get(metric)
+        after = result.get(metric)
+        if before is None or after is None:
+            continue
+        change = (after - before) / before if before else 0.0
+        rows.append((name, before, after, change, change > threshold))
+    return rows
@@ -0,0 +1,41 @@
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine
+
+from app.database import Base
+from app.settings import DATABASE_URL
+import app.models  # noqa: F401 - регистрация моделей в Base.metadata
+
+config = context.config
+
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+
+def run_migrations_online():
+    """
+    Применение миграций: через переданное приложением соединение
+    или через новое подключение по DATABASE_URL
+    """
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        context.configure(connection=connection, target_metadata=target_metadata)
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+
+    engine = create_engine(DATABASE_URL)
+    with engine.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    # Миграции читают существующие таблицы и переносят данные, SQL заранее не генерируется
+    raise RuntimeError("Миграции применяются только с подключением к БД (без --sql)")
+
+run_migrations_online()
@@ -0,0 +1,276 @@
+"""Исходная схема (таблицы, которые раньше создавались Base.metadata.create_all)
+
+Отсутствующие таблицы создаются, а таблицы, созданные create_all прежних
+версий, дополняются недостающими колонками, уникальными ключами и индексами.
+Если колонку NOT NULL в заполненной таблице нечем заполнить или уникальный
+ключ нарушают повторы, миграция останавливается с описанием, что исправить.
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001_baseline"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _tables():
+    """Описания таблиц в порядке создания (с учетом внешних ключей)"""
+    return [
+        ("coal_temperature", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("date", sa.Date(), nullable=False),
+            sa.Column("location", sa.String(), nullable=False),
+            sa.Column("temperature", sa.Float(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.UniqueConstraint("date", "location", name="uq_coal_temperature_date_location"),
+        ], [
+            ("ix_coal_temperature_id", ["id"]),
+        ]),
+        ("weather", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("date", sa.Date(), nullable=False),
+            sa.Column("location", sa.String(), nullable=False),
+            sa.Column("temperature", sa.Float(), nullable=False),
+            sa.Column("humidity", sa.Float(), nullable=False),
+            sa.Column("wind_speed", sa.Float(), nullable=False),
+            sa.Column("wind_direction", sa.String(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.UniqueConstraint("date", "location", name="uq_weather_date_location"),
+        ], [
+            ("ix_weather_id", ["id"]),
+            ("ix_weather_location_date", ["location", sa.text("date DESC")]),
+        ]),
+        ("fire_history", [
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("date", sa.Date(), nullable=False),
+            sa.Column("location", sa.String(), nullable=False),
+            sa.Column("has_fire", sa.Boolean(), nullable=False),
+            sa.Column("severity", sa.Integer(), nullable=False),
+            sa.Column("creation_date", sa.DateTime(), nullable=True),
+            sa.Column("cargo", sa.String(), nullable=True),
+            sa.Column("weight", sa.Float(), nullable=True),
+            sa.Column("warehouse", sa.Integer(), nullable=True),
+            sa.Column("start_date", sa.DateTime(), nullable=True),
+            sa.Column("end_date", sa.DateTime(), nullable=True),
+            sa.Column("initial_stack_date", sa.DateTime(), nullable=True),
+            sa.Column("stack", sa.Integer(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+        ], [
+            ("ix_fire_history_id", ["id"]),
+            ("ix_fire_history_location_date", ["location", sa.text("date DESC")]),
+        ]),
+        ("prediction_runs", [
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("model_hash", sa.String(64), nullable=False),
+            sa.Column("feature_snapshot_at", sa.DateTime(), nullable=True),
+            sa.Column("feature_date", sa.Date(), nullable=True),
+            sa.Column("incremental", sa.Boolean(), nullable=False),
+            sa.Column("locations", sa.Integer(), nullable=False),
+            sa.Column("rows", sa.Integer(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+        ], [
+            ("ix_prediction_runs_id", ["id"]),
+        ]),
+        ("prediction_scores", [
+            sa.Column("run_id", sa.Integer(), sa.ForeignKey("prediction_runs.id", ondelete="CASCADE"), primary_key=True),
+            sa.Column("location", sa.String(), primary_key=True),
+            sa.Column("date", sa.Date(), primary_key=True),
+            sa.Column("probability", sa.Float(precision=24), nullable=False),
+            sa.Column("risk", sa.SmallInteger(), nullable=False),
+        ], []),
+        ("prediction_watermarks", [
+            sa.Column("location", sa.String(), primary_key=True),
+            sa.Column("run_id", sa.Integer(), sa.ForeignKey("prediction_runs.id"), nullable=True),
+            sa.Column("last_data_date", sa.Date(), nullable=True),
+            sa.Column("data_updated_at", sa.DateTime(), nullable=True),
+            sa.Column("scored_at", sa.DateTime(), nullable=True),
+        ], []),
+        ("stacks", [
+            sa.Column("location", sa.String(), primary_key=True),
+            sa.Column("x", sa.Float(), nullable=False),
+            sa.Column("y", sa.Float(), nullable=False),
+            sa.Column("footprint", sa.Text(), nullable=True),
+            sa.Column("min_x", sa.Float(), nullable=False),
+            sa.Column("min_y", sa.Float(), nullable=False),
+            sa.Column("max_x", sa.Float(), nullable=False),
+            sa.Column("max_y", sa.Float(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+        ], []),
+        ("stack_cells", [
+            sa.Column("cell_x", sa.Integer(), primary_key=True),
+            sa.Column("cell_y", sa.Integer(), primary_key=True),
+            sa.Column("location", sa.String(), sa.ForeignKey("stacks.location", ondelete="CASCADE"), primary_key=True),
+        ], [
+            ("ix_stack_cells_location", ["location"]),
+        ]),
+        ("daily_rollup", [
+            sa.Column("date", sa.Date(), primary_key=True),
+            sa.Column("location", sa.String(), primary_key=True),
+            sa.Column("weather_rows", sa.Integer(), nullable=False),
+            sa.Column("temperature", sa.Float(), nullable=True),
+            sa.Column("humidity", sa.Float(), nullable=True),
+            sa.Column("wind_speed", sa.Float(), nullable=True),
+            sa.Column("wind_direction", sa.String(), nullable=True),
+            sa.Column("fire_rows", sa.Integer(), nullable=False),
+            sa.Column("fire_count", sa.Integer(), nullable=False),
+            sa.Column("max_severity", sa.Integer(), nullable=True),
+            sa.Column("prediction_rows", sa.Integer(), nullable=False),
+            sa.Column("max_probability", sa.Float(), nullable=True),
+            sa.Column("max_risk", sa.SmallInteger(), nullable=True),
+            sa.Column("risk_low", sa.Integer(), nullable=False),
+            sa.Column("risk_medium", sa.Integer(), nullable=False),
+            sa.Column("risk_high", sa.Integer(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), nullable=True),
+        ], []),
+        ("statistics_aggregates", [
+            sa.Column("period", sa.String(), primary_key=True),
+            sa.Column("location", sa.String(), primary_key=True),
+            sa.Column("fire_rows", sa.Integer(), nullable=False),
+            sa.Column("fire_count", sa.Integer(), nullable=False),
+            sa.Column("last_fire_date", sa.Date(), nullable=True),
+            sa.Column("weather_rows", sa.Integer(), nullable=False),
+            sa.Column("temperature_sum", sa.Float(), nullable=False),
+            sa.Column("prediction_rows", sa.Integer(), nullable=False),
+            sa.Column("risk_low", sa.Integer(), nullable=False),
+            sa.Column("risk_medium", sa.Integer(), nullable=False),
+            sa.Column("risk_high", sa.Integer(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), nullable=True),
+        ], []),
+        ("uploaded_files", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("type", sa.String(), nullable=False),
+            sa.Column("sha256", sa.String(64), nullable=False),
+            sa.Column("filename", sa.String(), nullable=True),
+            sa.Column("file_path", sa.String(), nullable=False),
+            sa.Column("size", sa.BigInteger(), nullable=False),
+            sa.Column("rows", sa.Integer(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.UniqueConstraint("type", "sha256", name="uq_uploaded_files_type_sha256"),
+        ], [
+            ("ix_uploaded_files_id", ["id"]),
+        ]),
+        ("ingest_jobs", [
+            sa.Column("id", sa.String(), primary_key=True),
+            sa.Column("type", sa.String(), nullable=False),
+            sa.Column("filename", sa.String(), nullable=True),
+            sa.Column("file_path", sa.String(), nullable=False),
+            sa.Column("encoding", sa.String(), nullable=False),
+            sa.Column("sha256", sa.String(64), nullable=True),
+            sa.Column("chunk_rows", sa.Integer(), nullable=False),
+            sa.Column("status", sa.String(), nullable=False),
+            sa.Column("bytes_total", sa.BigInteger(), nullable=False),
+            sa.Column("bytes_processed", sa.BigInteger(), nullable=False),
+            sa.Column("rows_parsed", sa.Integer(), nullable=False),
+            sa.Column("rows_inserted", sa.Integer(), nullable=False),
+            sa.Column("rows_rejected", sa.Integer(), nullable=False),
+            sa.Column("error", sa.String(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("started_at", sa.DateTime(), nullable=True),
+            sa.Column("finished_at", sa.DateTime(), nullable=True),
+        ], [
+            ("ix_ingest_jobs_status", ["status"]),
+        ]),
+    ]
+
+
+def _columns(name):
+    """Новые (не привязанные к таблице) описания колонок таблицы"""
+    columns = next(columns for table, columns, _ in _tables() if table == name)
+    return [column for column in columns if isinstance(column, sa.Column)]
+
+
+def _unique_names(inspector, name):
+    """Имена уникальных ключей таблицы (в SQLite часть из них - уникальные индексы)"""
+    names = {constraint["name"] for constraint in inspector.get_unique_constraints(name)}
+    names |= {index["name"] for index in inspector.get_indexes(name) if index.get("unique")}
+    return names
+
+
+def _duplicate_keys(conn, name, columns):
+    """Количество значений ключа, встречающихся в таблице больше одного раза"""
+    keys = ", ".join(columns)
+    return conn.execute(sa.text(
+        f"SELECT COUNT(*) FROM (SELECT 1 FROM {name} GROUP BY {keys} HAVING COUNT(*) > 1) AS duplicates"
+    )).scalar()
+
+
+def _upgrade_table(name, columns, indexes):
+    """
+    Приведение существующей таблицы к исходной схеме
+
+    Недостающие колонки добавляются, колонки, ставшие необязательными,
+    допускают NULL, недостающие уникальные ключи и индексы создаются.
+    """
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    table = sa.Table(name, sa.MetaData(), *columns)
+    present = {column["name"]: column for column in inspector.get_columns(name)}
+
+    missing = [column for column in table.columns if column.name not in present]
+    relaxed = [
+        column for column in table.columns
+        if column.name in present and column.nullable and not present[column.name]["nullable"]
+    ]
+    unique_names = _unique_names(inspector, name)
+    uniques = [
+        constraint for constraint in table.constraints
+        if isinstance(constraint, sa.UniqueConstraint) and constraint.name not in unique_names
+    ]
+
+    has_rows = conn.execute(sa.text(f"SELECT 1 FROM {name} LIMIT 1")).first() is not None
+    required = [column.name for column in missing if not column.nullable]
+    if required and has_rows:
+        raise RuntimeError(
+            f"Таблица {name} создана прежней версией приложения и содержит данные, "
+            f"но в ней нет обязательных колонок {', '.join(required)}, и заполнить их нечем. "
+            f"Перенесите данные в таблицу со схемой миграции {revision} (или удалите их) "
+            f"и отметьте миграцию примененной: alembic stamp {revision}"
+        )
+    for constraint in uniques:
+        keys = [column.name for column in constraint.columns]
+        duplicates = _duplicate_keys(conn, name, keys)
+        if duplicates:
+            raise RuntimeError(
+                f"В таблице {name} {duplicates} значений ключа ({', '.join(keys)}) "
+                f"встречаются несколько раз: удалите повторы и повторите alembic upgrade head"
+            )
+
+    if missing or relaxed or uniques:
+        # SQLite не добавляет колонку NOT NULL без значения по умолчанию
+        # и не меняет ограничения на месте: таблица пересоздается
+        recreate = "always" if conn.dialect.name == "sqlite" and (required or relaxed or uniques) else "auto"
+        with op.batch_alter_table(name, recreate=recreate) as batch:
+            # Колонки таблицы table уже к ней привязаны: добавляются свежие описания
+            fresh = {column.name: column for column in _columns(name)}
+            for column in missing:
+                batch.add_column(fresh[column.name])
+            for column in relaxed:
+                batch.alter_column(column.name, existing_type=column.type, nullable=True)
+            for constraint in uniques:
+                batch.create_unique_constraint(constraint.name, [column.name for column in constraint.columns])
+
+    index_names = {index["name"] for index in sa.inspect(conn).get_indexes(name)}
+    for index_name, index_columns in indexes:
+        if index_name not in index_names:
+            op.create_index(index_name, name, index_columns)
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    for name, columns, indexes in _tables():
+        if name in existing:
+            _upgrade_table(name, columns, indexes)
+            continue
+        op.create_table(name, *columns)
+        for index_name, index_columns in indexes:
+            op.create_index(index_name, name, index_columns)
+
+
+def downgrade():
+    for name, _, _ in reversed(_tables()):
+        op.drop_table(name)
@@ -0,0 +1,112 @@
+"""Месячные секции coal_temperature и weather, индексы (location, date) и BRIN по date
+
+В PostgreSQL таблицы coal_temperature и weather пересоздаются как
+секционированные по диапазону date (секция на месяц и секция по умолчанию),
+данные переносятся. Первичный ключ секционированной таблицы должен включать
+ключ секционирования, поэтому он становится (id, date); естественный ключ
+(date, location) сохраняется. Новые секции создает
+app.services.partitions.maintain_partitions.
+
+Revision ID: 0002_partitions_and_indexes
+Revises: 0001_baseline
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002_partitions_and_indexes"
+down_revision = "0001_baseline"
+branch_labels = None
+depends_on = None
+
+PARTITIONED_TABLES = ("coal_temperature", "weather")
+
+# Индексы: таблица -> [(имя, колонки, postgresql_using)]
+INDEXES = {
+    "coal_temperature": [
+        ("ix_coal_temperature_location_date", ["location", sa.text("date DESC")], None),
+        ("ix_coal_temperature_date_brin", ["date"], "brin"),
+    ],
+    "weather": [
+        ("ix_weather_date_brin", ["date"], "brin"),
+    ],
+    "fire_history": [
+        ("ix_fire_history_date_brin", ["date"], "brin"),
+    ],
+}
+
+# Индексы исходной схемы, которые пересоздаются вместе с таблицей
+BASELINE_INDEXES = {
+    "coal_temperature": [("ix_coal_temperature_id", ["id"])],
+    "weather": [("ix_weather_id", ["id"]), ("ix_weather_location_date", ["location", sa.text("date DESC")])],
+}
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def _create_indexes(table, indexes):
+    for name, columns, using in indexes:
+        options = {"postgresql_using": using} if using else {}
+        op.create_index(name, table, columns, if_not_exists=True, **options)
+
+
+def _partition_table(table):
+    """Пересоздание таблицы секционированной по месяцам с переносом данных"""
+    conn = op.get_bind()
+    old = f"{table}_unpartitioned"
+    op.execute(f"ALTER TABLE {table} RENAME TO {old}")
+    op.execute(f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS) PARTITION BY RANGE (date)")
+    op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+    months = conn.execute(sa.text(f"SELECT DISTINCT date_trunc('month', date)::date FROM {old}")).scalars()
+    for month in sorted(months):
+        op.execute(
+            f"CREATE TABLE {table}_p{month.year:04d}{month.month:02d} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+        )
+
+    op.execute(f"INSERT INTO {table} SELECT * FROM {old}")
+    # Последовательность id переходит к новой таблице и не удаляется вместе со старой
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+    op.execute(f"DROP TABLE {old}")
+
+    # Ограничения и индексы строятся после переноса данных
+    op.create_primary_key(f"{table}_pkey", table, ["id", "date"])
+    op.create_unique_constraint(f"uq_{table}_date_location", table, ["date", "location"])
+    _create_indexes(table, [(name, columns, None) for name, columns in BASELINE_INDEXES[table]])
+
+
+def _unpartition_table(table):
+    """Обратное преобразование в обычную таблицу"""
+    old = f"{table}_partitioned"
+    op.execute(f"ALTER TABLE {table} RENAME TO {old}")
+    op.execute(f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS)")
+    op.execute(f"INSERT INTO {table} SELECT * FROM {old}")
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+    op.execute(f"DROP TABLE {old} CASCADE")
+
+    op.create_primary_key(f"{table}_pkey", table, ["id"])
+    op.create_unique_constraint(f"uq_{table}_date_location", table, ["date", "location"])
+    _create_indexes(table, [(name, columns, None) for name, columns in BASELINE_INDEXES[table]])
+
+
+def upgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        for table in PARTITIONED_TABLES:
+            _partition_table(table)
+
+    for table, indexes in INDEXES.items():
+        _create_indexes(table, indexes)
+
+
+def downgrade():
+    for table, indexes in INDEXES.items():
+        for name, _, _ in indexes:
+            op.drop_index(name, table_name=table, if_exists=True)
+
+    if op.get_bind().dialect.name == "postgresql":
+        for table in PARTITIONED_TABLES:
+            _unpartition_table(table)
@@ -0,0 +1,41 @@
+import io
+
+from app.services.csv_stream import iter_csv_chunks
+from app.services.data_processor import coerce_frame
+
+
+def read_frame(text):
+    return next(iter_csv_chunks(io.BytesIO(text.encode("utf-8")), "utf-8", 100))
+
+
+def test_bool_column_with_blank_cell():
+    # Пропуск делает колонку has_fire числовой (1.0/0.0)
+    df = read_frame("date,location,has_fire,severity\n"
+                    "2024-03-01,A,1,2\n"
+                    "2024-03-02,A,,0\n"
+                    "2024-03-03,A,0,0\n")
+    frame, reject, reasons = coerce_frame(df, "fire_history")
+
+    assert reject.tolist() == [False, True, False]
+    assert reasons.tolist() == ["has_fire: пропущено значение"]
+    assert frame.loc[~reject, "has_fire"].tolist() == [True, False]
+
+
+def test_numeric_bool_values_outside_zero_one_are_rejected():
+    df = read_frame("date,location,has_fire,severity\n"
+                    "2024-03-01,A,2,1\n"
+                    "2024-03-02,A,1,1\n")
+    frame, reject, reasons = coerce_frame(df, "fire_history")
+
+    assert reject.tolist() == [True, False]
+    assert reasons.tolist() == ["has_fire: некорректное значение"]
+
+
+def test_string_bool_values():
+    df = read_frame("date,location,has_fire,severity\n"
+                    "2024-03-01,A,yes,1\n"
+                    "2024-03-02,A,False,0\n")
+    frame, reject, _ = coerce_frame(df, "fire_history")
+
+    assert not reject.any()
+    assert frame["has_fire"].tolist() == [True, False]
@@ -0,0 +1,50 @@
+import pandas as pd
+
+from app.services.features import FeaturePipeline
+
+
+def coal_frame(temperatures, start="2024-03-01", location="A"):
+    return pd.DataFrame({
+        "date": pd.date_range(start, periods=len(temperatures)).date,
+        "location": location,
+        "temperature": temperatures
+    })
+
+
+def weather_frame(days, start="2024-03-01"):
+    return pd.DataFrame({
+        "date": pd.date_range(start, periods=days).date,
+        "location": "A",
+        "temperature": 5.0,
+        "humidity": 70.0,
+        "wind_speed": 3.0,
+        "wind_direction": "N"
+    })
+
+
+def test_incremental_update_matches_full_run_after_correction():
+    temperatures = [20.0 + day for day in range(14)]
+    corrected = list(temperatures)
+    corrected[10] = 60.0
+    weather = weather_frame(14)
+
+    incremental = FeaturePipeline()
+    incremental.update(coal_frame(temperatures), weather)
+    # Окно истории с исправленным задним числом днем
+    window = coal_frame(corrected).iloc[5:]
+    incremental.update(window, weather)
+
+    full = FeaturePipeline()
+    full.update(coal_frame(corrected), weather)
+
+    pd.testing.assert_frame_equal(incremental.latest(), full.latest())
+    pd.testing.assert_series_equal(incremental.coal_trend(), full.coal_trend())
+
+
+def test_unchanged_window_is_not_recalculated():
+    weather = weather_frame(14)
+    pipeline = FeaturePipeline()
+    pipeline.update(coal_frame([20.0] * 14), weather)
+
+    # Пересчитывается только последний день (догруженная погода)
+    assert pipeline.update(coal_frame([20.0] * 14).iloc[5:], weather) == 1
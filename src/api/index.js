@@ -78,6 +78,20 @@ export const getCalendarData = async (year, month) => {
   return response.json();
 };
 
+/**
+ * Получение данных календаря за период (колоночный формат: массив значений на поле)
+ * @param {string} from - Первый день периода (YYYY-MM-DD)
+ * @param {string} to - Последний день периода (YYYY-MM-DD)
+ * @param {string} [location] - Локация (по умолчанию - весь склад)
+ * @returns {Promise}
+ */
+export const getCalendarRange = async (from, to, location) => {
+  const params = new URLSearchParams({ from, to });
+  if (location) params.append('location', location);
+  const response = await fetch(`${API_URL}/calendar?${params}`);
+  return response.json();
+};
+
 /**
  * Получение данных для карты
  * @returns {Promise}